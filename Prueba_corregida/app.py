@@ -1,6 +1,8 @@
 import streamlit as st  
 from services.database import DatabaseService
 from services.analytics import AnalyticsService
+from services.cola_calificaciones import cola_calificaciones, comprobar_ruta_persistente
+from config.constants import ESCRITURA_DIFERIDA_CALIFICACIONES
 from components.accesibilidad import panel_accesibilidad, _resetear_configuracion_a_defaults, _mostrar_contenido_panel_accesibilidad
 from components.accesibilidad import leer_tabla_si_activo, leer_texto_si_activo, leer_contenido
 from components.dashboard import mostrar_dashboard_principal
@@ -10,6 +12,7 @@ from components.registro_datos import (
 )
 from components.exportacion import mostrar_exportar_reportes
 from components.login import mostrar_login
+from components.refresco import panel_refrescable
 from services.rbac import es_docente, es_admin 
 from components.analisis_calidad import (
     mostrar_analisis_calidad,
@@ -87,6 +90,11 @@ st.markdown("""
 def inicializar_servicios(_version: int = 2):
     db = DatabaseService()
     analytics = AnalyticsService(db)
+    if ESCRITURA_DIFERIDA_CALIFICACIONES:
+        # sin una cola persistente no se arranca: se perderian calificaciones ya confirmadas
+        comprobar_ruta_persistente()
+        # lo que quedo en la cola de una ejecucion anterior se envia al arrancar
+        cola_calificaciones().iniciar(db)
     return db, analytics
 
 def _mostrar_boton_accesibilidad_header():
@@ -361,24 +369,27 @@ def main():
             st.caption("Auto actualización desactivada")
         st.caption("Usa el botón 'Actualizar Datos' para forzar una actualización")
 
-    # Auto refresh solo en vistas de lectura
-    if auto_on and st_autorefresh is not None and opcion in (MENU_DASH, MENU_QUAL):
-        # disparamos el refresh y actualizamos datos en cada ciclo
-        st_autorefresh(interval=auto_secs * 1000, key="auto_refresh_main")
-        try:
-            analytics.actualizar_datos()
-        except Exception:
-            pass
+    # Auto refresh solo en vistas de lectura. Con st.fragment solo se vuelven a
+    # ejecutar los paneles de datos; sin él se recurre al refresco de página completa
+    refresco = auto_secs if auto_on and opcion in (MENU_DASH, MENU_QUAL) else None
+    if refresco and not hasattr(st, "fragment"):
+        if st_autorefresh is not None:
+            st_autorefresh(interval=auto_secs * 1000, key="auto_refresh_main")
+            try:
+                analytics.refrescar_datos()
+            except Exception:
+                pass
+        refresco = None
 
     # Contenido
     try:
         if opcion == MENU_DASH:
-            mostrar_dashboard_principal(analytics)
+            mostrar_dashboard_principal(analytics, refresco_segundos=refresco)
 
         elif opcion == MENU_QUAL:
             # Admin ve las herramientas completas
             if es_admin():
-                mostrar_analisis_calidad(analytics)
+                panel_refrescable(mostrar_analisis_calidad, analytics, refresco)
             else:
                 # Docente: oculta herramientas y muestra solo su análisis por materia y grupo
                 from components.accesibilidad import crear_boton_lectura, leer_todo_contenido_analisis_calidad_docente
@@ -399,7 +410,7 @@ def main():
                             st.rerun()
                 else:
                     st.markdown('<div class="sub-header">Análisis de Calidad</div>', unsafe_allow_html=True)
-                analitica_histograma_y_control(analytics)
+                panel_refrescable(analitica_histograma_y_control, analytics, refresco)
 
         elif opcion == MENU_REG:
             # Docente: solo la vista de registrar calificaciones
@@ -3773,7 +3773,7 @@ def leer_contenido_dashboard():
         # Información de gráficas de distribución
         texto += "Distribución de Calificaciones. Gráfico histograma mostrando la distribución de calificaciones finales de los estudiantes. "
         if not analytics.df_calificaciones.empty:
-            dfc = analytics.df_calificaciones.copy()
+            dfc = analytics.df_calificaciones
             if "calificacion_final" in dfc.columns:
                 vals = pd.to_numeric(dfc["calificacion_final"], errors="coerce").dropna()
                 if len(vals) > 0:
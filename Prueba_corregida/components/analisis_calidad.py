@@ -251,7 +251,7 @@ def mostrar_histograma_calidad(analytics):
     etiqueta = st.selectbox("Materia", list(opciones.keys()))
     materia_id = opciones[etiqueta]
 
-    df = analytics.df_calificaciones.copy()
+    df = analytics.df_calificaciones
     if df.empty:
         st.info("No hay calificaciones registradas.")
         return
@@ -504,7 +504,7 @@ def analitica_histograma_y_control(analytics, key_prefix="ac_", preselect_materi
 
     # merge con estudiantes para nombre
     cols_est = ["id", "nombres", "apellido_paterno", "apellido_materno", "nombre"]
-    dfe = analytics.df_estudiantes[cols_est].copy() if not analytics.df_estudiantes.empty else pd.DataFrame(columns=cols_est)
+    dfe = analytics.df_estudiantes[cols_est] if not analytics.df_estudiantes.empty else pd.DataFrame(columns=cols_est)
 
     tabla = df.merge(dfe, left_on="estudiante_id", right_on="id", how="left")
     tabla["Alumno"] = tabla.apply(_nombre_alumno_para_tabla, axis=1)
@@ -597,13 +597,13 @@ def mostrar_analisis_calidad_docente(analytics):
         dfe = analytics.df_estudiantes
 
         if todos:
-            registros = dfc[dfc['materia_id'] == materia_id].copy()
+            registros = dfc[dfc['materia_id'] == materia_id]
         else:
             registros = dfc[
                 (dfc['materia_id'] == materia_id) &
                 (dfc['periodo'] == periodo_sel) &
                 (dfc['grupo'] == grupo_sel)
-            ].copy()
+            ]
 
         if not registros.empty:
             cols_est = ['id', 'nombres', 'apellido_paterno', 'apellido_materno', 'nombre']
@@ -701,7 +701,7 @@ def grafica_control_admin(analytics):
     st.subheader("Gráfico de Control: estabilidad del proceso")
 
     materia_id = _select_materia_admin(analytics, key="ctl_materia_filtro")
-    datos = df.copy()
+    datos = df
     if materia_id is not None:
         datos = datos[datos["materia_id"] == materia_id]
 
@@ -780,7 +780,7 @@ def grafica_control_admin(analytics):
         c2.metric("% Reprobados", f"{p:.1f}%")
 
 def _select_materia_admin(analytics, key):
-    mats = analytics.df_materias.copy()
+    mats = analytics.df_materias
     opciones = {"Todas": None}
     if not mats.empty:
         for _, m in mats.iterrows():
@@ -801,7 +801,7 @@ def grafica_histograma_admin(analytics):
     st.subheader("Histograma")
     materia_id = _select_materia_admin(analytics, key="hist_materia_filtro")
 
-    datos = df.copy()
+    datos = df
     if materia_id is not None:
         datos = datos[datos["materia_id"] == materia_id]
 
@@ -878,13 +878,14 @@ def grafica_histograma_admin(analytics):
 # prioriza catalogo por docente si existe
 # -----------------------------------------------------------
 def _materias_para_usuario(analytics):
-    # 1) si existe un metodo especifico por docente, usarlo
-    try:
-        mats = analytics.db.obtener_materias_docente(usuario_id()) or []
-        if mats:
-            return mats
-    except Exception:
-        pass
+    # 1) si es docente, pedir solo sus materias al servidor
+    if es_docente() and usuario_id():
+        try:
+            mats = analytics.db.obtener_materias_docente(usuario_id()) or []
+            if mats:
+                return mats
+        except Exception:
+            pass
 
     # 2) intentar catalogos amplios y filtrar si es docente
     mats = []
@@ -1058,7 +1059,7 @@ def analitica_histograma_y_control(analytics, key_prefix="ac_", preselect_materi
     st.markdown("### Alumnos y calificaciones del grupo")
 
     cols_est = ["id", "nombres", "apellido_paterno", "apellido_materno", "nombre"]
-    dfe = analytics.df_estudiantes[cols_est].copy() if not analytics.df_estudiantes.empty else pd.DataFrame(columns=cols_est)
+    dfe = analytics.df_estudiantes[cols_est] if not analytics.df_estudiantes.empty else pd.DataFrame(columns=cols_est)
 
     tabla = df.merge(dfe, left_on="estudiante_id", right_on="id", how="left")
 
@@ -3,6 +3,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 from components.accesibilidad import obtener_colores_grafica, aplicar_colores_figura, configurar_matplotlib_daltonismo
+from components.refresco import memo_render, firma_panel, figura_png
 
 
 # AGREGAR ESTAS FUNCIONES AL INICIO DEL ARCHIVO dashboard.py
@@ -54,10 +55,11 @@ def leer_fila_tabla(dataframe, fila_index, table_id):
     except Exception as e:
         st.error(f"Error al leer fila: {e}")
 
-def mostrar_dashboard_principal(analytics):
+def mostrar_dashboard_principal(analytics, refresco_segundos=None):
     """Dashboard principal con Distribucion arriba y Asistencia + Tendencia abajo."""
     
-    from components.accesibilidad import leer_dashboard_automatico, leer_metricas_automatico, crear_boton_lectura, leer_elemento_seleccionado
+    from components.accesibilidad import leer_dashboard_automatico, crear_boton_lectura
+    from components.refresco import panel_refrescable
     
 
 
@@ -71,8 +73,20 @@ def mostrar_dashboard_principal(analytics):
     else:
         st.markdown('<div class="sub-header">📊 Dashboard de Análisis Académico</div>', unsafe_allow_html=True)
 
+    # solo los paneles de datos se refrescan; el titulo queda fuera del fragmento
+    panel_refrescable(_paneles_dashboard, analytics, refresco_segundos)
+    
+    # SOLO leer automáticamente si es la primera vez
+    if st.session_state.get("a11y_tts_activo", False) and not st.session_state.get("a11y_dashboard_leido", False):
+        leer_dashboard_automatico()
+        st.session_state["a11y_dashboard_leido"] = True
+
+def _paneles_dashboard(analytics):
+    """Métricas, distribución, asistencia y tendencia: todo lo que depende de los datos."""
+    from components.accesibilidad import crear_boton_lectura
+
     # métricas
-    metricas = analytics.calcular_metricas_principales()
+    metricas = memo_render("metricas", firma_panel(analytics), analytics.calcular_metricas_principales)
     
     # MODIFICAR: Lectura de métricas con botones individuales
     if metricas['total_estudiantes'] > 0:
@@ -152,11 +166,6 @@ def mostrar_dashboard_principal(analytics):
         grafica_asistencia_dashboard(analytics)
     with col_right:
         mostrar_tendencia_unidades(analytics)
-    
-    # SOLO leer automáticamente si es la primera vez
-    if st.session_state.get("a11y_tts_activo", False) and not st.session_state.get("a11y_dashboard_leido", False):
-        leer_dashboard_automatico()
-        st.session_state["a11y_dashboard_leido"] = True
 
 def _nombre_completo_row(row: dict) -> str:
     partes = []
@@ -169,7 +178,8 @@ def _nombre_completo_row(row: dict) -> str:
     return " ".join(partes) if partes else f"ID {row.get('id','')}"
 
 
-def mostrar_distribucion_calificaciones(analytics):
+def _payload_distribucion(analytics, q):
+    """Histograma (png) y tabla de alumnos para el texto de búsqueda q."""
     import unicodedata, re
 
     def _norm(s):
@@ -179,16 +189,11 @@ def mostrar_distribucion_calificaciones(analytics):
         s = "".join(c for c in s if not unicodedata.combining(c))
         return re.sub(r"\s+", " ", s).strip().lower()
 
-    
-
-    dfc = analytics.df_calificaciones.copy()
-    if dfc.empty or "calificacion_final" not in dfc.columns:
-        st.info("No hay datos de calificaciones para mostrar")
-        return
+    dfc = analytics.df_calificaciones
 
     # Catálogos para nombres legibles
-    dm = analytics.df_materias[["id", "nombre"]].copy() if not analytics.df_materias.empty else pd.DataFrame(columns=["id","nombre"])
-    de = analytics.df_estudiantes[["id","nombres","apellido_paterno","apellido_materno","nombre"]].copy() if not analytics.df_estudiantes.empty else pd.DataFrame(columns=["id","nombres","apellido_paterno","apellido_materno","nombre"])
+    dm = analytics.df_materias[["id", "nombre"]] if not analytics.df_materias.empty else pd.DataFrame(columns=["id","nombre"])
+    de = analytics.df_estudiantes[["id","nombres","apellido_paterno","apellido_materno","nombre"]] if not analytics.df_estudiantes.empty else pd.DataFrame(columns=["id","nombres","apellido_paterno","apellido_materno","nombre"])
     de = de.fillna("")
     de["alumno"] = (
         de["nombres"].astype(str).str.strip() + " " +
@@ -199,12 +204,6 @@ def mostrar_distribucion_calificaciones(analytics):
     dfc["materia_nombre"] = dfc["materia_id"].map(dict(zip(dm["id"], dm["nombre"]))).fillna(dfc["materia_id"].astype(str))
     dfc = dfc.merge(de[["id","alumno"]], left_on="estudiante_id", right_on="id", how="left")
 
-    cplot, cside = st.columns([9, 3], gap="large")
-
-    with cside:
-        st.markdown("**Alumnos y calificación final**")
-        q = st.text_input("Buscar alumno o materia", key="dist_q").strip()
-
     # Filtrado por el buscador que alimenta tabla y gráfica
     if q:
         qn = _norm(q)
@@ -220,55 +219,79 @@ def mostrar_distribucion_calificaciones(analytics):
     vals = pd.to_numeric(dfc["calificacion_final"], errors="coerce").dropna().clip(0, 100)
     bins = max(6, min(20, int(np.sqrt(vals.size)))) if vals.size else 6
 
-    with cplot:
-        fig, ax = plt.subplots(figsize=(9.6, 5.2), dpi=110, constrained_layout=True)
-        
-        # Obtener colores de daltonismo si está activo
-        colores = obtener_colores_grafica(4)
-        if colores:
-            color_hist = colores[0]
-            color_limite = colores[1]
-            color_media = colores[2]
-            color_mediana = colores[3]
-        else:
-            color_hist = "#4c78a8"
-            color_limite = "#d62728"
-            color_media = "#2ca02c"
-            color_mediana = "#ff7f0e"
+    fig, ax = plt.subplots(figsize=(9.6, 5.2), dpi=110, constrained_layout=True)
+    
+    # Obtener colores de daltonismo si está activo
+    colores = obtener_colores_grafica(4)
+    if colores:
+        color_hist = colores[0]
+        color_limite = colores[1]
+        color_media = colores[2]
+        color_mediana = colores[3]
+    else:
+        color_hist = "#4c78a8"
+        color_limite = "#d62728"
+        color_media = "#2ca02c"
+        color_mediana = "#ff7f0e"
+    
+    if vals.size:
+        ax.hist(
+            vals, bins=bins, range=(0,100),
+            histtype="bar", rwidth=1.0,
+            color=color_hist, edgecolor="white", linewidth=0.6, alpha=0.95
+        )
+        ax.axvline(70, color=color_limite, linestyle="--", linewidth=1.6, label="Límite 70")
+        media = float(vals.mean()); mediana = float(np.median(vals))
+        ax.axvline(media,  color=color_media, linestyle=":",   linewidth=1.6, label=f"Media {media:.1f}")
+        ax.axvline(mediana,color=color_mediana, linestyle="-.", linewidth=1.6, label=f"Mediana {mediana:.1f}")
+        ax.set_xlim(0, 100)
+        ax.set_xlabel("Calificación final")
+        ax.set_ylabel("Frecuencia")
+        ax.grid(axis="y", alpha=0.2)
+        ax.legend(loc="upper left")
         
-        if vals.size:
-            ax.hist(
-                vals, bins=bins, range=(0,100),
-                histtype="bar", rwidth=1.0,
-                color=color_hist, edgecolor="white", linewidth=0.6, alpha=0.95
-            )
-            ax.axvline(70, color=color_limite, linestyle="--", linewidth=1.6, label="Límite 70")
-            media = float(vals.mean()); mediana = float(np.median(vals))
-            ax.axvline(media,  color=color_media, linestyle=":",   linewidth=1.6, label=f"Media {media:.1f}")
-            ax.axvline(mediana,color=color_mediana, linestyle="-.", linewidth=1.6, label=f"Mediana {mediana:.1f}")
-            ax.set_xlim(0, 100)
-            ax.set_xlabel("Calificación final")
-            ax.set_ylabel("Frecuencia")
-            ax.grid(axis="y", alpha=0.2)
-            ax.legend(loc="upper left")
-            
-            # Aplicar colores de daltonismo a la figura
-            aplicar_colores_figura(fig, ax)
-        else:
-            ax.text(0.5, 0.5, "Sin datos para el filtro", ha="center", va="center", transform=ax.transAxes)
-        st.pyplot(fig, use_container_width=True)
+        # Aplicar colores de daltonismo a la figura
+        aplicar_colores_figura(fig, ax)
+    else:
+        ax.text(0.5, 0.5, "Sin datos para el filtro", ha="center", va="center", transform=ax.transAxes)
+
+    tabla = dfc[["estudiante_id","alumno","materia_nombre","calificacion_final"]]
+    if not tabla.empty:
+        tabla = tabla.rename(columns={
+            "estudiante_id": "ID",
+            "alumno": "Alumno",
+            "materia_nombre": "Materia",
+            "calificacion_final": "Final"
+        }).sort_values("Final", ascending=False, na_position="last")
+
+    return {"png": figura_png(fig), "tabla": tabla}
+
+
+def mostrar_distribucion_calificaciones(analytics):
+    dfc = analytics.df_calificaciones
+    if dfc.empty or "calificacion_final" not in dfc.columns:
+        st.info("No hay datos de calificaciones para mostrar")
+        return
+
+    cplot, cside = st.columns([9, 3], gap="large")
 
-# BUSCA ESTAS LÍNEAS en mostrar_distribucion_calificaciones:
     with cside:
-        tabla = dfc[["estudiante_id","alumno","materia_nombre","calificacion_final"]].copy()
-        if not tabla.empty:
-            tabla = tabla.rename(columns={
-                "estudiante_id": "ID",
-                "alumno": "Alumno",
-                "materia_nombre": "Materia",
-                "calificacion_final": "Final"
-            }).sort_values("Final", ascending=False, na_position="last")
+        st.markdown("**Alumnos y calificación final**")
+        q = st.text_input("Buscar alumno o materia", key="dist_q").strip()
 
+    # solo se recalcula si cambian los datos o la búsqueda
+    payload = memo_render(
+        "distribucion",
+        firma_panel(analytics, q),
+        lambda: _payload_distribucion(analytics, q)
+    )
+
+    with cplot:
+        st.image(payload["png"], use_container_width=True)
+
+    with cside:
+        tabla = payload["tabla"]
+        if not tabla.empty:
             # << NUEVO: toggle para activar tabla accesible >>
             usar_accesible = st.toggle(
                 "Tabla accesible para lectura",
@@ -292,25 +315,18 @@ def mostrar_distribucion_calificaciones(analytics):
             st.info("Sin filas para mostrar.")
 
 
-def grafica_asistencia_dashboard(analytics):
-    """
-    Promedio de asistencia por materia o por grupo.
-    """
-    
-
-    df = analytics.df_calificaciones.copy()
-    if df.empty or "asistencia" not in df.columns:
-        st.info("No hay datos de asistencia")
-        return
+def _mapas_asistencia(analytics):
+    """id -> nombre de materia, id -> nombre de alumno, materias con datos."""
+    df = analytics.df_calificaciones
 
     try:
-        dm = analytics.df_materias[["id", "nombre"]].copy()
+        dm = analytics.df_materias[["id", "nombre"]]
     except Exception:
         dm = pd.DataFrame(columns=["id", "nombre"])
     map_mat = dict(zip(dm["id"], dm["nombre"]))
 
     try:
-        de = analytics.df_estudiantes[["id", "nombres", "apellido_paterno", "apellido_materno"]].copy()
+        de = analytics.df_estudiantes[["id", "nombres", "apellido_paterno", "apellido_materno"]]
         de = de.fillna("")
         de["alumno"] = (de["nombres"].astype(str).str.strip() + " " +
                         de["apellido_paterno"].astype(str).str.strip() + " " +
@@ -325,37 +341,98 @@ def grafica_asistencia_dashboard(analytics):
         de["alumno"] = []
     map_est = dict(zip(de["id"], de.get("alumno", de.get("nombre", de.get("nombres", "")))))
 
+    mats_disp = sorted(df["materia_id"].dropna().unique().tolist())
+    return {"map_mat": map_mat, "map_est": map_est, "mats_disp": mats_disp}
+
+
+def _payload_asistencia_materias(analytics, map_mat):
+    df = analytics.df_calificaciones
+    g = df.groupby("materia_id", as_index=False)["asistencia"].mean()
+    if g.empty:
+        return {"info": "No hay datos para calcular promedios"}
+    g["materia"] = g["materia_id"].map(map_mat).fillna(g["materia_id"].astype(str))
+    g = g.sort_values("asistencia", ascending=False)
+
+    fig, ax = plt.subplots(figsize=(9, 4), dpi=110, constrained_layout=True)
+    
+    # Obtener color de daltonismo si está activo
+    colores = obtener_colores_grafica(1)
+    color_bar = colores[0] if colores else "#1f77b4"
+    
+    ax.barh(g["materia"], g["asistencia"], color=color_bar)
+    ax.invert_yaxis()
+    ax.set_xlabel("Asistencia promedio")
+    ax.set_xlim(0, 100)
+    ax.grid(axis="x", alpha=0.2)
+    for i, v in enumerate(g["asistencia"]):
+        ax.text(min(v + 1, 100), i, f"{v:.0f}%", va="center")
+    
+    # Aplicar colores de daltonismo a la figura
+    aplicar_colores_figura(fig, ax)
+    return {"png": figura_png(fig)}
+
+
+def _payload_asistencia_grupo(analytics, map_est, materia_id, periodo, grupo):
+    df = analytics.df_calificaciones
+    dfg = df[(df["materia_id"] == materia_id) &
+             (df["periodo"] == periodo) &
+             (df["grupo"] == grupo)]
+    if dfg.empty:
+        return {"info": "No hay alumnos con asistencia en ese grupo"}
+
+    dfg["alumno"] = dfg["estudiante_id"].map(map_est).fillna(dfg["estudiante_id"].astype(str))
+    dfg = dfg.sort_values("asistencia", ascending=True)
+
+    fig, ax = plt.subplots(figsize=(9, 4.5), dpi=110, constrained_layout=True)
+    
+    # Obtener colores de daltonismo si está activo
+    colores = obtener_colores_grafica(2)
+    color_bar = colores[0] if colores else "#1f77b4"
+    color_bajo = colores[1] if colores else "#e74c3c"
+    
+    bars = ax.barh(dfg["alumno"], dfg["asistencia"], color=color_bar)
+    ax.set_xlabel(f"Asistencia del grupo  {periodo}  {grupo}")
+    ax.set_xlim(0, 100)
+    ax.grid(axis="x", alpha=0.2)
+    for bar, v in zip(bars, dfg["asistencia"]):
+        if v < 80:
+            bar.set_color(color_bajo)
+    
+    # Aplicar colores de daltonismo a la figura
+    aplicar_colores_figura(fig, ax)
+
+    tabla = dfg[["estudiante_id", "alumno", "asistencia"]].rename(columns={"estudiante_id": "ID"})
+    return {"png": figura_png(fig), "tabla": tabla}
+
+
+def grafica_asistencia_dashboard(analytics):
+    """
+    Promedio de asistencia por materia o por grupo.
+    """
+    df = analytics.df_calificaciones
+    if df.empty or "asistencia" not in df.columns:
+        st.info("No hay datos de asistencia")
+        return
+
+    mapas = memo_render("asis_mapas", firma_panel(analytics), lambda: _mapas_asistencia(analytics))
+    map_mat, map_est = mapas["map_mat"], mapas["map_est"]
+
     modo = st.radio("Vista", ["Promedio por materia", "Alumnos de un grupo"],
                     horizontal=True, key="asis_modo")
 
     if modo == "Promedio por materia":
-        g = df.groupby("materia_id", as_index=False)["asistencia"].mean()
-        if g.empty:
-            st.info("No hay datos para calcular promedios")
+        payload = memo_render(
+            "asis_materias",
+            firma_panel(analytics),
+            lambda: _payload_asistencia_materias(analytics, map_mat)
+        )
+        if "info" in payload:
+            st.info(payload["info"])
             return
-        g["materia"] = g["materia_id"].map(map_mat).fillna(g["materia_id"].astype(str))
-        g = g.sort_values("asistencia", ascending=False)
-
-        fig, ax = plt.subplots(figsize=(9, 4), dpi=110, constrained_layout=True)
-        
-        # Obtener color de daltonismo si está activo
-        colores = obtener_colores_grafica(1)
-        color_bar = colores[0] if colores else "#1f77b4"
-        
-        ax.barh(g["materia"], g["asistencia"], color=color_bar)
-        ax.invert_yaxis()
-        ax.set_xlabel("Asistencia promedio")
-        ax.set_xlim(0, 100)
-        ax.grid(axis="x", alpha=0.2)
-        for i, v in enumerate(g["asistencia"]):
-            ax.text(min(v + 1, 100), i, f"{v:.0f}%", va="center")
-        
-        # Aplicar colores de daltonismo a la figura
-        aplicar_colores_figura(fig, ax)
-        st.pyplot(fig, use_container_width=True)
+        st.image(payload["png"], use_container_width=True)
 
     else:
-        mats_disp = sorted(df["materia_id"].dropna().unique().tolist())
+        mats_disp = mapas["mats_disp"]
         if not mats_disp:
             st.info("No hay materias con datos de asistencia")
             return
@@ -367,8 +444,12 @@ def grafica_asistencia_dashboard(analytics):
         except Exception:
             materia_id = mats_disp[0]
 
-        grupos = df[df["materia_id"] == materia_id][["periodo", "grupo"]].drop_duplicates()
-        grp_labels = [f"{r.periodo}  {r.grupo}" for r in grupos.itertuples(index=False)]
+        grp_labels = memo_render(
+            "asis_grupos",
+            firma_panel(analytics, materia_id),
+            lambda: [f"{r.periodo}  {r.grupo}" for r in
+                     df[df["materia_id"] == materia_id][["periodo", "grupo"]].drop_duplicates().itertuples(index=False)]
+        )
         if not grp_labels:
             st.info("La materia no tiene grupos con datos")
             return
@@ -376,70 +457,29 @@ def grafica_asistencia_dashboard(analytics):
         periodo = grp_sel.split()[0]
         grupo = grp_sel.split()[-1]
 
-        dfg = df[(df["materia_id"] == materia_id) &
-                 (df["periodo"] == periodo) &
-                 (df["grupo"] == grupo)].copy()
-        if dfg.empty:
-            st.info("No hay alumnos con asistencia en ese grupo")
+        payload = memo_render(
+            "asis_grupo",
+            firma_panel(analytics, materia_id, periodo, grupo),
+            lambda: _payload_asistencia_grupo(analytics, map_est, materia_id, periodo, grupo)
+        )
+        if "info" in payload:
+            st.info(payload["info"])
             return
+        st.image(payload["png"], use_container_width=True)
 
-        dfg["alumno"] = dfg["estudiante_id"].map(map_est).fillna(dfg["estudiante_id"].astype(str))
-        dfg = dfg.sort_values("asistencia", ascending=True)
-
-        fig, ax = plt.subplots(figsize=(9, 4.5), dpi=110, constrained_layout=True)
-        
-        # Obtener colores de daltonismo si está activo
-        colores = obtener_colores_grafica(2)
-        color_bar = colores[0] if colores else "#1f77b4"
-        color_bajo = colores[1] if colores else "#e74c3c"
-        
-        bars = ax.barh(dfg["alumno"], dfg["asistencia"], color=color_bar)
-        ax.set_xlabel(f"Asistencia del grupo  {periodo}  {grupo}")
-        ax.set_xlim(0, 100)
-        ax.grid(axis="x", alpha=0.2)
-        for bar, v in zip(bars, dfg["asistencia"]):
-            if v < 80:
-                bar.set_color(color_bajo)
-        
-        # Aplicar colores de daltonismo a la figura
-        aplicar_colores_figura(fig, ax)
-        st.pyplot(fig, use_container_width=True)
-
-        tabla = dfg[["estudiante_id", "alumno", "asistencia"]].rename(columns={"estudiante_id": "ID"})
         st.caption("Alumnos del grupo seleccionado")
-        st.dataframe(tabla, use_container_width=True, height=280, hide_index=True)
-
-
-def mostrar_tendencia_unidades(analytics):
-    """Promedios por unidad con filtro de materia."""
-    
-
-    dfc = analytics.df_calificaciones
-    if dfc.empty:
-        st.info("No hay datos de unidades para mostrar")
-        return
+        st.dataframe(payload["tabla"], use_container_width=True, height=280, hide_index=True)
 
-    dfm = analytics.df_materias.copy()
-    opciones = {"Todas": None}
-    for _, r in dfm.iterrows():
-        opciones[f"ID {r['id']}: {r['nombre']}"] = int(r['id'])
-    sel = st.selectbox("Materia", list(opciones.keys()), key="tend_materia_sel")
-    materia_id = opciones[sel]
 
-    data = dfc.copy()
-    titulo = "Todas las materias"
+def _payload_tendencia(analytics, materia_id, titulo):
+    data = analytics.df_calificaciones
     if materia_id is not None:
-        data = data[data['materia_id'] == materia_id].copy()
-        if not dfm.empty:
-            nom = dfm[dfm['id'] == materia_id]
-            if not nom.empty:
-                titulo = nom.iloc[0]['nombre']
+        data = data[data['materia_id'] == materia_id]
 
     unidades = ['u1', 'u2', 'u3']
     existentes = [u for u in unidades if u in data.columns]
     if len(existentes) == 0:
-        st.info("No hay columnas de unidades")
-        return
+        return {"info": "No hay columnas de unidades"}
 
     proms = [data[u].mean() for u in existentes]
     fig, ax = plt.subplots(figsize=(7.5, 4), dpi=110, constrained_layout=True)
@@ -458,4 +498,33 @@ def mostrar_tendencia_unidades(analytics):
     
     # Aplicar colores de daltonismo a la figura
     aplicar_colores_figura(fig, ax)
-    st.pyplot(fig, use_container_width=True)
+    return {"png": figura_png(fig)}
+
+
+def mostrar_tendencia_unidades(analytics):
+    """Promedios por unidad con filtro de materia."""
+    dfc = analytics.df_calificaciones
+    if dfc.empty:
+        st.info("No hay datos de unidades para mostrar")
+        return
+
+    def _opciones():
+        dfm = analytics.df_materias
+        opciones = {"Todas": (None, "Todas las materias")}
+        for _, r in dfm.iterrows():
+            opciones[f"ID {r['id']}: {r['nombre']}"] = (int(r['id']), r['nombre'])
+        return opciones
+
+    opciones = memo_render("tend_opciones", firma_panel(analytics), _opciones)
+    sel = st.selectbox("Materia", list(opciones.keys()), key="tend_materia_sel")
+    materia_id, titulo = opciones[sel]
+
+    payload = memo_render(
+        "tendencia",
+        firma_panel(analytics, materia_id),
+        lambda: _payload_tendencia(analytics, materia_id, titulo)
+    )
+    if "info" in payload:
+        st.info(payload["info"])
+        return
+    st.image(payload["png"], use_container_width=True)
@@ -2,7 +2,16 @@ import streamlit as st
 import pandas as pd
 from io import BytesIO
 from services.analytics import AnalyticsService
-import matplotlib.pyplot as plt
+from services.exportacion import exportar_columnar, exportar_csv, exportar_excel
+from services.artefactos import cache_artefactos, firma_datos
+from services.reportes import EN_CURSO, trabajador_reportes
+from services.reportes_lote import docentes_de, documento_docente, documento_grupo, generar_lote
+from services.tablas_pdf import estilo_tabla, tablas_pdf
+from services.graficas import GRAFICAS, png_graficas
+from services.exportacion_incremental import COLUMNA_CAMBIO, MarcasExportacion, cambios_desde
+from services.filtros_reportes import motor_filtros
+from services.rbac import usuario_id
+from config.constants import FILAS_POR_GRUPO_COLUMNAR
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -34,16 +43,16 @@ def _con_reintentos(fn, intentos=4, espera_inicial=0.6):
             raise
 
 def _df_est(analytics):
-    return _con_reintentos(lambda: analytics.df_estudiantes.copy())
+    return _con_reintentos(lambda: analytics.df_estudiantes)
 
 def _df_cal(analytics):
-    return _con_reintentos(lambda: analytics.df_calificaciones.copy())
+    return _con_reintentos(lambda: analytics.df_calificaciones)
 
 def _df_fac(analytics):
-    return _con_reintentos(lambda: analytics.df_factores.copy())
+    return _con_reintentos(lambda: analytics.df_factores)
 
 def _df_mat(analytics):
-    return _con_reintentos(lambda: analytics.df_materias.copy())
+    return _con_reintentos(lambda: analytics.df_materias)
 
 
 def mostrar_exportar_reportes(database_service):
@@ -121,10 +130,28 @@ def mostrar_exportar_reportes(database_service):
 
     formato = st.radio(
         "Formato de exportacion:",
-        ["Excel (.xlsx)", "CSV (.csv)", "PDF (.pdf)"],
+        ["Excel (.xlsx)", "CSV (.csv)", "PDF (.pdf)", *_FORMATOS_COLUMNARES],
         horizontal=True
     )
 
+    columnas_sel, filas_por_grupo = None, FILAS_POR_GRUPO_COLUMNAR
+    if formato in _FORMATOS_COLUMNARES:
+        col5, col6 = st.columns([3, 1])
+        with col5:
+            columnas_sel = st.multiselect(
+                "Columnas a exportar (vacío = todas):",
+                options=_columnas_reporte(analytics, tipo_reporte)
+            )
+        with col6:
+            filas_por_grupo = st.number_input(
+                "Filas por grupo:", min_value=1000, max_value=1_000_000,
+                value=FILAS_POR_GRUPO_COLUMNAR, step=10000
+            )
+
+    comprimir_csv = False
+    if formato == "CSV (.csv)" and tipo_reporte != "Reporte General":
+        comprimir_csv = st.checkbox("Comprimir CSV (gzip)", value=False)
+
     if formato == "PDF (.pdf)":
         col3, col4 = st.columns(2)
         with col3:
@@ -132,69 +159,256 @@ def mostrar_exportar_reportes(database_service):
         with col4:
             incluir_estadisticas = st.checkbox("Incluir estadisticas", value=True)
 
+    filtros = {
+        'rango_calificaciones': rango_calificaciones if 'rango_calificaciones' in locals() else None,
+        'filtro_desercion': filtro_desercion if 'filtro_desercion' in locals() else None,
+        'filtro_categoria': filtro_categoria if 'filtro_categoria' in locals() else None
+    }
+
+    # la marca es por usuario, tipo de reporte y filtros
+    marcas = MarcasExportacion()
+    clave_marca = marcas.clave(usuario_id() or "anonimo", tipo_reporte, filtros)
+    incremental = st.checkbox(
+        "Solo cambios desde mi última exportación", value=False, key="exportar_incremental",
+        help="Exporta solo las filas nuevas, modificadas o eliminadas desde la última vez que "
+             "exportaste este reporte con estos filtros, con la columna tipo_cambio."
+    )
+    if incremental:
+        marca = marcas.leer(clave_marca)
+        if marca:
+            st.caption(f"Última exportación: {time.strftime('%d/%m/%Y %H:%M', time.localtime(marca['fecha']))}")
+        else:
+            st.caption("Aún no has exportado este reporte con estos filtros: la primera vez salen todas las filas.")
+        if columnas_sel:
+            columnas_sel = [COLUMNA_CAMBIO, 'id', 'id_cal', *columnas_sel]
+
     if st.button("🔄 Generar Reporte", type="primary"):
         try:
             with st.spinner("Generando reporte..."):
-                datos_filtrados = aplicar_filtros_y_generar_datos(analytics, tipo_reporte, {
-                    'rango_calificaciones': rango_calificaciones if 'rango_calificaciones' in locals() else None,
-                    'filtro_desercion': filtro_desercion if 'filtro_desercion' in locals() else None,
-                    'filtro_categoria': filtro_categoria if 'filtro_categoria' in locals() else None
-                })
-
-                if datos_filtrados is None or (isinstance(datos_filtrados, dict) and all(v is None for v in datos_filtrados.values())):
-                    st.warning("⚠️ No hay datos para generar el reporte con los filtros seleccionados.")
-                    return
-
-                if formato in ["Excel (.xlsx)", "CSV (.csv)"]:
-                    archivo = generar_archivo_descarga(datos_filtrados, tipo_reporte, formato)
-
-                    if archivo:
+                if formato == "PDF (.pdf)":
+                    opciones = {'graficas': incluir_graficas, 'estadisticas': incluir_estadisticas}
+                else:
+                    opciones = {'comprimir': comprimir_csv, 'columnas': columnas_sel, 'filas_por_grupo': filas_por_grupo}
+
+                # el mismo reporte sobre los mismos datos se sirve desde disco
+                cache = cache_artefactos()
+                snap = analytics.snapshot()
+                metricas_pdf = None
+                clave = cache.clave(tipo=tipo_reporte, filtros=filtros, formato=formato, opciones=opciones,
+                                    alcance=snap.alcance, datos=firma_datos(snap.huella))
+                # los cambios dependen de la marca de cada usuario: no pasan por la cache
+                archivo = None if incremental else cache.obtener(clave)
+                datos_filtrados = None
+
+                if archivo is not None:
+                    st.download_button(
+                        label=f"📥 Descargar Reporte {formato.split(' (')[0]}",
+                        data=archivo["archivo"],
+                        file_name=_nombre_reporte(tipo_reporte) + archivo["extension"],
+                        mime=archivo["mime"]
+                    )
+                    st.success("✅ Reporte PDF generado" if formato == "PDF (.pdf)" else "✅ Reporte generado")
+                    st.caption("Reporte servido desde la caché: los datos no cambiaron desde que se generó.")
+                else:
+                    datos_filtrados = aplicar_filtros_y_generar_datos(analytics, tipo_reporte, filtros)
+
+                    if datos_filtrados is None or (isinstance(datos_filtrados, dict) and all(v is None for v in datos_filtrados.values())):
+                        st.warning("⚠️ No hay datos para generar el reporte con los filtros seleccionados.")
+                        datos_filtrados = None
+                    elif incremental:
+                        firma = firma_datos(snap.huella)
+                        datos_filtrados, huellas, conteo = cambios_desde(
+                            {k: v for k, v in datos_filtrados.items() if v is not None},
+                            marcas.leer(clave_marca), firma)
+                        if not any(conteo.values()):
+                            st.info("✅ No hay cambios desde tu última exportación de este reporte.")
+                            datos_filtrados = None
+                        else:
+                            st.caption(f"Cambios: {conteo['nuevo']} nuevas · {conteo['modificado']} modificadas"
+                                       f" · {conteo['eliminado']} eliminadas")
+                            if formato != "PDF (.pdf)":
+                                st.subheader("📊 Vista Previa del Reporte")
+                                mostrar_vista_previa(datos_filtrados, tipo_reporte)
+                    elif formato != "PDF (.pdf)":
                         st.subheader("📊 Vista Previa del Reporte")
                         mostrar_vista_previa(datos_filtrados, tipo_reporte)
 
-                        nombre_archivo = f"reporte_{tipo_reporte.lower().replace(' ', '_')}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}"
-
-                        if formato == "Excel (.xlsx)":
-                            nombre_archivo += ".xlsx"
-                            st.download_button(
-                                label="📥 Descargar Reporte Excel",
-                                data=archivo,
-                                file_name=nombre_archivo,
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                            )
-                        else:
-                            nombre_archivo += ".csv"
-                            st.download_button(
-                                label="📥 Descargar Reporte CSV",
-                                data=archivo,
-                                file_name=nombre_archivo,
-                                mime="text/csv"
-                            )
-
-                        st.success("✅ Reporte generado")
-                    else:
-                        st.error("❌ Error al generar el archivo")
-
-                elif formato == "PDF (.pdf)":
-                    archivo_pdf = generar_pdf(analytics, datos_filtrados, tipo_reporte,
-                                              incluir_graficas=incluir_graficas,
-                                              incluir_estadisticas=incluir_estadisticas)
-
-                    if archivo_pdf:
-                        nombre_archivo = f"reporte_{tipo_reporte.lower().replace(' ', '_')}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-                        st.download_button(
-                            label="📥 Descargar Reporte PDF",
-                            data=archivo_pdf,
-                            file_name=nombre_archivo,
-                            mime="application/pdf"
-                        )
-                        st.success("✅ Reporte PDF generado")
-                    else:
-                        st.error("❌ Error al generar el reporte PDF")
+                    if datos_filtrados is not None and formato == "PDF (.pdf)":
+                        # el trabajo corre en otro hilo sin sesion: lo que depende del usuario se resuelve aqui
+                        # (snap ya se tomo arriba, en este mismo hilo)
+                        metricas_pdf = entradas_pdf(analytics, incluir_estadisticas)[1]
+
+            # el archivo se arma en segundo plano; la pagina sigue respondiendo
+            def generar(avance):
+                if formato == "PDF (.pdf)":
+                    contenido = construir_pdf(snap, datos_filtrados, tipo_reporte, incluir_graficas,
+                                              metricas_pdf, avance=avance)
+                    resultado = {"archivo": contenido, "extension": ".pdf", "mime": "application/pdf"}
+                else:
+                    avance(0.2, "Escribiendo archivo...")
+                    resultado = construir_archivo(datos_filtrados, tipo_reporte, formato, comprimir_csv,
+                                                  columnas=columnas_sel, filas_por_grupo=filas_por_grupo)
+                if not resultado:
+                    return None
+                if incremental:
+                    # la marca avanza cuando el usuario descarga el archivo, no antes
+                    return dict(resultado, marca=(clave_marca, huellas, firma))
+                try:
+                    return cache.guardar(clave, resultado, snap.alcance, snap.huella)
+                except OSError:
+                    return resultado  # sin cache en disco se entrega igual
+
+            if datos_filtrados is not None:
+                descripcion = f"{tipo_reporte} · {formato.split(' (')[0]}" + (" · solo cambios" if incremental else "")
+                id_ = trabajador_reportes().enviar(generar, descripcion, clave=None if incremental else clave)
+                st.session_state.setdefault("reportes_pedidos", {})[id_] = _nombre_reporte(tipo_reporte)
 
         except Exception as e:
             st.error(f"❌ Error generando reporte: {e}")
 
+    _seccion_lote(analytics)
+    _panel_reportes()
+
+
+def _seccion_lote(analytics):
+    """Un PDF por grupo o por docente del periodo, todos en un zip generado en segundo plano."""
+    with st.expander("🗂️ Reportes PDF por lote (por grupo o por docente)"):
+        try:
+            snap = analytics.snapshot()
+            grupos, materias = snap["grupos"], snap["materias"]
+        except Exception as e:
+            st.error(f"No fue posible leer los grupos: {e}")
+            return
+        if grupos.empty:
+            st.info("No hay grupos registrados")
+            return
+
+        col1, col2 = st.columns(2)
+        with col1:
+            periodo = st.selectbox("Periodo:", sorted(grupos["periodo"].dropna().unique(), reverse=True),
+                                   key="lote_periodo")
+        with col2:
+            modo = st.radio("Un PDF por:", ["Grupo", "Docente"], horizontal=True, key="lote_modo")
+
+        del_periodo = grupos[grupos["periodo"] == periodo]
+        if modo == "Grupo":
+            nombres = dict(zip(materias["id"], materias["nombre"])) if not materias.empty else {}
+            opciones = {documento_grupo(m, p, g): f"{nombres.get(m, f'Materia {m}')} · Grupo {g}"
+                        for m, p, g in zip(del_periodo["materia_id"], del_periodo["periodo"], del_periodo["grupo"])}
+        else:
+            con_grupo = materias[materias["id"].isin(del_periodo["materia_id"])] if not materias.empty else materias
+            opciones = {documento_docente(d, periodo): nombre for d, nombre in docentes_de(con_grupo).items()}
+        if not opciones:
+            st.info("No hay grupos con docente asignado en ese periodo" if modo == "Docente"
+                    else "No hay grupos en ese periodo")
+            return
+
+        elegidos = st.multiselect(f"{modo}s a incluir (vacío = todos, {len(opciones)}):", list(opciones),
+                                  format_func=opciones.get, key=f"lote_documentos_{modo}")
+        if st.button("🗂️ Generar lote de PDFs", key="generar_lote_pdf"):
+            documentos = elegidos or list(opciones)
+            cache = cache_artefactos()
+            clave = cache.clave(tipo="lote_pdf", documentos=documentos, alcance=snap.alcance,
+                                datos=firma_datos(snap.huella))
+
+            def generar(avance):
+                guardado = cache.obtener(clave)
+                if guardado is not None:
+                    guardado["resumen"] = "Lote servido desde la caché: los datos no cambiaron."
+                    return guardado
+                lote = generar_lote(snap.tablas, documentos, avance=avance)
+                resumen = (f"{lote['documentos']} PDF en {lote['segundos']:.1f} s · "
+                           f"{lote['por_segundo']:.1f} reportes/s")
+                try:
+                    lote = cache.guardar(clave, lote, snap.alcance, snap.huella)
+                except OSError:
+                    pass
+                lote["resumen"] = resumen
+                return lote
+
+            descripcion = f"Lote de {len(documentos)} PDF por {modo.lower()} ({periodo})"
+            id_ = trabajador_reportes().enviar(generar, descripcion, clave=clave)
+            st.session_state.setdefault("reportes_pedidos", {})[id_] = f"reportes_{modo.lower()}_{periodo}"
+
+
+def _avanzar_marca(clave_marca, huellas, firma):
+    """Al descargar un reporte de solo cambios, lo exportado pasa a ser la nueva marca."""
+    try:
+        MarcasExportacion().guardar(clave_marca, huellas, firma)
+    except OSError as e:
+        st.error(f"No se pudo guardar la marca de exportación: {e}")
+
+
+def _nombre_reporte(tipo_reporte):
+    return f"reporte_{tipo_reporte.lower().replace(' ', '_')}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}"
+
+
+def _mostrar_avance_reportes():
+    """Progreso de los reportes en curso de la sesion; se ejecuta como fragmento."""
+    trabajador = trabajador_reportes()
+    terminados = 0
+    for id_ in list(st.session_state.get("reportes_pedidos", {})):
+        p = trabajador.progreso(id_)
+        if p is None or p["estado"] not in EN_CURSO:
+            terminados += 1
+            continue
+        texto = "En espera de otro reporte..." if p["estado"] == "en_cola" else p["texto"]
+        st.progress(p["avance"], text=f"{p['descripcion']}: {texto}")
+    # alguno termino: se redibuja la pagina para ofrecer su descarga
+    if terminados != st.session_state.get("reportes_terminados", 0):
+        st.session_state["reportes_terminados"] = terminados
+        st.rerun()
+
+
+def _panel_reportes():
+    """Descargas de los reportes terminados y avance de los que siguen en curso."""
+    pedidos = st.session_state.get("reportes_pedidos", {})
+    if not pedidos:
+        return
+    trabajador = trabajador_reportes()
+    st.subheader("📥 Mis Reportes")
+    en_curso = 0
+    for id_, nombre in list(pedidos.items()):
+        p = trabajador.progreso(id_)
+        if p is None:
+            pedidos.pop(id_)
+            continue
+        if p["estado"] in EN_CURSO:
+            en_curso += 1
+            continue
+        archivo = trabajador.resultado(id_)
+        col_info, col_descartar = st.columns([4, 1])
+        with col_info:
+            if p["estado"] == "error":
+                st.error(f"❌ {p['descripcion']}: {p['error']}")
+            elif archivo is not None:
+                st.download_button(
+                    label=f"📥 Descargar {p['descripcion']} ({p['segundos']:.1f} s)",
+                    data=archivo["archivo"],
+                    file_name=nombre + archivo["extension"],
+                    mime=archivo["mime"],
+                    key=f"descargar_reporte_{id_}",
+                    on_click=_avanzar_marca if archivo.get("marca") else None,
+                    args=archivo.get("marca")
+                )
+                if archivo.get("resumen"):
+                    st.caption(archivo["resumen"])
+                if archivo.get("marca"):
+                    st.caption("Tu marca de última exportación se actualiza al descargar este archivo.")
+        with col_descartar:
+            if st.button("Quitar", key=f"quitar_reporte_{id_}"):
+                trabajador.descartar(id_)
+                pedidos.pop(id_)
+                st.rerun()
+    st.session_state["reportes_terminados"] = len(pedidos) - en_curso
+    if not en_curso:
+        return
+    st.caption("Puedes seguir usando la página mientras se generan.")
+    if hasattr(st, "fragment"):
+        st.fragment(_mostrar_avance_reportes, run_every=1)()
+    else:
+        _mostrar_avance_reportes()
+
 
 def aplicar_filtros_y_generar_datos(analytics, tipo_reporte, filtros):
     """Aplicar filtros y generar datos para el reporte"""
@@ -216,35 +430,17 @@ def aplicar_filtros_y_generar_datos(analytics, tipo_reporte, filtros):
         return None
 
 
+def _seleccion(analytics, tablas, filtros):
+    """{tabla: filas que pasan los filtros}, con las mascaras compiladas del snapshot."""
+    snap = _con_reintentos(lambda: analytics.snapshot())
+    motor = motor_filtros()
+    return {nombre: motor.seleccionar(snap, nombre, filtros) for nombre in tablas}
+
+
 def generar_reporte_general(analytics, filtros):
     """Generar reporte general consolidado"""
     try:
-        df_est = _df_est(analytics)
-        if filtros.get('filtro_desercion') == "En riesgo":
-            df_est = df_est[df_est['desercion'] == True]
-        elif filtros.get('filtro_desercion') == "No en riesgo":
-            df_est = df_est[df_est['desercion'] == False]
-
-        df_cal = _df_cal(analytics)
-        if filtros.get('rango_calificaciones'):
-            rango = filtros['rango_calificaciones']
-            df_cal = df_cal[
-                (df_cal['calificacion_final'] >= rango[0]) &
-                (df_cal['calificacion_final'] <= rango[1])
-            ]
-
-        df_fac = _df_fac(analytics)
-        if filtros.get('filtro_categoria'):
-            df_fac = df_fac[df_fac['categoria'].isin(filtros['filtro_categoria'])]
-
-        df_mat = _df_mat(analytics)
-
-        return {
-            'estudiantes': df_est,
-            'calificaciones': df_cal,
-            'factores': df_fac,
-            'materias': df_mat
-        }
+        return _seleccion(analytics, ('estudiantes', 'calificaciones', 'factores', 'materias'), filtros)
     except Exception as e:
         st.error(f"Error generando reporte general: {e}")
         return None
@@ -253,12 +449,7 @@ def generar_reporte_general(analytics, filtros):
 def generar_reporte_estudiantes(analytics, filtros):
     """Generar reporte de estudiantes"""
     try:
-        df_est = _df_est(analytics)
-        if filtros.get('filtro_desercion') == "En riesgo":
-            df_est = df_est[df_est['desercion'] == True]
-        elif filtros.get('filtro_desercion') == "No en riesgo":
-            df_est = df_est[df_est['desercion'] == False]
-        return {'estudiantes': df_est}
+        return _seleccion(analytics, ('estudiantes',), filtros)
     except Exception as e:
         st.error(f"Error generando reporte de estudiantes: {e}")
         return None
@@ -267,14 +458,7 @@ def generar_reporte_estudiantes(analytics, filtros):
 def generar_reporte_calificaciones(analytics, filtros):
     """Generar reporte de calificaciones"""
     try:
-        df_cal = _df_cal(analytics)
-        if filtros.get('rango_calificaciones'):
-            rango = filtros['rango_calificaciones']
-            df_cal = df_cal[
-                (df_cal['calificacion_final'] >= rango[0]) &
-                (df_cal['calificacion_final'] <= rango[1])
-            ]
-        return {'calificaciones': df_cal}
+        return _seleccion(analytics, ('calificaciones',), filtros)
     except Exception as e:
         st.error(f"Error generando reporte de calificaciones: {e}")
         return None
@@ -283,54 +467,31 @@ def generar_reporte_calificaciones(analytics, filtros):
 def generar_reporte_factores(analytics, filtros):
     """Generar reporte de factores de riesgo"""
     try:
-        df_fac = _df_fac(analytics)
-        if filtros.get('filtro_categoria'):
-            df_fac = df_fac[df_fac['categoria'].isin(filtros['filtro_categoria'])]
-        return {'factores': df_fac}
+        return _seleccion(analytics, ('factores',), filtros)
     except Exception as e:
         st.error(f"Error generando reporte de factores: {e}")
         return None
 
 
 def generar_reporte_personalizado(analytics, filtros):
-    """Generar reporte personalizado"""
+    """Generar reporte personalizado (calificaciones unidas con los datos del alumno)"""
     try:
-        df_cal = _df_cal(analytics)
-        df_est = _df_est(analytics)
-
-        datos_combinados = df_cal.merge(
-            df_est,
-            left_on='estudiante_id',
-            right_on='id',
-            suffixes=('_cal', '_est'),
-            how='left'
-        )
-
-        if filtros.get('rango_calificaciones'):
-            rango = filtros['rango_calificaciones']
-            datos_combinados = datos_combinados[
-                (datos_combinados['calificacion_final'] >= rango[0]) &
-                (datos_combinados['calificacion_final'] <= rango[1])
-            ]
-
-        if filtros.get('filtro_desercion') == "En riesgo":
-            datos_combinados = datos_combinados[datos_combinados['desercion'] == True]
-        elif filtros.get('filtro_desercion') == "No en riesgo":
-            datos_combinados = datos_combinados[datos_combinados['desercion'] == False]
-
-        return {'personalizado': datos_combinados}
+        return _seleccion(analytics, ('personalizado',), filtros)
     except Exception as e:
         st.error(f"Error generando reporte personalizado: {e}")
         return None
 
 
-def generar_archivo_descarga(datos, tipo_reporte, formato):
+def generar_archivo_descarga(datos, tipo_reporte, formato, comprimir=False, columnas=None,
+                             filas_por_grupo=FILAS_POR_GRUPO_COLUMNAR):
     """Generar archivo para descarga segun el formato"""
     try:
         if formato == "Excel (.xlsx)":
             return generar_excel(datos, tipo_reporte)
         elif formato == "CSV (.csv)":
-            return generar_csv(datos, tipo_reporte)
+            return generar_csv(datos, tipo_reporte, comprimir)
+        elif formato in _FORMATOS_COLUMNARES:
+            return generar_columnar(datos, tipo_reporte, _FORMATOS_COLUMNARES[formato], columnas, filas_por_grupo)
         else:
             return None
     except Exception as e:
@@ -338,281 +499,258 @@ def generar_archivo_descarga(datos, tipo_reporte, formato):
         return None
 
 
-def generar_excel(datos, tipo_reporte):
-    """Generar archivo Excel con multiples hojas"""
-    try:
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            if tipo_reporte == "Reporte General":
-                for nombre_hoja, df in datos.items():
-                    if df is not None and not df.empty:
-                        df.to_excel(writer, sheet_name=nombre_hoja.capitalize(), index=False)
-            elif tipo_reporte == "Reporte de Estudiantes" and 'estudiantes' in datos:
-                datos['estudiantes'].to_excel(writer, sheet_name='Estudiantes', index=False)
-            elif tipo_reporte == "Reporte de Calificaciones" and 'calificaciones' in datos:
-                datos['calificaciones'].to_excel(writer, sheet_name='Calificaciones', index=False)
-            elif tipo_reporte == "Reporte de Factores de Riesgo" and 'factores' in datos:
-                datos['factores'].to_excel(writer, sheet_name='Factores_Riesgo', index=False)
-            elif tipo_reporte == "Reporte Personalizado" and 'personalizado' in datos:
-                datos['personalizado'].to_excel(writer, sheet_name='Reporte_Personalizado', index=False)
-        output.seek(0)
-        return output.getvalue()
-    except Exception as e:
-        st.error(f"Error generando Excel: {e}")
+def construir_archivo(datos, tipo_reporte, formato, comprimir=False, columnas=None,
+                      filas_por_grupo=FILAS_POR_GRUPO_COLUMNAR):
+    """
+    Igual que generar_archivo_descarga pero lanza los errores en vez de
+    mostrarlos: lo usan los trabajos en segundo plano, donde st.error no llega
+    a la pagina.
+    """
+    if formato == "Excel (.xlsx)":
+        hojas = _hojas_reporte(datos, tipo_reporte)
+        return exportar_excel(hojas) if hojas else None
+    secciones = _secciones_reporte(datos, tipo_reporte)
+    if not secciones:
         return None
+    if formato == "CSV (.csv)":
+        return exportar_csv(secciones, comprimir)
+    if formato in _FORMATOS_COLUMNARES:
+        try:
+            return exportar_columnar(secciones, _FORMATOS_COLUMNARES[formato], columnas, filas_por_grupo)
+        except ImportError as e:
+            raise RuntimeError("para exportar en formatos columnares instala pyarrow (pip install pyarrow)") from e
+    return None
+
+
+# hoja de Excel de cada reporte de una sola tabla
+_HOJA_REPORTE = {
+    "Reporte de Estudiantes": ("estudiantes", "Estudiantes"),
+    "Reporte de Calificaciones": ("calificaciones", "Calificaciones"),
+    "Reporte de Factores de Riesgo": ("factores", "Factores_Riesgo"),
+    "Reporte Personalizado": ("personalizado", "Reporte_Personalizado"),
+}
+
 
+# formatos columnares para quien reimporta los datos en sus herramientas
+_FORMATOS_COLUMNARES = {
+    "Parquet (.parquet)": "parquet",
+    "Feather (.feather)": "feather",
+    "Arrow IPC (.arrows)": "arrow",
+}
 
-def generar_csv(datos, tipo_reporte):
-    """Generar archivo CSV"""
+
+def _columnas_reporte(analytics, tipo_reporte):
+    """Columnas que tendra el reporte, para elegir cuales exportar (sin filtrar ni unir los datos)."""
     try:
+        vacias = {
+            "estudiantes": _df_est(analytics).head(0),
+            "calificaciones": _df_cal(analytics).head(0),
+            "factores": _df_fac(analytics).head(0),
+            "materias": _df_mat(analytics).head(0),
+        }
         if tipo_reporte == "Reporte General":
-            if 'estudiantes' in datos and not datos['estudiantes'].empty:
-                return datos['estudiantes'].to_csv(index=False).encode('utf-8')
-        elif tipo_reporte == "Reporte de Estudiantes" and 'estudiantes' in datos:
-            return datos['estudiantes'].to_csv(index=False).encode('utf-8')
-        elif tipo_reporte == "Reporte de Calificaciones" and 'calificaciones' in datos:
-            return datos['calificaciones'].to_csv(index=False).encode('utf-8')
-        elif tipo_reporte == "Reporte de Factores de Riesgo" and 'factores' in datos:
-            return datos['factores'].to_csv(index=False).encode('utf-8')
-        elif tipo_reporte == "Reporte Personalizado" and 'personalizado' in datos:
-            return datos['personalizado'].to_csv(index=False).encode('utf-8')
+            tablas = list(vacias.values())
+        elif tipo_reporte == "Reporte Personalizado":
+            tablas = [vacias["calificaciones"].merge(vacias["estudiantes"], left_on='estudiante_id',
+                                                      right_on='id', suffixes=('_cal', '_est'), how='left')]
+        else:
+            tablas = [vacias[_SECCION_REPORTE[tipo_reporte]]]
+        return list(dict.fromkeys(c for df in tablas for c in df.columns))
+    except Exception:
+        return []
+
+
+def generar_columnar(datos, tipo_reporte, formato, columnas=None, filas_por_grupo=FILAS_POR_GRUPO_COLUMNAR):
+    """Generar Parquet, Feather o Arrow IPC conservando los tipos de cada columna"""
+    try:
+        secciones = _secciones_reporte(datos, tipo_reporte)
+        return exportar_columnar(secciones, formato, columnas, filas_por_grupo) if secciones else None
+    except ImportError:
+        st.error("Para exportar en formatos columnares instala pyarrow (pip install pyarrow)")
         return None
     except Exception as e:
-        st.error(f"Error generando CSV: {e}")
+        st.error(f"Error generando {formato}: {e}")
         return None
 
 
-def generar_pdf(analytics, datos, tipo_reporte, incluir_graficas=True, incluir_estadisticas=True):
-    """Generar reporte PDF profesional"""
+def generar_excel(datos, tipo_reporte):
+    """Generar archivo Excel con multiples hojas, fila por fila y con memoria acotada"""
     try:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch)
-        elements = []
-        styles = getSampleStyleSheet()
-
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            textColor=colors.HexColor('#2C3E50'),
-            alignment=1
-        )
-
-        subtitle_style = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Heading2'],
-            fontSize=12,
-            spaceAfter=12,
-            textColor=colors.HexColor('#34495E')
-        )
-
-        elements.append(Paragraph("SISTEMA DE ANALISIS ACADEMICO - ITT", title_style))
-        elements.append(Paragraph(f"Reporte: {tipo_reporte}", subtitle_style))
-        elements.append(Paragraph(f"Fecha: {pd.Timestamp.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
-        elements.append(Spacer(1, 20))
+        hojas = _hojas_reporte(datos, tipo_reporte)
+        return exportar_excel(hojas) if hojas else None
+    except Exception as e:
+        st.error(f"Error generando Excel: {e}")
+        return None
 
-        elements.append(Paragraph("RESUMEN EJECUTIVO", subtitle_style))
-
-        if incluir_estadisticas:
-            metricas = _con_reintentos(lambda: analytics.calcular_metricas_principales())
-            stats_data = [
-                ["Metrica", "Valor"],
-                ["Total Estudiantes", str(metricas['total_estudiantes'])],
-                ["Total Calificaciones", str(metricas['total_calificaciones'])],
-                ["Tasa de Aprobacion", f"{metricas['tasa_aprobacion']}%"],
-                ["Tasa de Reprobacion", f"{metricas['tasa_reprobacion']}%"],
-                ["Tasa de Desercion", f"{metricas['tasa_desercion']}%"]
-            ]
-            stats_table = Table(stats_data, colWidths=[2.5*inch, 2*inch])
-            stats_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#ECF0F1')),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            elements.append(stats_table)
-            elements.append(Spacer(1, 20))
-
-        elements.append(Paragraph("DATOS DETALLADOS", subtitle_style))
 
-        if tipo_reporte == "Reporte General":
-            for seccion, df in datos.items():
-                if df is not None and not df.empty:
-                    elements.append(Paragraph(f"{seccion.upper()}", styles['Heading3']))
-                    df_display = df.head(10)
-                    table_data = [df_display.columns.tolist()] + df_display.values.tolist()
-                    if table_data:
-                        pdf_table = Table(table_data, repeatRows=1)
-                        pdf_table.setStyle(TableStyle([
-                            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2C3E50')),
-                            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                            ('FONTSIZE', (0, 0), (-1, 0), 8),
-                            ('FONTSIZE', (0, 1), (-1, -1), 6),
-                            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-                            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F8F9FA')),
-                            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
-                        ]))
-                        elements.append(pdf_table)
-                        elements.append(Spacer(1, 10))
+def _hojas_reporte(datos, tipo_reporte):
+    """{hoja: df} que lleva el Excel del reporte."""
+    if tipo_reporte == "Reporte General":
+        return {n.capitalize(): df for n, df in datos.items() if df is not None and not df.empty}
+    clave, hoja = _HOJA_REPORTE.get(tipo_reporte, (None, None))
+    return {hoja: datos[clave]} if clave in datos else {}
 
-        elif tipo_reporte == "Reporte de Estudiantes" and 'estudiantes' in datos:
-            df = datos['estudiantes']
-            if not df.empty:
-                df_display = df.head(15)
-                table_data = [df.columns.tolist()] + df_display.values.tolist()
-                pdf_table = crear_tabla_pdf(table_data)
-                elements.append(pdf_table)
 
-        elif tipo_reporte == "Reporte de Calificaciones" and 'calificaciones' in datos:
-            df = datos['calificaciones']
-            if not df.empty:
-                df_display = df.head(15)
-                table_data = [df.columns.tolist()] + df_display.values.tolist()
-                pdf_table = crear_tabla_pdf(table_data)
-                elements.append(pdf_table)
+# graficas del PDF, en este orden
+GRAFICAS_PDF = ["distribucion", "promedio_carrera", "reprobacion_carrera", "estudiantes_carrera"]
 
-        elif tipo_reporte == "Reporte de Factores de Riesgo" and 'factores' in datos:
-            df = datos['factores']
-            if not df.empty:
-                df_display = df.head(15)
-                table_data = [df.columns.tolist()] + df_display.values.tolist()
-                pdf_table = crear_tabla_pdf(table_data)
-                elements.append(pdf_table)
-
-        if incluir_graficas:
-            try:
-                df_cal = _df_cal(analytics)
-                if not df_cal.empty:
-                    elements.append(Spacer(1, 20))
-                    elements.append(Paragraph("ANALISIS GRAFICO", subtitle_style))
-
-                    fig1 = crear_grafica_distribucion(df_cal)
-                    if fig1:
-                        img_buffer1 = BytesIO()
-                        fig1.savefig(img_buffer1, format='png', dpi=150, bbox_inches='tight')
-                        img_buffer1.seek(0)
-                        elements.append(Paragraph("Distribucion de Calificaciones", styles['Heading4']))
-                        elements.append(Image(img_buffer1, width=6*inch, height=3*inch))
-                        elements.append(Spacer(1, 10))
-
-                fig2 = crear_grafica_tasas_carrera(analytics)
-                if fig2:
-                    img_buffer2 = BytesIO()
-                    fig2.savefig(img_buffer2, format='png', dpi=150, bbox_inches='tight')
-                    img_buffer2.seek(0)
-                    elements.append(Paragraph("Tasas por Carrera", styles['Heading4']))
-                    elements.append(Image(img_buffer2, width=6*inch, height=3*inch))
-
-            except Exception as e:
-                elements.append(Paragraph(f"Nota: No se pudieron incluir las graficas: {str(e)}", styles['Italic']))
 
-        elements.append(Spacer(1, 20))
-        elements.append(Paragraph("---", styles['Normal']))
-        elements.append(Paragraph(
-            "Reporte generado automaticamente por el Sistema de Analisis Academico",
-            ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.grey)
-        ))
+# seccion de datos que exporta cada reporte de una sola tabla
+_SECCION_REPORTE = {
+    "Reporte de Estudiantes": "estudiantes",
+    "Reporte de Calificaciones": "calificaciones",
+    "Reporte de Factores de Riesgo": "factores",
+    "Reporte Personalizado": "personalizado",
+}
 
-        doc.build(elements)
-        buffer.seek(0)
-        return buffer.getvalue()
 
+def generar_csv(datos, tipo_reporte, comprimir=False):
+    """Generar CSV por bloques en un archivo temporal; el reporte general sale como zip"""
+    try:
+        secciones = _secciones_reporte(datos, tipo_reporte)
+        return exportar_csv(secciones, comprimir) if secciones else None
     except Exception as e:
-        st.error(f"Error generando PDF: {e}")
+        st.error(f"Error generando CSV: {e}")
         return None
 
 
-def crear_tabla_pdf(table_data):
-    """Crear tabla estilizada para PDF"""
-    table = Table(table_data, repeatRows=1)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('FONTSIZE', (0, 1), (-1, -1), 7),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F8F9FA')),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F9FA')])
-    ]))
-    return table
-
-
-def crear_grafica_distribucion(df_calificaciones):
-    """Crear grafica de distribucion de calificaciones"""
+def _secciones_reporte(datos, tipo_reporte):
+    """{nombre: df} que exporta el reporte en CSV o formato columnar."""
+    if tipo_reporte == "Reporte General":
+        return {n: df for n, df in datos.items() if df is not None and not df.empty}
+    clave = _SECCION_REPORTE.get(tipo_reporte)
+    return {clave: datos[clave]} if clave in datos else {}
+
+
+def generar_pdf(analytics, datos, tipo_reporte, incluir_graficas=True, incluir_estadisticas=True):
+    """Generar reporte PDF profesional"""
     try:
-        if df_calificaciones.empty or 'calificacion_final' not in df_calificaciones.columns:
-            return None
-        fig, ax = plt.subplots(figsize=(8, 4))
-        ax.hist(df_calificaciones['calificacion_final'], bins=15, color='skyblue', edgecolor='black', alpha=0.7)
-        ax.axvline(x=70, color='red', linestyle='--', linewidth=2, label='Limite Aprobacion (70)')
-        ax.set_xlabel('Calificacion Final')
-        ax.set_ylabel('Frecuencia')
-        ax.set_title('Distribucion de Calificaciones')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-        plt.tight_layout()
-        return fig
-    except Exception:
+        snap, metricas = entradas_pdf(analytics, incluir_estadisticas)
+        return construir_pdf(snap, datos, tipo_reporte, incluir_graficas, metricas)
+    except Exception as e:
+        st.error(f"Error generando PDF: {e}")
         return None
 
 
-def crear_grafica_tasas_carrera(analytics):
-    """Crear grafica de promedio general por carrera"""
-    try:
-        from config.constants import CARRERAS
+def entradas_pdf(analytics, incluir_estadisticas=True):
+    """
+    (snapshot, metricas o None) del PDF. Se resuelven en el hilo del script: el
+    alcance (global o del docente) sale de la sesion, que un hilo en segundo
+    plano no ve.
+    """
+    snap = _con_reintentos(lambda: analytics.snapshot())
+    metricas = _con_reintentos(lambda: analytics.calcular_metricas_principales()) if incluir_estadisticas else None
+    return snap, metricas
 
-        df_cal = _df_cal(analytics)
-        df_est = _df_est(analytics)
-        if df_cal.empty or df_est.empty:
-            return None
 
-        datos_combinados = df_cal.merge(
-            df_est[['id', 'carrera_id']],
-            left_on='estudiante_id',
-            right_on='id',
-            how='left'
-        )
-
-        promedios_por_carrera = []
-        for carrera_id in datos_combinados['carrera_id'].dropna().unique():
-            datos_carrera = datos_combinados[datos_combinados['carrera_id'] == carrera_id]
-            if len(datos_carrera) > 0:
-                promedio = datos_carrera['calificacion_final'].mean()
-                nombre_carrera = CARRERAS.get(int(carrera_id), f'Carrera {carrera_id}')
-                promedios_por_carrera.append((nombre_carrera, promedio))
-
-        if not promedios_por_carrera:
-            return None
+def construir_pdf(snapshot, datos, tipo_reporte, incluir_graficas=True, metricas=None, avance=None):
+    """
+    Arma el PDF y devuelve sus bytes; los errores se lanzan. snapshot y
+    metricas vienen de entradas_pdf (sin metricas no hay tabla de
+    estadisticas). avance(fraccion, texto) recibe el progreso cuando corre como
+    trabajo en segundo plano.
+    """
+    avance = avance or (lambda fraccion, texto="": None)
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30,
+        textColor=colors.HexColor('#2C3E50'),
+        alignment=1
+    )
 
-        promedios_por_carrera.sort(key=lambda x: x[1], reverse=True)
-        carreras, promedios = zip(*promedios_por_carrera)
+    subtitle_style = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Heading2'],
+        fontSize=12,
+        spaceAfter=12,
+        textColor=colors.HexColor('#34495E')
+    )
 
-        fig, ax = plt.subplots(figsize=(8, 4))
-        bars = ax.barh(carreras, promedios, color='mediumseagreen', edgecolor='black')
+    elements.append(Paragraph("SISTEMA DE ANALISIS ACADEMICO - ITT", title_style))
+    elements.append(Paragraph(f"Reporte: {tipo_reporte}", subtitle_style))
+    elements.append(Paragraph(f"Fecha: {pd.Timestamp.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
+    elements.append(Spacer(1, 20))
+
+    elements.append(Paragraph("RESUMEN EJECUTIVO", subtitle_style))
+
+    if metricas is not None:
+        avance(0.1, "Agregando estadisticas...")
+        stats_data = [
+            ["Metrica", "Valor"],
+            ["Total Estudiantes", str(metricas['total_estudiantes'])],
+            ["Total Calificaciones", str(metricas['total_calificaciones'])],
+            ["Tasa de Aprobacion", f"{metricas['tasa_aprobacion']}%"],
+            ["Tasa de Reprobacion", f"{metricas['tasa_reprobacion']}%"],
+            ["Tasa de Desercion", f"{metricas['tasa_desercion']}%"]
+        ]
+        stats_table = Table(stats_data, colWidths=[2.5*inch, 2*inch])
+        stats_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#ECF0F1')),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        elements.append(stats_table)
+        elements.append(Spacer(1, 20))
 
-        for bar, valor in zip(bars, promedios):
-            ax.text(bar.get_width() + 1, bar.get_y() + bar.get_height() / 2,
-                    f"{valor:.1f}", va='center', fontsize=8, color='black')
+    avance(0.3, "Agregando tablas...")
+    elements.append(Paragraph("DATOS DETALLADOS", subtitle_style))
 
-        ax.set_xlabel('Promedio General de Calificacion')
-        ax.set_ylabel('Carreras')
-        ax.set_title('Promedio General por Carrera')
-        ax.set_xlim(0, 100)
-        plt.tight_layout()
-        return fig
+    # tablas completas, partidas en trozos del alto de una pagina
+    if tipo_reporte == "Reporte General":
+        for seccion, df in datos.items():
+            if df is not None and not df.empty:
+                elements.append(Paragraph(f"{seccion.upper()}", styles['Heading3']))
+                elements.extend(tablas_pdf(df, doc.width, doc.height, fondo_encabezado='#2C3E50',
+                                           fuente_encabezado=8, fuente=6))
+                elements.append(Spacer(1, 10))
 
-    except Exception:
-        return None
+    elif _SECCION_REPORTE.get(tipo_reporte) in datos:
+        elements.extend(tablas_pdf(datos[_SECCION_REPORTE[tipo_reporte]], doc.width, doc.height,
+                                   fuente_encabezado=9, fuente=7))
+
+    if incluir_graficas:
+        avance(0.5, "Dibujando graficas...")
+        try:
+            # las que no estan en la cache de figuras se dibujan a la vez en otros procesos
+            pngs = {n: png for n, png in png_graficas(snapshot, GRAFICAS_PDF).items() if png}
+            if pngs:
+                elements.append(Spacer(1, 20))
+                elements.append(Paragraph("ANALISIS GRAFICO", subtitle_style))
+            for nombre, png in pngs.items():
+                elements.append(Paragraph(GRAFICAS[nombre][0], styles['Heading4']))
+                elements.append(Image(BytesIO(png), width=6*inch, height=3*inch))
+                elements.append(Spacer(1, 10))
+        except Exception as e:
+            elements.append(Paragraph(f"Nota: No se pudieron incluir las graficas: {str(e)}", styles['Italic']))
+
+    elements.append(Spacer(1, 20))
+    elements.append(Paragraph("---", styles['Normal']))
+    elements.append(Paragraph(
+        "Reporte generado automaticamente por el Sistema de Analisis Academico",
+        ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.grey)
+    ))
+
+    avance(0.9, "Armando el documento...")
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer.getvalue()
+
+
+def crear_tabla_pdf(table_data):
+    """Crear tabla estilizada para PDF (tablas cortas; las de datos van por tablas_pdf)"""
+    return Table(table_data, repeatRows=1, style=estilo_tabla(fuente_encabezado=9, fuente=7))
 
 
 def mostrar_vista_previa(datos, tipo_reporte):
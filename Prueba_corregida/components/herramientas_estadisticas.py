@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
 from config.constants import CARRERAS, SEMESTRES_INGRESO
+from services.graficas import png_graficas
 
 def mostrar_herramientas_estadisticas(analytics):
     """Mostrar herramientas estadísticas avanzadas"""
@@ -213,15 +214,22 @@ def mostrar_herramientas_estadisticas(analytics):
     
     col1, col2 = st.columns(2)
     
+    # misma cache de figuras que los PDF de exportacion
+    pngs = png_graficas(analytics.snapshot(), ["estudiantes_carrera", "reprobacion_carrera"])
+
     with col1:
         st.write("**Distribución por Carrera**")
-        fig_barras = analytics.generar_grafico_barras_carreras()
-        st.pyplot(fig_barras)
+        if pngs["estudiantes_carrera"]:
+            st.image(pngs["estudiantes_carrera"], use_container_width=True)
+        else:
+            st.info("No hay datos de estudiantes")
     
     with col2:
         st.write("**Tasas por Carrera**")
-        fig_tasas = analytics.generar_grafico_tasas_por_carrera()
-        st.pyplot(fig_tasas)
+        if pngs["reprobacion_carrera"]:
+            st.image(pngs["reprobacion_carrera"], use_container_width=True)
+        else:
+            st.info("No hay datos suficientes")
 
 def crear_diagrama_dispersion(df, variable_x, variable_y):
     """Crear diagrama de dispersión profesional"""
@@ -0,0 +1,57 @@
+import streamlit as st
+
+
+def panel_refrescable(panel, analytics, segundos=None, **kwargs):
+    """
+    Ejecuta panel(analytics) dentro de un st.fragment con run_every: en cada tick
+    solo se vuelve a ejecutar este panel, no la pagina completa (CSS, sidebar, titulo).
+    Sin segundos o sin st.fragment disponible, el panel se dibuja una sola vez.
+    """
+    if not segundos or not hasattr(st, "fragment"):
+        panel(analytics, **kwargs)
+        return
+
+    def _tick():
+        # el margen evita saltarse un ciclo si el temporizador se adelanta un poco;
+        # interacciones con widgets dentro del intervalo no recargan datos
+        try:
+            analytics.refrescar_datos(max_edad=segundos * 0.8)
+        except Exception:
+            pass
+        panel(analytics, **kwargs)
+
+    st.fragment(_tick, run_every=segundos)()
+
+
+# ===== Memo de render por sesion
+def firma_panel(analytics, *estado):
+    """
+    Entradas de un panel: alcance y version de los datos, modo de daltonismo
+    (cambia los colores de las figuras) y el estado de sus widgets.
+    """
+    return (analytics.clave_cache, st.session_state.get("a11y_modo_daltonismo", "ninguno")) + estado
+
+
+def memo_render(clave, entradas, construir):
+    """
+    Devuelve el payload (png, tablas, textos) que produjo construir() la ultima vez
+    que este panel se dibujo en la sesion con las mismas entradas. Si cambiaron,
+    lo reconstruye y lo guarda. Un tick sin cambios no toca pandas ni matplotlib.
+    """
+    slot = f"_memo_render_{clave}"
+    previo = st.session_state.get(slot)
+    if previo is not None and previo[0] == entradas:
+        return previo[1]
+    payload = construir()
+    st.session_state[slot] = (entradas, payload)
+    return payload
+
+
+def figura_png(fig) -> bytes:
+    """Rasteriza la figura como lo haria st.pyplot y la cierra para liberar memoria."""
+    import matplotlib.pyplot as plt
+    from io import BytesIO
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=200, bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
@@ -1,12 +1,18 @@
 # components/registro_datos.py
+import io
 import re
 import unicodedata
 import time
 import streamlit as st
 import pandas as pd
-import numpy as np
-from config.constants import CARRERAS, CATEGORIAS_FACTORES, SEMESTRES_INGRESO
+from config.constants import (CARRERAS, CATEGORIAS_FACTORES, SEMESTRES_INGRESO, MAX_FILAS_REPORTE,
+                              ESCRITURA_DIFERIDA_CALIFICACIONES)
 from services.analytics import AnalyticsService
+from services.matriculas import asignador_matriculas, formatear
+from services.calificaciones import COLS_CAPTURA, cambios_captura, guardar_calificaciones, tabla_captura
+from services.cola_calificaciones import cola_calificaciones
+from services.importacion import (ImportacionEnBloques, TrabajoImportacion, col_txt, filas_para_guardar,
+                                  id_trabajo, leer_por_bloques, trabajador_importaciones)
 
 # RBAC
 try:
@@ -28,81 +34,17 @@ def _norm_txt(x: str) -> str:
     s = re.sub(r"\s+", " ", s).lower()
     return s
 
-def _to_int(x, default=None):
-    try:
-        if pd.isna(x):
-            return default
-        return int(x)
-    except Exception:
-        return default
-
-def _to_float(x, default=None):
-    try:
-        if pd.isna(x):
-            return default
-        return float(x)
-    except Exception:
-        return default
-
-def _to_bool(x):
-    if isinstance(x, bool):
-        return x
-    s = str(x).strip().lower()
-    return s in ("1", "si", "sí", "true", "t", "y", "yes")
-
-def _student_key_row(row) -> tuple:
-    return (
-        _norm_txt(row.get("nombres", "")),
-        _norm_txt(row.get("apellido_paterno", "")),
-        _norm_txt(row.get("apellido_materno", "")),
-        _to_int(row.get("carrera_id"), 0),
-        str(row.get("ingreso_semestre", "")).strip(),
-    )
-
-def _ensure_columns(df: pd.DataFrame, required: list) -> list:
-    if df is None or df.empty:
-        return required[:]
-    faltan = [c for c in required if c not in df.columns]
-    return faltan
-
 def _siguiente_matricula(analytics, prefijo="A"):
     """
     Sugerencia simple: A001, A002, ...
-    Busca el numero mas alto al final de las matriculas existentes y suma 1.
+    Sale del asignador del proceso, que ya conoce el numero mas alto del snapshot.
     """
     try:
-        df = analytics.df_estudiantes
-        if df.empty or "matricula" not in df.columns:
-            return f"{prefijo}001"
-
-        nums = []
-        for v in df["matricula"].dropna().astype(str).tolist():
-            m = re.search(r"(\d+)$", v)
-            if m:
-                nums.append(int(m.group(1)))
-        n = (max(nums) if nums else 0) + 1
-        return f"{prefijo}{n:03d}"
+        analytics.snapshot()
+        return asignador_matriculas().sugerir(prefijo)
     except Exception:
-        return f"{prefijo}001"
-
+        return formatear(prefijo, 1)
 
-def _siguiente_matricula_lote(usados: set[str], prefijo="A"):
-    """
-    Igual que la anterior, pero para usar durante importacion en lote,
-    evitando chocar con valores ya usados en BD y en el propio lote.
-    """
-    maxn = 0
-    for v in list(usados):
-        m = re.search(r"(\d+)$", str(v))
-        if m:
-            maxn = max(maxn, int(m.group(1)))
-    n = maxn + 1
-    while True:
-        cand = f"{prefijo}{n:03d}"
-        if cand not in usados:
-            usados.add(cand)
-            return cand
-        n += 1
 
 # ================= Contenedor tabs =================
 
@@ -191,326 +133,175 @@ def mostrar_registro_datos(database_service):
             st.exception(e)
 
 # ================= Importar Excel =================
-def guardar_excel_validado(analytics, est_valid: pd.DataFrame, cal_valid: pd.DataFrame, fac_valid: pd.DataFrame):
-    try:
-        # ===== Estudiantes nuevos =====
-        if not est_valid.empty:
-            # Asegurar columna 'matricula'
-            if "matricula" not in est_valid.columns:
-                est_valid["matricula"] = ""
+def _fmt_segundos(s) -> str:
+    s = int(round(s or 0))
+    return f"{s // 60} min {s % 60:02d} s" if s >= 60 else f"{s} s"
 
-            # Conjunto de matriculas ya usadas en BD para no chocar
-            try:
-                usados = set(
-                    analytics.df_estudiantes.get("matricula", pd.Series(dtype=str)).dropna().astype(str).tolist()
-                )
-            except Exception:
-                usados = set()
-
-            # Completar vacios con sugerencias
-            for i, r in est_valid.iterrows():
-                v = str(r.get("matricula", "")).strip()
-                if not v:
-                    est_valid.at[i, "matricula"] = _siguiente_matricula_lote(usados)
-
-            # Insercion
-            for _, r in est_valid.iterrows():
-                analytics.db.insertar_estudiante({
-                    "matricula": str(r["matricula"]).strip(),
-                    "nombres": r["nombres"],
-                    "apellido_paterno": r["apellido_paterno"],
-                    "apellido_materno": r["apellido_materno"],
-                    "carrera_id": int(r["carrera_id"]),
-                    "ingreso_semestre": str(r["ingreso_semestre"]),
-                    "horas_estudio": int(r["horas_estudio"]),
-                    "desercion": bool(r["desercion"])
-                })
-
-        # ===== Calificaciones con upsert =====
-        if not cal_valid.empty:
-            df_rows = cal_valid.copy()
-
-            # 1) Intento de resolver estudiante_id por matrícula si existe esa columna
-            if "estudiante_id" in df_rows.columns and "matricula" in df_rows.columns:
-                try:
-                    df_e = analytics.df_estudiantes[["id", "matricula"]].copy()
-                    df_e["matricula"] = df_e["matricula"].astype(str).str.strip().str.lower()
-                    id_map = dict(zip(df_e["matricula"], df_e["id"]))
-
-                    mask_noid = df_rows["estudiante_id"].isna()
-                    df_rows.loc[mask_noid, "estudiante_id"] = (
-                        df_rows.loc[mask_noid, "matricula"]
-                        .astype(str).str.strip().str.lower()
-                        .map(id_map)
-                    )
-                except Exception:
-                    pass  # si falla, solo seguimos sin resolver
-
-            guardadas = 0
-            omitidas_sin_id = 0
-            fallidas = []
-
-            for _, r in df_rows.iterrows():
-                sid = _to_int(r.get("estudiante_id"), None)
-                mid = _to_int(r.get("materia_id"), None)
-                per = str(r.get("periodo", "")).strip()
-                gru = str(r.get("grupo", "")).strip()
-                u1v = _to_float(r.get("u1"), 0.0)
-                u2v = _to_float(r.get("u2"), 0.0)
-                u3v = _to_float(r.get("u3"), 0.0)
-                asis = _to_float(r.get("asistencia"), 0.0)
-                fin  = _to_float(r.get("calificacion_final"), None)
-
-                # Si no hay estudiante_id, NO intentamos guardar esa fila
-                if sid is None:
-                    omitidas_sin_id += 1
-                    continue
-
-                try:
-                    analytics.db.insertar_calificacion({
-                        "estudiante_id": int(sid),
-                        "materia_id": int(mid) if mid is not None else None,
-                        "periodo": per,
-                        "grupo": gru,
-                        "u1": float(u1v),
-                        "u2": float(u2v),
-                        "u3": float(u3v),
-                        "asistencia": float(asis),
-                        "calificacion_final": float(fin) if fin is not None else None
-                    })
-                    guardadas += 1
-                except Exception as e:
-                    fallidas.append({
-                        "estudiante_id": sid,
-                        "materia_id": mid,
-                        "periodo": per,
-                        "grupo": gru,
-                        "error": str(e)
-                    })
-
-            # Mensajes de resultado
-            if guardadas:
-                st.success(f"Calificaciones guardadas: {guardadas}")
-            if omitidas_sin_id:
-                st.warning(f"Omitidas sin estudiante_id: {omitidas_sin_id}. "
-                           f"Si agregas la columna 'matricula' en la hoja Calificaciones, "
-                           f"podré resolver el ID automáticamente.")
-            if fallidas:
-                st.error("Algunas filas no pudieron guardarse")
-                try:
-                    st.dataframe(pd.DataFrame(fallidas), use_container_width=True, hide_index=True)
-                except Exception:
-                    st.write(fallidas)
-
-        # ===== Factores =====
-        if not fac_valid.empty:
-            for _, r in fac_valid.iterrows():
-                analytics.db.insertar_factor({
-                    "categoria": r["categoria"],
-                    "nombre": r["nombre"],
-                    "inscripcion_id": _to_int(r["inscripcion_id"], None),
-                    "gravedad": int(r["gravedad"])
-                })
-
-        analytics.actualizar_datos()
-        st.success("Importación completada")
-        st.rerun()
+def _trabajo_de(archivo):
+    """Trabajo reanudable del archivo subido; su id no depende de la sesion."""
+    return TrabajoImportacion(id_trabajo(archivo.getvalue(), usuario_id()), archivo.name)
 
+def guardar_excel_validado(analytics, archivo, total_filas=None):
+    """
+    Encola la importacion en el trabajador del proceso y regresa enseguida; el
+    script queda libre mientras los bloques se validan y escriben en segundo
+    plano. Tras cada bloque queda un checkpoint; si algo falla, el siguiente
+    intento sigue desde ahi.
+    """
+    try:
+        trabajo = _trabajo_de(archivo)
+        estado = trabajo.estado_inicial(analytics)
+        # copia propia: el archivo subido pertenece a la sesion y puede desaparecer
+        contenido = io.BytesIO(archivo.getvalue())
+        contenido.name = archivo.name
+        trabajador_importaciones().enviar(analytics.db, trabajo, lambda: leer_por_bloques(contenido),
+                                          estado, total_filas)
+        st.session_state["importacion_en_curso"] = trabajo.id
     except Exception as e:
         st.error(f"Error al guardar: {e}")
 
+def _mostrar_progreso_importacion(analytics):
+    """Consulta el progreso publicado por el trabajador; se ejecuta como fragmento."""
+    id_ = st.session_state.get("importacion_en_curso")
+    trabajador = trabajador_importaciones()
+    p = trabajador.progreso(id_) if id_ else None
+    if p is None:
+        return
+
+    if p["estado"] in ("en_cola", "en_curso"):
+        frac = min(p["filas"] / p["total"], 1.0) if p.get("total") else 0.0
+        if p["estado"] == "en_cola":
+            texto = "En espera de otra importación..."
+        else:
+            eta = f" · ETA {_fmt_segundos(p['eta'])}" if p.get("eta") is not None else ""
+            texto = f"{p['filas']:,} de {p['total']:,} filas · {p['filas_s']:,.0f} filas/s{eta}"
+        st.progress(frac, text=texto)
+        st.caption("Puedes seguir usando otras páginas mientras se guarda.")
+        return
+
+    # terminado, interrumpido o error: se recargan los datos y se redibuja la pagina
+    trabajador.descartar(id_)
+    st.session_state.pop("importacion_en_curso", None)
+    if p["estado"] == "terminado":
+        # el checkpoint se borra al terminar; la sesion recuerda que ya se importo
+        st.session_state.setdefault("importaciones_terminadas", set()).add(id_)
+    st.session_state["importacion_resultado"] = p
+    analytics.actualizar_datos()
+    st.session_state["LAST_DATA_UPDATE"] = time.time()
+    st.rerun()
+
+def _mostrar_resultado_importacion(p):
+    g = p.get("guardadas") or {}
+    for hoja in ("Estudiantes", "Calificaciones", "Factores"):
+        if g.get(hoja):
+            st.success(f"{hoja} guardados: {g[hoja]}")
+    omitidas = sum((p.get("sin_cambios") or {}).values())
+    if omitidas:
+        st.info(f"Filas sin cambios respecto al servidor (no se enviaron): {omitidas}")
+    if p["estado"] == "terminado":
+        st.success(f"Importación completada en {_fmt_segundos(p.get('segundos'))}")
+    elif p["estado"] == "interrumpido":
+        causa = f" Causa: {p['error']}." if p.get("error") else ""
+        st.error(f"La importación se detuvo.{causa} Lo ya guardado se conserva; "
+                 "vuelve a presionar Guardar para continuar desde ahí.")
+    else:
+        st.error(f"Error al guardar: {p.get('error')}")
+
+def _panel_importacion(analytics):
+    resultado = st.session_state.pop("importacion_resultado", None)
+    if resultado:
+        _mostrar_resultado_importacion(resultado)
+    if not st.session_state.get("importacion_en_curso"):
+        return
+    if hasattr(st, "fragment"):
+        st.fragment(_mostrar_progreso_importacion, run_every=1)(analytics)
+    else:
+        _mostrar_progreso_importacion(analytics)
+
+def _validar_archivo(analytics, archivo, simular=False):
+    """
+    Pasada de solo lectura para el resumen. Con simular, cada bloque se compara
+    ademas con el servidor (insertar / actualizar / sin cambios). Se guarda en la
+    sesion por archivo y version de datos, asi los reruns no vuelven a leerlo.
+    """
+    clave = (getattr(archivo, "file_id", None) or archivo.name, archivo.size, analytics.clave_cache, simular)
+    previo = st.session_state.get("_importacion_validada")
+    if previo is not None and previo[0] == clave:
+        return previo[1], previo[2]
+
+    estado = ImportacionEnBloques.desde_analytics(analytics)
+    db = analytics.db if simular else None
+    previa, n_previa = [], 0
+    for hoja, bloque in leer_por_bloques(archivo):
+        r = estado.validar(hoja, bloque, db)
+        if simular:
+            estado.diferencias(db, hoja, filas_para_guardar(hoja, r["validos"], estado))
+        if hoja == "Calificaciones" and n_previa < MAX_FILAS_REPORTE:
+            previa.append(r["validos"].head(MAX_FILAS_REPORTE - n_previa))
+            n_previa += len(previa[-1])
+    cal_previa = pd.concat(previa, ignore_index=True) if previa else pd.DataFrame()
+    st.session_state["_importacion_validada"] = (clave, estado.resumen, cal_previa)
+    return estado.resumen, cal_previa
+
 def mostrar_importar_excel(analytics):
     st.subheader("Importar Datos desde Excel")
-    st.caption("El archivo puede incluir hojas Estudiantes, Calificaciones y Factores")
+    st.caption("El archivo puede incluir hojas Estudiantes, Calificaciones y Factores, "
+               "o ser un CSV con las columnas de una de ellas")
+
+    _panel_importacion(analytics)
 
     archivo_excel = st.file_uploader(
-        "Selecciona archivo Excel",
-        type=["xlsx", "xls"],
+        "Selecciona archivo Excel o CSV",
+        type=["xlsx", "xls", "csv"],
         help="Se validan columnas, tipos y duplicados antes de guardar"
     )
     if not archivo_excel:
         return
 
-    def _safe_read(sheet):
-        try:
-            return pd.read_excel(archivo_excel, sheet_name=sheet).rename(
-                columns=lambda c: str(c).strip()
-            )
-        except Exception:
-            return pd.DataFrame()
-
-    df_est = _safe_read("Estudiantes")
-    df_cal = _safe_read("Calificaciones")
-    df_fac = _safe_read("Factores")
-
-    COLS_EST = ["nombres", "apellido_paterno", "apellido_materno",
-                "carrera_id", "ingreso_semestre", "horas_estudio", "desercion"]
-    COLS_CAL = ["estudiante_id", "materia_id", "periodo", "grupo",
-                "u1", "u2", "u3", "asistencia", "calificacion_final"]
-    COLS_FAC = ["categoria", "nombre", "inscripcion_id", "gravedad"]
-
-    # Estudiantes
-    errores_est, dup_est_bd, dup_est_xlsx = [], 0, 0
-    est_valid = pd.DataFrame()
-    if not df_est.empty:
-        faltan = _ensure_columns(df_est, COLS_EST)
-        if faltan:
-            st.error(f"Hoja Estudiantes: faltan columnas {faltan}")
-        else:
-            tmp = df_est.copy()
-            tmp["nombres"] = tmp["nombres"].fillna("").astype(str).str.strip()
-            tmp["apellido_paterno"] = tmp["apellido_paterno"].fillna("").astype(str).str.strip()
-            tmp["apellido_materno"] = tmp["apellido_materno"].fillna("").astype(str).str.strip()
-            tmp["carrera_id"] = tmp["carrera_id"].apply(lambda x: _to_int(x, None))
-            tmp["ingreso_semestre"] = tmp["ingreso_semestre"].astype(str).str.strip()
-            tmp["horas_estudio"] = tmp["horas_estudio"].apply(lambda x: _to_int(x, 0))
-            tmp["desercion"] = tmp["desercion"].apply(_to_bool)
-
-            mask_obli = np.logical_or(tmp["nombres"] == "", tmp["apellido_paterno"] == "")
-            mask_carrera = tmp["carrera_id"].isna()
-            mask_invalid = np.logical_or(mask_obli, mask_carrera)
-            if mask_invalid.any():
-                errores_est += tmp[mask_invalid].assign(_motivo="Campos obligatorios vacíos").to_dict("records")
-                tmp = tmp[~mask_invalid].copy()
-
-            tmp["__k__"] = tmp.apply(_student_key_row, axis=1)
-            dup_est_xlsx = int(tmp.duplicated("__k__").sum())
-            tmp = tmp.drop_duplicates("__k__", keep="first")
-
-            exist = analytics.df_estudiantes.copy()
-            if not exist.empty:
-                exist["__k__"] = exist.apply(_student_key_row, axis=1)
-                ya = set(exist["__k__"].tolist())
-                tmp = tmp[~tmp["__k__"].isin(ya)].copy()
-                dup_est_bd = int(len(df_est) - len(tmp) - dup_est_xlsx - len(errores_est))
-
-            est_valid = tmp.drop(columns="__k__", errors="ignore")
-
-            # Calificaciones
-        errores_cal, dup_cal_xlsx = [], 0
-        cal_valid = pd.DataFrame()
-        if not df_cal.empty:
-            # columnas mínimas siempre presentes
-            COLS_CAL_MIN = ["materia_id", "periodo", "grupo", "u1", "u2", "u3", "asistencia", "calificacion_final"]
-            faltan_min = _ensure_columns(df_cal, COLS_CAL_MIN)
-            if faltan_min:
-                st.error(f"Hoja Calificaciones: faltan columnas {faltan_min}")
-            else:
-                tmp = df_cal.copy()
-
-                # normalización básica
-                for col in ["materia_id"]:
-                    tmp[col] = tmp[col].apply(lambda x: _to_int(x, None))
-                tmp["periodo"] = tmp["periodo"].fillna("").astype(str).str.strip()
-                tmp["grupo"]   = tmp["grupo"].fillna("").astype(str).str.strip().str.upper()
-                for col in ["u1","u2","u3","asistencia","calificacion_final"]:
-                    tmp[col] = tmp[col].apply(lambda x: _to_float(x, 0.0))
-
-                # estudiante_id puede venir o no
-                if "estudiante_id" not in tmp.columns:
-                    tmp["estudiante_id"] = None
-                else:
-                    tmp["estudiante_id"] = tmp["estudiante_id"].apply(lambda x: _to_int(x, None))
-
-                # si viene 'matricula', usarla para completar estudiante_id faltantes
-                if "matricula" in tmp.columns:
-                    cat = analytics.df_estudiantes[["id","matricula"]].copy()
-                    cat["matricula"] = cat["matricula"].astype(str).str.strip().str.upper()
-                    map_id = dict(zip(cat["matricula"], cat["id"]))
-
-                    mask_na = tmp["estudiante_id"].isna() & tmp["matricula"].notna()
-                    tmp.loc[mask_na, "estudiante_id"] = (
-                        tmp.loc[mask_na, "matricula"]
-                        .astype(str).str.strip().str.upper()
-                        .map(map_id)
-                    )
-
-                # invalidación: falta de claves o id no resuelto
-                m_id  = tmp["materia_id"].isna()
-                m_per = tmp["periodo"] == ""
-                m_grp = tmp["grupo"]   == ""
-                m_std = tmp["estudiante_id"].isna()
-                mask_invalid = np.logical_or.reduce([m_id, m_per, m_grp, m_std])
-                if mask_invalid.any():
-                    errores_cal += tmp[mask_invalid].assign(_motivo="Faltan claves o no se resolvió el estudiante").to_dict("records")
-                    tmp = tmp[~mask_invalid].copy()
-
-                # deduplicación por clave natural
-                tmp["__k__"] = list(zip(tmp["estudiante_id"], tmp["materia_id"], tmp["periodo"], tmp["grupo"]))
-                dup_cal_xlsx = int(tmp.duplicated("__k__").sum())
-                tmp = tmp.drop_duplicates("__k__", keep="first")
-
-                # preview amigable con nombre del alumno y nombre de materia
-                try:
-                    dm = analytics.df_materias[["id","nombre"]].rename(columns={"id":"materia_id","nombre":"Materia"})
-                    de = analytics.df_estudiantes[["id","nombres","apellido_paterno","apellido_materno"]].rename(columns={"id":"estudiante_id"})
-                    de["Alumno"] = (de["nombres"].fillna("") + " " + de["apellido_paterno"].fillna("") + " " + de["apellido_materno"].fillna("")).str.replace(r"\s+"," ", regex=True).str.strip()
-                    prev = tmp.merge(de[["estudiante_id","Alumno"]], on="estudiante_id", how="left").merge(dm, on="materia_id", how="left")                                                             
-                except Exception:
-                    pass
-
-                cal_valid = tmp.drop(columns="__k__", errors="ignore")
-
-
-    # Factores
-    errores_fac, dup_fac_xlsx = [], 0
-    fac_valid = pd.DataFrame()
-    if not df_fac.empty:
-        faltan = _ensure_columns(df_fac, COLS_FAC)
-        if faltan:
-            st.error(f"Hoja Factores: faltan columnas {faltan}")
-        else:
-            tmp = df_fac.copy()
-            tmp["categoria"] = tmp["categoria"].astype(str).str.strip()
-            tmp["nombre"] = tmp["nombre"].astype(str).str.strip()
-            tmp["inscripcion_id"] = tmp["inscripcion_id"].apply(lambda x: _to_int(x, None))
-            tmp["gravedad"] = tmp["gravedad"].apply(lambda x: _to_int(x, None))
-
-            m1 = tmp["categoria"] == ""
-            m2 = ~tmp["categoria"].isin(CATEGORIAS_FACTORES)
-            m3 = tmp["gravedad"].isna()
-            m4 = tmp["gravedad"] < 1
-            m5 = tmp["gravedad"] > 5
-            mask_invalid = np.logical_or.reduce([m1, m2, m3, m4, m5])
-
-            if mask_invalid.any():
-                errores_fac += tmp[mask_invalid].assign(_motivo="Categoría inválida o gravedad fuera de 1..5").to_dict("records")
-                tmp = tmp[~mask_invalid].copy()
-
-            tmp["__k__"] = list(zip(tmp["categoria"], tmp["nombre"], tmp["inscripcion_id"]))
-            dup_fac_xlsx = int(tmp.duplicated("__k__").sum())
-            tmp = tmp.drop_duplicates("__k__", keep="first")
-            fac_valid = tmp.drop(columns="__k__", errors="ignore")
+    simular = st.toggle(
+        "🔎 Comparar con el servidor",
+        value=False,
+        help="Simulación: indica qué filas se insertarían, cuáles actualizan datos y cuáles ya están iguales"
+    )
+    try:
+        resumen, cal_valid = _validar_archivo(analytics, archivo_excel, simular)
+    except Exception as e:
+        st.error(f"No se pudo leer el archivo: {e}")
+        return
+
+    for hoja, t in resumen.items():
+        if t["faltan"]:
+            st.error(f"Hoja {hoja}: faltan columnas {t['faltan']}")
+    r_est, r_cal, r_fac = resumen["Estudiantes"], resumen["Calificaciones"], resumen["Factores"]
 
     st.markdown("### Resumen de validación")
     cols = st.columns(3)
     with cols[0]:
-        st.metric("Estudiantes válidos", len(est_valid))
-        st.caption(f"Duplicados en Excel: {dup_est_xlsx}. Duplicados vs BD: {dup_est_bd}. Inválidos: {len(errores_est)}")
+        st.metric("Estudiantes válidos", r_est["validas"])
+        st.caption(f"Duplicados en Excel: {r_est['dup_xlsx']}. Duplicados vs BD: {r_est['dup_bd']}. Inválidos: {r_est['invalidas']}")
     with cols[1]:
-        st.metric("Calificaciones válidas", len(cal_valid))
-        st.caption(f"Duplicados en Excel: {dup_cal_xlsx}. Inválidos: {len(errores_cal)}")
+        st.metric("Calificaciones válidas", r_cal["validas"])
+        st.caption(f"Duplicados en Excel: {r_cal['dup_xlsx']}. Inválidos: {r_cal['invalidas']}")
     with cols[2]:
-        st.metric("Factores válidos", len(fac_valid))
-        st.caption(f"Duplicados en Excel: {dup_fac_xlsx}. Inválidos: {len(errores_fac)}")
-
-    with st.expander("Ver errores de Estudiantes", expanded=False):
-        if errores_est:
-            st.dataframe(pd.DataFrame(errores_est), use_container_width=True)
-        else:
-            st.write("Sin errores.")
-
-    with st.expander("Ver errores de Calificaciones", expanded=False):
-        if errores_cal:
-            st.dataframe(pd.DataFrame(errores_cal), use_container_width=True)
-        else:
-            st.write("Sin errores.")
-
-    with st.expander("Ver errores de Factores", expanded=False):
-        if errores_fac:
-            st.dataframe(pd.DataFrame(errores_fac), use_container_width=True)
-        else:
-            st.write("Sin errores.")
+        st.metric("Factores válidos", r_fac["validas"])
+        st.caption(f"Duplicados en Excel: {r_fac['dup_xlsx']}. Inválidos: {r_fac['invalidas']}")
+
+    if simular:
+        st.markdown("#### Simulación contra el servidor")
+        st.dataframe(pd.DataFrame([
+            {"Hoja": hoja, "Nuevas": t["insertar"], "Actualizan": t["actualizar"], "Sin cambios": t["sin_cambios"]}
+            for hoja, t in resumen.items() if t["leidas"]
+        ]), use_container_width=True, hide_index=True)
+        st.caption("Al guardar, las filas sin cambios no se envían.")
+
+    for hoja, t in resumen.items():
+        with st.expander(f"Ver errores de {hoja}", expanded=False):
+            if t["errores"]:
+                st.dataframe(pd.DataFrame(t["errores"]), use_container_width=True)
+                if t["invalidas"] > len(t["errores"]):
+                    st.caption(f"Se muestran las primeras {len(t['errores'])} de {t['invalidas']} filas inválidas.")
+            else:
+                st.write("Sin errores.")
 
     # === Previsualización: ¿qué calificaciones quedaron válidas? ===
     if not cal_valid.empty:
@@ -518,24 +309,18 @@ def mostrar_importar_excel(analytics):
 
             # Mapas de ids a nombres
             try:
-                dm = analytics.df_materias[["id", "nombre"]].copy()
+                dm = analytics.df_materias[["id", "nombre"]]
                 dm["id"] = pd.to_numeric(dm["id"], errors="coerce").astype("Int64")
                 map_mat = dict(zip(dm["id"].astype(int), dm["nombre"]))
             except Exception:
                 map_mat = {}
 
             try:
-                de = analytics.df_estudiantes[["id","nombres","apellido_paterno","apellido_materno","nombre"]].copy()
+                de = analytics.df_estudiantes[["id","nombres","apellido_paterno","apellido_materno","nombre"]]
                 de["id"] = pd.to_numeric(de["id"], errors="coerce").astype("Int64")
-                def _full(r):
-                    partes = [
-                        str(r.get("nombres","")).strip(),
-                        str(r.get("apellido_paterno","")).strip(),
-                        str(r.get("apellido_materno","")).strip()
-                    ]
-                    nom = " ".join([p for p in partes if p])
-                    return nom or str(r.get("nombre","")).strip()
-                de["alumno"] = de.apply(_full, axis=1)
+                nom = (col_txt(de["nombres"]) + " " + col_txt(de["apellido_paterno"]) + " "
+                       + col_txt(de["apellido_materno"])).str.replace(r"\s+", " ", regex=True).str.strip()
+                de["alumno"] = nom.where(nom != "", col_txt(de["nombre"]))
                 map_est = dict(zip(de["id"].astype(int), de["alumno"]))
             except Exception:
                 map_est = {}
@@ -559,10 +344,31 @@ def mostrar_importar_excel(analytics):
             )
 
             st.dataframe(preview, use_container_width=True, hide_index=True)
+            if r_cal["validas"] > len(cal_valid):
+                st.caption(f"Se muestran las primeras {len(cal_valid)} de {r_cal['validas']} calificaciones válidas.")
 
     st.markdown("---")
-    if st.button("💾 Guardar válidos en la base de datos", type="primary"):
-        guardar_excel_validado(analytics, est_valid, cal_valid, fac_valid)
+    trabajo = _trabajo_de(archivo_excel)
+    if trabajador_importaciones().activo(trabajo.id):
+        st.info("Este archivo se está guardando en segundo plano.")
+        return
+    cp = trabajo.checkpoint()
+    etiqueta = "💾 Guardar válidos en la base de datos"
+    terminadas = st.session_state.get("importaciones_terminadas", set())
+    if trabajo.id in terminadas:
+        st.info("Este archivo ya se importó completo.")
+        if st.button("🔁 Importar de nuevo", key="importar_de_nuevo"):
+            terminadas.discard(trabajo.id)
+            st.rerun()
+        return
+    if cp:
+        st.warning(f"Hay una importación interrumpida de este archivo: {cp['filas']:,} filas ya procesadas. "
+                   "Se reanudará desde el último bloque guardado.")
+        etiqueta = "▶️ Reanudar importación"
+    if st.button(etiqueta, type="primary"):
+        total = sum(t["leidas"] for t in resumen.values())
+        guardar_excel_validado(analytics, archivo_excel, total)
+        st.rerun()
 
 # ================= Registrar Estudiante =================
 
@@ -602,14 +408,19 @@ def mostrar_registro_estudiante(analytics):
 
     # Unicidad de matricula
     try:
-        df_e = analytics.df_estudiantes
-        if not df_e.empty and "matricula" in df_e.columns:
-            if df_e["matricula"].astype(str).str.lower().eq(matricula.strip().lower()).any():
-                st.error("La matrícula ya existe, usa otra diferente")
-                return
+        if matricula.strip().upper() in analytics.ids_por_matricula():
+            st.error("La matrícula ya existe, usa otra diferente")
+            return
     except Exception:
         pass
 
+    asignador = asignador_matriculas()
+    if matricula.strip() == matricula_sugerida:
+        # la sugerencia se reserva al guardar: otra sesion pudo tomarla mientras tanto
+        matricula = formatear("A", asignador.reservar(1, "A"))
+    else:
+        asignador.observar_matriculas([matricula])
+
     data = {
         "matricula": str(matricula).strip(),
         "nombres": nombres.strip(),
@@ -722,6 +533,30 @@ def mostrar_registro_materias(analytics):
 
 # ================= Registrar Calificaciones DOCENTE =================
 
+def _mostrar_cola_calificaciones(analytics, materia_id, periodo, grupo):
+    """Estado de las calificaciones del grupo que aun no llegan al servidor; se ejecuta como fragmento."""
+    e = cola_calificaciones().estado(materia_id, periodo, grupo)
+    clave = f"cola_cal_{materia_id}_{periodo}_{grupo}"
+    if e["pendientes"]:
+        st.session_state[clave] = True
+        texto = f"⏳ {e['pendientes']} calificación(es) pendientes de enviar al servidor"
+        if e["con_error"]:
+            st.warning(f"{texto}. Reintentando: {e['ultimo_error']}")
+        else:
+            st.caption(texto)
+        return
+    if st.session_state.pop(clave, False):
+        # se vacio la cola del grupo: ahora el snapshot ya puede traerlas
+        analytics.actualizar_datos()
+        st.session_state["LAST_DATA_UPDATE"] = time.time()
+        st.rerun()
+
+def _panel_cola_calificaciones(analytics, materia_id, periodo, grupo):
+    if hasattr(st, "fragment"):
+        st.fragment(_mostrar_cola_calificaciones, run_every=2)(analytics, materia_id, periodo, grupo)
+    else:
+        _mostrar_cola_calificaciones(analytics, materia_id, periodo, grupo)
+
 def mostrar_registro_calificaciones(analytics):
     st.subheader("Registrar Calificaciones por Materia (Docente)")
 
@@ -729,8 +564,8 @@ def mostrar_registro_calificaciones(analytics):
         st.warning("Esta sección es exclusiva para docentes.")
         return
 
-    # Catálogo base de materias del usuario
-    mats = analytics.db.obtener_materias() or []
+    # Catálogo base de materias del usuario (del snapshot, no se consulta en cada rerun)
+    mats = analytics.materias_lista()
     if not mats:
         st.info("No tienes materias asignadas")
         return
@@ -759,7 +594,7 @@ def mostrar_registro_calificaciones(analytics):
     materia_id = opciones_mats[mat_label]
 
     # Selección de grupo
-    grupos = analytics.db.obtener_grupos(materia_id=materia_id) or []
+    grupos = analytics.grupos_de(materia_id) or analytics.db.obtener_grupos(materia_id=materia_id) or []
     if not grupos:
         st.warning("La materia seleccionada no tiene grupos. Crea al menos uno.")
         return
@@ -769,102 +604,71 @@ def mostrar_registro_calificaciones(analytics):
     periodo, grupo = g["periodo"], g["grupo"]
 
     # Alumnos inscritos en el grupo
-    inscritos = analytics.db.alumnos_inscritos_para_calificacion(materia_id, periodo, grupo) or []
+    inscritos = analytics.inscritos_de(materia_id, periodo, grupo)
     if not inscritos:
         st.warning("No hay alumnos inscritos en este grupo. Ve a la pestaña Inscribir Alumnos.")
         return
 
-    # Identificar quienes ya tienen calificación final para ocultarlos
+    # Lo ya registrado en el grupo
     dfc = analytics.df_calificaciones
-    ya_ids = set()
-    if not dfc.empty and {'materia_id','periodo','grupo','estudiante_id','calificacion_final'}.issubset(dfc.columns):
-        mask = (
-            (dfc['materia_id'] == materia_id) &
-            (dfc['periodo'] == periodo) &
-            (dfc['grupo'] == grupo) &
-            dfc['calificacion_final'].notna()
+    if not dfc.empty and {'materia_id', 'periodo', 'grupo', 'estudiante_id'}.issubset(dfc.columns):
+        dfc = dfc[(dfc['materia_id'] == materia_id) & (dfc['periodo'] == periodo) & (dfc['grupo'] == grupo)]
+    if ESCRITURA_DIFERIDA_CALIFICACIONES:
+        # lo encolado y aun no enviado se muestra encima de lo que hay en el servidor
+        cola = cola_calificaciones()
+        cola.iniciar(analytics.db)
+        pendientes = cola.pendientes_de(materia_id, periodo, grupo)
+        if not pendientes.empty:
+            dfc = pd.concat([dfc, pendientes], ignore_index=True)
+        _panel_cola_calificaciones(analytics, materia_id, periodo, grupo)
+    tabla = tabla_captura(inscritos, dfc)
+
+    calificados = int(tabla["calificacion_final"].notna().sum())
+    st.caption(f"Pendientes por calificar: {len(tabla) - calificados}   Ya calificados: {calificados}")
+
+    # Toda la lista del grupo en una tabla; solo se envian las filas que cambian
+    with st.form(f"form_calif_grupo_{materia_id}_{periodo}_{grupo}"):
+        editada = st.data_editor(
+            tabla,
+            key=f"cal_grid_{materia_id}_{periodo}_{grupo}",
+            use_container_width=True,
+            hide_index=True,
+            num_rows="fixed",
+            disabled=["nombre", "calificacion_final"],
+            column_order=["nombre", *COLS_CAPTURA, "calificacion_final"],
+            column_config={
+                "nombre": st.column_config.TextColumn("Alumno"),
+                "u1": st.column_config.NumberColumn("Unidad 1", min_value=0.0, max_value=100.0, step=0.1),
+                "u2": st.column_config.NumberColumn("Unidad 2", min_value=0.0, max_value=100.0, step=0.1),
+                "u3": st.column_config.NumberColumn("Unidad 3", min_value=0.0, max_value=100.0, step=0.1),
+                "asistencia": st.column_config.NumberColumn("Asistencia %", min_value=0.0, max_value=100.0, step=0.1),
+                "calificacion_final": st.column_config.NumberColumn("Final", format="%.2f"),
+            },
         )
-        try:
-            ya_ids = set(dfc.loc[mask, 'estudiante_id'].astype(int).tolist())
-        except Exception:
-            # fallback por seguridad
-            ya_ids = set(dfc.loc[mask, 'estudiante_id'].tolist())
-
-    # Mapa completo y candidatos sin calificar
-    alumnos_map_full = {
-        int(i["id"]): f"ID {int(i['id'])}: {i.get('nombre') or i.get('nombres','')}"
-        for i in inscritos if i.get("id") is not None
-    }
-    candidatos_ids = [sid for sid in alumnos_map_full.keys() if sid not in ya_ids]
-
-    st.caption(f"Pendientes por calificar: {len(candidatos_ids)}   Ya calificados: {len(ya_ids)}")
-
-    if not candidatos_ids:
-        st.success("Ya registraste todas las calificaciones de este grupo.")
-        return
-
-    # Lupa para buscar por nombre o ID
-    q = st.text_input("Buscar alumno por nombre o ID", key="cal_search").strip()
-    if q:
-        nq = _norm_txt(q)
-        def _match(aid: int) -> bool:
-            label = alumnos_map_full[aid]
-            return (q.isdigit() and str(aid).startswith(q)) or (nq in _norm_txt(label))
-        candidatos_ids = [sid for sid in candidatos_ids if _match(sid)]
-
-    if not candidatos_ids:
-        st.info("No hay coincidencias con la búsqueda.")
-        return
-
-    with st.form("form_calif_por_materia"):
-        col1, col2 = st.columns([2, 1])
-        with col1:
-            estudiante_id = st.selectbox(
-                "Estudiante*",
-                options=candidatos_ids,
-                format_func=lambda x: alumnos_map_full[x],
-                key="cal_est_sel_filtrado"
-            )
-        with col2:
-            st.write("")
-
-        st.subheader("Calificaciones por Unidad")
-        c1, c2, c3, c4 = st.columns(4)
-        with c1:
-            u1 = st.number_input("Unidad 1", min_value=0.0, max_value=100.0, value=80.0, step=0.1, key="cal_u1")
-        with c2:
-            u2 = st.number_input("Unidad 2", min_value=0.0, max_value=100.0, value=80.0, step=0.1, key="cal_u2")
-        with c3:
-            u3 = st.number_input("Unidad 3", min_value=0.0, max_value=100.0, value=80.0, step=0.1, key="cal_u3")
-        with c4:
-            asistencia = st.number_input("Asistencia %", min_value=0.0, max_value=100.0, value=90.0, step=0.1, key="cal_asist")
-
-        enviar = st.form_submit_button("📊 Registrar Calificaciones")
+        enviar = st.form_submit_button("📊 Guardar calificaciones del grupo")
 
     if not enviar:
         return
 
     try:
-        cal_final = round((u1 + u2 + u3) / 3.0, 2)
-        payload = {
-            "estudiante_id": int(estudiante_id),
-            "materia_id": int(materia_id),
-            "periodo": str(periodo),
-            "grupo": str(grupo),
-            "u1": float(u1),
-            "u2": float(u2),
-            "u3": float(u3),
-            "asistencia": float(asistencia),
-            "calificacion_final": float(cal_final)
-        }
-        res = analytics.db.insertar_calificacion(payload)
-        if res:
-            analytics.actualizar_datos()
-            st.session_state["LAST_DATA_UPDATE"] = time.time()
-            st.success(f"Calificaciones registradas. Final {cal_final}")
+        filas, incompletas = cambios_captura(tabla, editada, materia_id, periodo, grupo)
+        if incompletas:
+            st.warning(f"{incompletas} alumno(s) sin las tres unidades y la asistencia no se guardaron")
+        if not filas:
+            st.info("No hay cambios que guardar")
+            return
+        if ESCRITURA_DIFERIDA_CALIFICACIONES:
+            cola_calificaciones().encolar(filas)
+            st.session_state[f"cola_cal_{materia_id}_{periodo}_{grupo}"] = True
             st.rerun()
-        else:
-            st.error("No se pudo registrar la calificación")
+        guardadas = guardar_calificaciones(analytics.db, filas)
+        if guardadas is None:
+            st.error("No se pudieron guardar las calificaciones")
+            return
+        analytics.actualizar_datos()
+        st.session_state["LAST_DATA_UPDATE"] = time.time()
+        st.success(f"Calificaciones guardadas: {guardadas}")
+        st.rerun()
     except Exception as e:
         st.error(f"Ocurrió un error al registrar: {e}")
 
@@ -873,7 +677,7 @@ def mostrar_registro_calificaciones(analytics):
 def mostrar_registro_factores(analytics):
     st.subheader("Registrar Factores de Riesgo")
 
-    df_est = analytics.df_estudiantes.copy()
+    df_est = analytics.df_estudiantes
     if df_est.empty:
         st.info("No hay estudiantes")
         return
@@ -883,7 +687,7 @@ def mostrar_registro_factores(analytics):
     def _etiqueta(r):
         return f"ID {int(r['id'])}: {_nombre_estudiante_row(r)}"
 
-    df_filtrado = df_est.copy()
+    df_filtrado = df_est
     if q:
         qn = _norm_txt(q)
         if q.isdigit():
@@ -1014,7 +818,7 @@ def mostrar_inscribir_alumnos(analytics):
     periodo, grupo = g["periodo"], g["grupo"]
 
     st.divider()
-    st.markdown("### Agregar alumno")
+    st.markdown("### Agregar alumnos")
 
     # Recargar lista de alumnos
     if st.button("🔄 Recargar lista de alumnos", key="insc_refresh"):
@@ -1024,7 +828,7 @@ def mostrar_inscribir_alumnos(analytics):
             pass
         st.rerun()
 
-    df_est = analytics.df_estudiantes.copy()
+    df_est = analytics.df_estudiantes
 
     # Filtrar alumnos por la misma carrera de la materia
     try:
@@ -1043,7 +847,7 @@ def mostrar_inscribir_alumnos(analytics):
 
     if "id" in df_est.columns:
         df_est["id"] = pd.to_numeric(df_est["id"], errors="coerce").astype("Int64")
-    df_candidatos = df_est[~df_est["id"].isin(ids_ya)].copy()
+    df_candidatos = df_est[~df_est["id"].isin(ids_ya)]
 
     if df_candidatos.empty:
         st.info("No hay alumnos elegibles para inscribir en este grupo")
@@ -1072,26 +876,33 @@ def mostrar_inscribir_alumnos(analytics):
             if pd.notna(row["id"])
         }
 
-        alumno_id = st.selectbox(
-            "Alumno a inscribir",
+        alumno_ids = st.multiselect(
+            "Alumnos a inscribir",
             options=list(opciones_alumnos.keys()),
             format_func=lambda x: opciones_alumnos[x],
             key="insc_alumno_sel"
         )
 
-        if st.button("Inscribir", type="primary", key="insc_btn_add"):
-            try:
-                analytics.db.inscribir_estudiante(int(alumno_id), int(materia_id), str(periodo), str(grupo))
+        c_sel, c_todos = st.columns(2)
+        with c_sel:
+            agregar_sel = st.button("Inscribir seleccionados", type="primary", key="insc_btn_add",
+                                    disabled=not alumno_ids)
+        with c_todos:
+            agregar_todos = st.button(f"Inscribir a todos los elegibles ({len(opciones_alumnos)})",
+                                      key="insc_btn_add_all")
+
+        if agregar_sel or agregar_todos:
+            ids = list(opciones_alumnos.keys()) if agregar_todos else alumno_ids
+            res = analytics.db.inscribir_estudiantes(ids, int(materia_id), str(periodo), str(grupo))
+            if res is not None:
                 analytics.actualizar_datos()
-                st.success("Alumno inscrito")
+                st.success(f"Alumnos inscritos: {len(res['inscritos'])}")
                 st.rerun()
-            except Exception as e:
-                st.error(f"No se pudo inscribir: {e}")
 
     st.divider()
     st.markdown("### Inscritos en el grupo")
 
-    inscritos = analytics.db.listar_inscritos(materia_id, periodo, grupo) or []
+    inscritos = ya
     if not inscritos:
         st.info("Aún no hay alumnos inscritos")
         return
@@ -1112,18 +923,22 @@ def mostrar_inscribir_alumnos(analytics):
     df = df[["estudiante_id", "Alumno"]].rename(columns={"estudiante_id": "ID"})
     st.dataframe(df, use_container_width=True, hide_index=True)
 
+    etiquetas = dict(zip(df["ID"].astype(int), df["Alumno"]))
     col_a, col_b = st.columns([2, 1])
     with col_a:
-        des_id = st.selectbox("Seleccionar alumno para desinscribir", df["ID"].tolist(), key="insc_del_id")
+        des_ids = st.multiselect(
+            "Seleccionar alumnos para desinscribir",
+            options=list(etiquetas.keys()),
+            format_func=lambda x: f"ID {x}: {etiquetas[x]}",
+            key="insc_del_id"
+        )
     with col_b:
-        if st.button("Quitar", key="insc_btn_del"):
-            try:
-                analytics.db.desinscribir_estudiante(int(des_id), int(materia_id), str(periodo), str(grupo))
+        if st.button("Quitar seleccionados", key="insc_btn_del", disabled=not des_ids):
+            res = analytics.db.desinscribir_estudiantes(des_ids, int(materia_id), str(periodo), str(grupo))
+            if res is not None:
                 analytics.actualizar_datos()
-                st.success("Alumno desinscrito")
+                st.success(f"Alumnos desinscritos: {len(res['desinscritos'])}")
                 st.rerun()
-            except Exception as e:
-                st.error(f"No se pudo desinscribir: {e}")
 
 # ================= Asignar Docentes =================
 
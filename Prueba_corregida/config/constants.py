@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 CARRERAS = {
     1: 'Ingeniería en Sistemas Computacionales',
     2: 'Ingeniería en Tecnologías de la Información y Comunicación',
@@ -33,4 +36,75 @@ COLORES_CARRERAS = {
     9: '#bcbd22',  # Industrial
     10: '#17becf', # Aeronáutica
     11: '#ff9896'  # Bioquímica
-}
\ No newline at end of file
+}
+
+# Carga acotada para sesiones de docente: solo materias, calificaciones,
+# inscripciones, estudiantes y factores de sus propias materias
+CARGA_ACOTADA_DOCENTE = True
+TTL_CACHE_DOCENTE = 300        # segundos que vive el snapshot de un docente
+MAX_DOCENTES_EN_CACHE = 64     # docentes retenidos antes de expulsar el menos usado
+TAM_LOTE_IN = 200              # ids por consulta in_() para no exceder la URL
+
+# Importacion por bloques: filas que se leen, validan y escriben a la vez
+TAM_BLOQUE_IMPORTACION = 2000
+MAX_FILAS_REPORTE = 1000       # filas invalidas y de vista previa que se guardan por hoja
+
+# Datos locales de la app (checkpoints, colas, marcas). Persistente y privado:
+# no en el temporal compartido, donde cualquiera podria escribir o se borra al reiniciar
+DIR_DATOS_APP = os.environ.get(
+    "DIR_DATOS_APP", os.path.join(os.path.expanduser("~"), ".analisis_academico")
+)
+
+# Checkpoints de importaciones reanudables (uno por archivo y usuario)
+DIR_TRABAJOS_IMPORTACION = os.environ.get(
+    "DIR_TRABAJOS_IMPORTACION", os.path.join(DIR_DATOS_APP, "importaciones")
+)
+MAX_IMPORTACIONES_SIMULTANEAS = 2  # importaciones que corren a la vez en el proceso
+MAX_ESCRITURAS_CONCURRENTES = 4    # escrituras en lote en vuelo, sumando todas
+
+# Captura de calificaciones por grupo: filas por upsert
+TAM_LOTE_CALIFICACIONES = 500
+TAM_LOTE_INSCRIPCIONES = 500   # filas por insert al inscribir un grupo completo
+
+# Listas de inscritos por grupo (captura de calificaciones)
+TTL_CACHE_ROSTERS = 600        # segundos; las escrituras de inscripciones invalidan antes
+MAX_ROSTERS_EN_CACHE = 512     # grupos retenidos antes de expulsar el menos usado
+
+# Escritura diferida de calificaciones: se confirman al guardarse en una cola
+# local (SQLite) y un hilo las envia por lotes. Desactivada por defecto.
+ESCRITURA_DIFERIDA_CALIFICACIONES = os.environ.get("ESCRITURA_DIFERIDA_CALIFICACIONES", "0") == "1"
+RUTA_COLA_CALIFICACIONES = os.environ.get(
+    "RUTA_COLA_CALIFICACIONES", os.path.join(DIR_DATOS_APP, "cola_calificaciones.sqlite3")
+)
+INTERVALO_COLA_CALIFICACIONES = 2.0   # segundos entre vaciados si no llega nada nuevo
+ESPERA_MAXIMA_REINTENTO = 300.0       # tope del backoff exponencial, en segundos
+
+# Exportacion: filas que se serializan por bloque y bytes que se guardan en
+# memoria antes de pasar el archivo temporal a disco
+TAM_BLOQUE_EXPORTACION = 50000
+MAX_MEMORIA_EXPORTACION = 8 * 1024 * 1024
+FILAS_POR_GRUPO_COLUMNAR = 100000  # row group (Parquet) o lote (Feather/Arrow) por defecto
+
+# Cache en disco de reportes generados, por filtros, formato y datos
+DIR_CACHE_REPORTES = os.environ.get(
+    "DIR_CACHE_REPORTES", os.path.join(DIR_DATOS_APP, "reportes_cache")
+)
+MAX_BYTES_CACHE_REPORTES = 512 * 1024 * 1024   # al pasarse se borran los menos usados
+
+# Reportes en segundo plano: cuantos se generan a la vez y cuanto se guarda
+# un reporte terminado que nadie descargo ni descarto
+MAX_REPORTES_SIMULTANEOS = 3
+TTL_REPORTES_TERMINADOS = 3600   # segundos
+MAX_PROCESOS_REPORTES = int(os.environ.get("MAX_PROCESOS_REPORTES", min(4, os.cpu_count() or 1)))  # PDFs por lote
+
+# Graficas compartidas por paginas y PDF (services/graficas.py)
+DPI_GRAFICAS = 150
+MAX_BYTES_CACHE_FIGURAS = 64 * 1024 * 1024
+
+# Marcas de la ultima exportacion de cada usuario (services/exportacion_incremental.py)
+DIR_MARCAS_EXPORTACION = os.environ.get(
+    "DIR_MARCAS_EXPORTACION", os.path.join(DIR_DATOS_APP, "marcas_exportacion")
+)
+
+# Mascaras de filtros de los reportes en cache (services/filtros_reportes.py)
+MAX_MASCARAS_FILTROS = 256
@@ -1,16 +1,218 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
 import pandas as pd
 import numpy as np
 import streamlit as st
+from config.constants import CARGA_ACOTADA_DOCENTE, TTL_CACHE_DOCENTE, MAX_DOCENTES_EN_CACHE
+from services.matriculas import asignador_matriculas, maximos_por_prefijo
+from services.rosters import cache_rosters
+from services.artefactos import firma_datos
+
+# Copy-on-write (por defecto desde pandas 3): las vistas que entrega el servicio
+# comparten memoria con el snapshot y solo se copian si alguien las modifica
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+def _vista(df: pd.DataFrame) -> pd.DataFrame:
+    """Vista de solo lectura efectiva: escribir en ella no altera el snapshot compartido."""
+    return df.copy(deep=False)
+
+# st.cache_data distingue los resultados por alcance (global o docente) y por
+# contenido de los datos en lugar de compartir la misma entrada entre sesiones
+_HASH_SERVICIO = {"services.analytics.AnalyticsService": lambda s: s.clave_cache}
+
+def _huella_datos(datos: dict) -> tuple:
+    """Huella barata del contenido de cada tabla, para saber si una recarga trajo cambios."""
+    partes = []
+    for nombre in sorted(datos):
+        df = datos[nombre]
+        if df is None or df.empty:
+            partes.append((nombre, 0))
+            continue
+        try:
+            h = int(pd.util.hash_pandas_object(df, index=False).sum())
+        except TypeError:
+            h = int(pd.util.hash_pandas_object(df.astype(str), index=False).sum())
+        partes.append((nombre, len(df), tuple(df.columns), h))
+    return tuple(partes)
+
+@dataclass(frozen=True, eq=False)
+class Snapshot:
+    """
+    Foto inmutable de las tablas de un alcance. Nunca se edita: una recarga
+    publica otra y cambia la referencia de un golpe, asi un lector ve siempre
+    tablas coherentes entre si.
+    """
+    alcance: tuple
+    version: int
+    tablas: Mapping[str, pd.DataFrame]
+    huella: tuple
+    cargado: float  # time.monotonic() al iniciar la lectura del backend
+
+    def __getitem__(self, nombre):
+        return self.tablas[nombre]
+
+class _Vuelo:
+    """Carga en curso de un alcance; los hilos que llegan despues esperan su resultado."""
+    def __init__(self, inicio):
+        self.inicio = inicio
+        self.listo = threading.Event()
+        self.snapshot = None
+        self.error = None
 
 class AnalyticsService:
     def __init__(self, database_service):
         self.db = database_service
-        self._datos_cache = None
-    
+        self._lock = threading.Lock()
+        self._snapshot_global = None
+        # docente_id -> Snapshot; el orden es el de uso reciente
+        self._snapshots_docente = OrderedDict()
+        self._en_vuelo = {}
+        # la version solo avanza cuando una recarga trae contenido distinto
+        self._version = 0
+        self._huellas = {}
+        # snapshots leidos antes de este instante se consideran vencidos
+        self._invalidado = float("-inf")
+
+    def _docente_acotado(self):
+        """Id del docente en sesion si aplica la carga acotada, si no None."""
+        if not CARGA_ACOTADA_DOCENTE:
+            return None
+        try:
+            from services.rbac import es_docente, usuario_id
+            if es_docente() and usuario_id():
+                return usuario_id()
+        except Exception:
+            pass
+        return None
+
+    def _alcance(self):
+        docente_id = self._docente_acotado()
+        return ("docente", docente_id) if docente_id is not None else ("global",)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def clave_cache(self):
+        """
+        Alcance y firma del contenido del snapshot. No se usa _version: es un
+        contador de cada servicio y las paginas que crean uno por ejecucion
+        repetirian la misma clave con otros datos.
+        """
+        snap = self.snapshot()
+        return snap.alcance + (firma_datos(snap.huella),)
+
+    # ===== snapshots
+    def _actual(self, alcance):
+        if alcance[0] == "docente":
+            return self._snapshots_docente.get(alcance[1])
+        return self._snapshot_global
+
+    def _vigente(self, alcance, desde=None):
+        """Snapshot utilizable del alcance o None. Llamar con self._lock tomado."""
+        snap = self._actual(alcance)
+        if snap is None or snap.cargado < self._invalidado:
+            return None
+        if desde is not None and snap.cargado < desde:
+            return None
+        if alcance[0] == "docente":
+            if time.monotonic() - snap.cargado >= TTL_CACHE_DOCENTE:
+                return None
+            self._snapshots_docente.move_to_end(alcance[1])
+        return snap
+
+    def _leer_backend(self, alcance):
+        if alcance[0] == "docente":
+            return self.db.cargar_datos_docente(alcance[1])
+        return self._cargar_datos_actualizados()
+
+    def _publicar(self, alcance, datos, inicio):
+        """Crea el snapshot y lo intercambia por el anterior en una sola asignacion."""
+        huella = _huella_datos(datos)
+        with self._lock:
+            cambio = self._huellas.get(alcance) != huella
+            if cambio:
+                self._huellas[alcance] = huella
+                self._version += 1
+            snap = Snapshot(alcance, self._version, MappingProxyType(dict(datos)), huella, inicio)
+            if alcance[0] == "docente":
+                self._snapshots_docente[alcance[1]] = snap
+                self._snapshots_docente.move_to_end(alcance[1])
+                while len(self._snapshots_docente) > MAX_DOCENTES_EN_CACHE:
+                    self._snapshots_docente.popitem(last=False)
+            else:
+                self._snapshot_global = snap
+        if cambio:
+            self._observar_matriculas(datos.get("estudiantes"))
+            self._invalidar_reportes(alcance, huella)
+        return snap
+
+    @staticmethod
+    def _invalidar_reportes(alcance, huella):
+        """Los reportes en cache hechos con los datos anteriores del alcance ya no sirven."""
+        try:
+            from services.artefactos import cache_artefactos
+            cache_artefactos().invalidar(alcance, huella)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _observar_matriculas(df):
+        """Lleva al asignador el mayor numero de matricula del snapshot nuevo."""
+        if df is None or df.empty or "matricula" not in df.columns:
+            return
+        try:
+            asignador_matriculas().observar(maximos_por_prefijo(df["matricula"]))
+        except Exception:
+            pass
+
+    def _cargar(self, alcance, desde=None):
+        """
+        Devuelve el snapshot vigente del alcance o lo carga. Si otro hilo ya esta
+        leyendo ese alcance se espera y se comparte su resultado (single-flight);
+        desde exige que la lectura haya empezado despues de ese instante.
+        """
+        while True:
+            with self._lock:
+                snap = self._vigente(alcance, desde)
+                if snap is not None:
+                    return snap
+                vuelo = self._en_vuelo.get(alcance)
+                propio = vuelo is None
+                if propio:
+                    vuelo = self._en_vuelo[alcance] = _Vuelo(time.monotonic())
+            if propio:
+                break
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            if desde is None or vuelo.inicio >= desde:
+                return vuelo.snapshot
+            # esa lectura empezo antes de lo pedido: se vuelve a intentar
+
+        try:
+            vuelo.snapshot = self._publicar(alcance, self._leer_backend(alcance), vuelo.inicio)
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(alcance, None)
+            vuelo.listo.set()
+        return vuelo.snapshot
+
+    def snapshot(self) -> Snapshot:
+        """Snapshot del alcance de la sesion; sus tablas son coherentes entre si."""
+        return self._cargar(self._alcance())
+
     def cargar_datos(self):
-        if self._datos_cache is None:
-            self._datos_cache = self._cargar_datos_actualizados()
-        return self._datos_cache
+        return self.snapshot()
     
     def _cargar_datos_actualizados(self):
         return {
@@ -24,45 +226,104 @@ class AnalyticsService:
     def actualizar_datos(self):
         """
         Limpia todo cache y recarga instantáneamente.
+        Los demas alcances quedan vencidos y se recargan en su siguiente lectura;
+        mientras tanto se sigue leyendo el snapshot anterior, nunca un hueco.
         """
         try:
             st.cache_data.clear()
         except Exception:
             pass
-        self._datos_cache = None
         self.db.limpiar_cache()
-        # opcional precarga inmediata
-        self._datos_cache = self._cargar_datos_actualizados()
+        ahora = time.monotonic()
+        with self._lock:
+            self._invalidado = max(self._invalidado, ahora)
+        # precarga inmediata, solo del alcance de esta sesion
+        self._cargar(self._alcance(), desde=ahora)
+
+    def refrescar_datos(self, max_edad=None) -> bool:
+        """
+        Recarga el alcance de la sesion sin vaciar st.cache_data (pensado para el
+        auto refresco). Si los datos tienen menos de max_edad segundos no hace nada.
+        Devuelve True si la recarga cambio la version.
+        """
+        alcance = self._alcance()
+        ahora = time.monotonic()
+        actual = self._actual(alcance)
+        if max_edad and actual is not None and ahora - actual.cargado < max_edad:
+            return False
+        version_previa = self._version
+        self._cargar(alcance, desde=ahora)
+        return self._version != version_previa
     
     @property
     def df_estudiantes(self):
         datos = self.cargar_datos()
-        return datos["estudiantes"]
+        return _vista(datos["estudiantes"])
     
     @property
     def df_calificaciones(self):
         datos = self.cargar_datos()
-        return datos["calificaciones"]
+        return _vista(datos["calificaciones"])
     
     @property
     def df_factores(self):
         datos = self.cargar_datos()
-        return datos["factores"]
+        return _vista(datos["factores"])
     
     @property
     def df_materias(self):
         datos = self.cargar_datos()
-        return datos["materias"]
+        return _vista(datos["materias"])
     
     @property
     def df_grupos(self):
         datos = self.cargar_datos()
-        return datos["grupos"]
+        return _vista(datos["grupos"])
+    
+    # ===== Indices derivados del snapshot (uno por version)
+    @st.cache_data(ttl=300, hash_funcs=_HASH_SERVICIO)
+    def claves_estudiantes(self):
+        """Hash de la clave natural de cada alumno, para marcar duplicados al importar."""
+        from services.importacion import claves_estudiante
+        return claves_estudiante(self.df_estudiantes)
+
+    @st.cache_data(ttl=300, hash_funcs=_HASH_SERVICIO)
+    def ids_por_matricula(self):
+        """Matricula normalizada (mayusculas) -> id del alumno."""
+        df = self.df_estudiantes
+        if df.empty or "matricula" not in df.columns:
+            return {}
+        df = df[df["matricula"].notna()]
+        return dict(zip(df["matricula"].astype(str).str.strip().str.upper(), df["id"]))
     
-    @st.cache_data(ttl=300)
-    def calcular_metricas_principales(_self):
+    # ===== Catalogos para la captura de calificaciones
+    def materias_lista(self) -> list:
+        """Materias del alcance desde el snapshot (sin consulta por rerun)."""
+        df = self.df_materias
+        if df.empty:
+            return self.db.obtener_materias() or []
+        if "nombre" in df.columns:
+            df = df.sort_values("nombre", kind="stable")
+        return df.to_dict("records")
+
+    def grupos_de(self, materia_id: int) -> list:
+        """Grupos de una materia desde el snapshot, del periodo mas reciente al mas viejo."""
+        df = self.df_grupos
+        if df.empty or "materia_id" not in df.columns:
+            return []
+        df = df[df["materia_id"] == materia_id]
+        if "periodo" in df.columns:
+            df = df.sort_values("periodo", ascending=False, kind="stable")
+        return df.to_dict("records")
+
+    def inscritos_de(self, materia_id: int, periodo: str, grupo: str) -> list:
+        """Alumnos del grupo ordenados por nombre; la lista vive en cache_rosters."""
+        return cache_rosters().obtener(self.db, materia_id, periodo, grupo)
+
+    @st.cache_data(ttl=300, hash_funcs=_HASH_SERVICIO)
+    def calcular_metricas_principales(self):
         try:
-            datos = _self.cargar_datos()
+            datos = self.cargar_datos()
             df_calificaciones = datos["calificaciones"]
             df_estudiantes = datos["estudiantes"]
             
@@ -112,10 +373,10 @@ class AnalyticsService:
                 "tasa_desercion": 0.0
             }
     
-    @st.cache_data(ttl=300)
-    def generar_analisis_rendimiento(_self):
+    @st.cache_data(ttl=300, hash_funcs=_HASH_SERVICIO)
+    def generar_analisis_rendimiento(self):
         try:
-            df_calificaciones = _self.df_calificaciones
+            df_calificaciones = self.df_calificaciones
             if df_calificaciones.empty:
                 return pd.DataFrame()
             columnas_necesarias = ["calificacion_final", "asistencia", "u1", "u2", "u3"]
@@ -127,10 +388,10 @@ class AnalyticsService:
             st.error(f"Error en análisis de rendimiento: {e}")
             return pd.DataFrame()
     
-    @st.cache_data(ttl=300)
-    def analizar_factores_riesgo(_self):
+    @st.cache_data(ttl=300, hash_funcs=_HASH_SERVICIO)
+    def analizar_factores_riesgo(self):
         try:
-            df_factores = _self.df_factores
+            df_factores = self.df_factores
             if df_factores.empty:
                 return pd.DataFrame()
             if "categoria" in df_factores.columns and "gravedad" in df_factores.columns:
@@ -142,10 +403,10 @@ class AnalyticsService:
             st.error(f"Error analizando factores: {e}")
             return pd.DataFrame()
     
-    @st.cache_data(ttl=300)
-    def obtener_tendencia_calificaciones(_self):
+    @st.cache_data(ttl=300, hash_funcs=_HASH_SERVICIO)
+    def obtener_tendencia_calificaciones(self):
         try:
-            df_calificaciones = _self.df_calificaciones
+            df_calificaciones = self.df_calificaciones
             if df_calificaciones.empty:
                 return pd.DataFrame()
             unidades = ["u1", "u2", "u3"]
@@ -160,10 +421,10 @@ class AnalyticsService:
             st.error(f"Error obteniendo tendencia: {e}")
             return pd.DataFrame()
     
-    @st.cache_data(ttl=300)
-    def obtener_estadisticas_avanzadas(_self):
+    @st.cache_data(ttl=300, hash_funcs=_HASH_SERVICIO)
+    def obtener_estadisticas_avanzadas(self):
         try:
-            df_calificaciones = _self.df_calificaciones
+            df_calificaciones = self.df_calificaciones
             if df_calificaciones.empty:
                 return {}
             stats = {}
@@ -190,12 +451,12 @@ class AnalyticsService:
             st.error(f"Error calculando estadísticas avanzadas: {e}")
             return {}
     
-    @st.cache_data(ttl=300)
-    def generar_matriz_correlacion(_self, variables):
+    @st.cache_data(ttl=300, hash_funcs=_HASH_SERVICIO)
+    def generar_matriz_correlacion(self, variables):
         import matplotlib.pyplot as plt
         import seaborn as sns
         try:
-            df_calificaciones = _self.df_calificaciones
+            df_calificaciones = self.df_calificaciones
             if df_calificaciones.empty:
                 fig, ax = plt.subplots(figsize=(8, 6))
                 ax.text(0.5, 0.5, "No hay datos disponibles", ha="center", va="center", transform=ax.transAxes, fontsize=14)
@@ -216,82 +477,10 @@ class AnalyticsService:
             ax.text(0.5, 0.5, f"Error: {str(e)}", ha="center", va="center", transform=ax.transAxes, fontsize=12)
             return fig
 
-    @st.cache_data(ttl=300)
-    def generar_grafico_barras_carreras(_self):
-        import matplotlib.pyplot as plt
-        try:
-            df_estudiantes = _self.df_estudiantes
-            if df_estudiantes.empty:
-                fig, ax = plt.subplots(figsize=(10, 6))
-                ax.text(0.5, 0.5, "No hay datos de estudiantes", ha="center", va="center", transform=ax.transAxes, fontsize=14)
-                return fig
-            from config.constants import CARRERAS
-            conteo_carreras = df_estudiantes["carrera_id"].value_counts()
-            nombres_carreras = [CARRERAS.get(cid, f"Carrera {cid}") for cid in conteo_carreras.index]
-            fig, ax = plt.subplots(figsize=(12, 6))
-            ax.bar(nombres_carreras, conteo_carreras.values, color="skyblue", edgecolor="black")
-            ax.set_xlabel("Carreras")
-            ax.set_ylabel("Número de Estudiantes")
-            ax.set_title("Distribución de Estudiantes por Carrera")
-            plt.xticks(rotation=45, ha="right")
-            plt.tight_layout()
-            return fig
-        except Exception as e:
-            import matplotlib.pyplot as plt
-            fig, ax = plt.subplots(figsize=(8, 6))
-            ax.text(0.5, 0.5, f"Error: {str(e)}", ha="center", va="center", transform=ax.transAxes, fontsize=12)
-            return fig
-
-    @st.cache_data(ttl=300)
-    def generar_grafico_tasas_por_carrera(_self):
-        import matplotlib.pyplot as plt
-        try:
-            df_calificaciones = _self.df_calificaciones
-            df_estudiantes = _self.df_estudiantes
-            if df_calificaciones.empty or df_estudiantes.empty:
-                fig, ax = plt.subplots(figsize=(10, 6))
-                ax.text(0.5, 0.5, "No hay datos suficientes", ha="center", va="center", transform=ax.transAxes, fontsize=14)
-                return fig
-            from config.constants import CARRERAS
-            datos_combinados = df_calificaciones.merge(
-                df_estudiantes[["id", "carrera_id"]],
-                left_on="estudiante_id",
-                right_on="id",
-                how="left"
-            )
-            tasas_por_carrera = []
-            for carrera_id in datos_combinados["carrera_id"].unique():
-                datos_carrera = datos_combinados[datos_combinados["carrera_id"] == carrera_id]
-                if len(datos_carrera) > 0:
-                    tasa_reprobacion = datos_carrera["reprobado"].mean() * 100 if "reprobado" in datos_carrera.columns else ((datos_carrera["calificacion_final"] < 70).mean() * 100)
-                    nombre_carrera = CARRERAS.get(carrera_id, f"Carrera {carrera_id}")
-                    tasas_por_carrera.append((nombre_carrera, tasa_reprobacion))
-            if not tasas_por_carrera:
-                fig, ax = plt.subplots(figsize=(8, 6))
-                ax.text(0.5, 0.5, "No hay datos para calcular tasas", ha="center", va="center", transform=ax.transAxes, fontsize=14)
-                return fig
-            tasas_por_carrera.sort(key=lambda x: x[1])
-            carreras, tasas = zip(*tasas_por_carrera)
-            fig, ax = plt.subplots(figsize=(12, 6))
-            bars = ax.bar(carreras, tasas, color="lightcoral", edgecolor="black")
-            ax.set_xlabel("Carreras")
-            ax.set_ylabel("Tasa de Reprobación (%)")
-            ax.set_title("Tasa de Reprobación por Carrera")
-            for bar, tasa in zip(bars, tasas):
-                ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 1, f"{tasa:.1f}%", ha="center", va="bottom")
-            plt.xticks(rotation=45, ha="right")
-            plt.tight_layout()
-            return fig
-        except Exception as e:
-            import matplotlib.pyplot as plt
-            fig, ax = plt.subplots(figsize=(8, 6))
-            ax.text(0.5, 0.5, f"Error: {str(e)}", ha="center", va="center", transform=ax.transAxes, fontsize=12)
-            return fig
-
-    @st.cache_data(ttl=300)
-    def generar_grafico_pareto(_self):
+    @st.cache_data(ttl=300, hash_funcs=_HASH_SERVICIO)
+    def generar_grafico_pareto(self):
         try:
-            df_factores = _self.df_factores
+            df_factores = self.df_factores
             if df_factores.empty:
                 return pd.DataFrame()
             if "categoria" in df_factores.columns and "gravedad" in df_factores.columns:
@@ -306,10 +495,10 @@ class AnalyticsService:
             st.error(f"Error generando Pareto: {e}")
             return pd.DataFrame()
 
-    @st.cache_data(ttl=300)
-    def obtener_datos_para_analisis_visual(_self):
+    @st.cache_data(ttl=300, hash_funcs=_HASH_SERVICIO)
+    def obtener_datos_para_analisis_visual(self):
         try:
-            df_calificaciones = _self.df_calificaciones
+            df_calificaciones = self.df_calificaciones
             if df_calificaciones.empty:
                 return pd.DataFrame()
             columnas_numericas = df_calificaciones.select_dtypes(include=[np.number]).columns.tolist()
@@ -319,7 +508,7 @@ class AnalyticsService:
                 columnas_finales = columnas_numericas[:5] if len(columnas_numericas) > 0 else []
             if len(columnas_finales) == 0:
                 return pd.DataFrame()
-            return df_calificaciones[columnas_finales].copy()
+            return df_calificaciones[columnas_finales]
         except Exception as e:
             st.error(f"Error obteniendo datos para análisis visual: {e}")
-            return pd.DataFrame()
\ No newline at end of file
+            return pd.DataFrame()
@@ -0,0 +1,161 @@
+# services/artefactos.py
+"""
+Cache en disco de reportes ya generados. La clave junta tipo de reporte,
+filtros, formato, opciones, alcance y la huella de los datos del snapshot: si
+los datos cambian la clave cambia, y al publicarse un snapshot distinto se
+borran los archivos del alcance hechos con datos anteriores.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from config.constants import DIR_CACHE_REPORTES, MAX_BYTES_CACHE_REPORTES
+from services.exportacion import LectorArchivo
+
+
+def firma_datos(huella) -> str:
+    """Resumen corto de Snapshot.huella (cambia cuando cambia cualquier tabla)."""
+    return hashlib.sha256(repr(huella).encode("utf-8")).hexdigest()[:16]
+
+
+def _firma_alcance(alcance) -> str:
+    return "-".join(str(p) for p in alcance)
+
+
+class CacheArtefactos:
+    def __init__(self, directorio: str = DIR_CACHE_REPORTES, max_bytes: int = MAX_BYTES_CACHE_REPORTES):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # los reportes traen nombres y calificaciones: solo el usuario de la app los lee o escribe
+        os.makedirs(directorio, mode=0o700, exist_ok=True)
+
+    @staticmethod
+    def clave(**partes) -> str:
+        texto = json.dumps(partes, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:32]
+
+    def _rutas(self, clave):
+        base = os.path.join(self.directorio, clave)
+        return base + ".bin", base + ".json"
+
+    def obtener(self, clave: str) -> dict:
+        """{"archivo", "extension", "mime"} desde disco, o None si no esta."""
+        ruta, ruta_meta = self._rutas(clave)
+        try:
+            with open(ruta_meta, encoding="utf-8") as f:
+                meta = json.load(f)
+            archivo = open(ruta, "rb")
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(ruta_meta)  # marca de uso para el LRU
+        except OSError:
+            pass
+        return {"archivo": LectorArchivo(archivo, meta["tamano"]), "extension": meta["extension"],
+                "mime": meta["mime"], "cache": True}
+
+    def guardar(self, clave: str, resultado: dict, alcance=(), huella=None) -> dict:
+        """
+        Copia el archivo generado a la cache y devuelve uno nuevo leido desde
+        ahi. resultado es el dict de services.exportacion; su "archivo" puede
+        ser tambien bytes (PDF).
+        """
+        ruta, ruta_meta = self._rutas(clave)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        datos = resultado["archivo"]
+        with open(temporal, "wb") as f:
+            if isinstance(datos, (bytes, bytearray)):
+                f.write(datos)
+            else:
+                datos.seek(0)
+                shutil.copyfileobj(datos, f)
+            tamano = f.tell()
+        es_bytes = isinstance(datos, (bytes, bytearray))
+        if tamano > self.max_bytes:
+            # no cabe aunque se vacie la cache: se entrega sin guardar
+            os.remove(temporal)
+            if not es_bytes:
+                datos.seek(0)
+            return resultado
+        meta = {
+            "extension": resultado["extension"],
+            "mime": resultado["mime"],
+            "tamano": tamano,
+            "alcance": _firma_alcance(alcance),
+            "datos": firma_datos(huella) if huella is not None else None,
+            "creado": time.time(),
+        }
+        os.replace(temporal, ruta)
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temporal, ruta_meta)
+        self.recortar()
+        guardado = self.obtener(clave)
+        if guardado is None:
+            if not es_bytes:
+                datos.seek(0)
+            return resultado
+        if not es_bytes:
+            datos.close()
+        return guardado
+
+    def _entradas(self):
+        """[(ultimo uso, tamano, clave, meta)] de todo lo que hay en disco."""
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(".json"):
+                continue
+            ruta_meta = os.path.join(self.directorio, nombre)
+            try:
+                with open(ruta_meta, encoding="utf-8") as f:
+                    meta = json.load(f)
+                entradas.append((os.path.getmtime(ruta_meta), meta.get("tamano", 0), nombre[:-5], meta))
+            except (OSError, ValueError):
+                continue
+        return entradas
+
+    def _borrar(self, clave):
+        for ruta in self._rutas(clave):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+    def recortar(self):
+        """Borra los menos usados hasta quedar bajo max_bytes."""
+        with self._lock:
+            entradas = sorted(self._entradas())
+            total = sum(e[1] for e in entradas)
+            for _, tamano, clave, _ in entradas:
+                if total <= self.max_bytes:
+                    break
+                self._borrar(clave)
+                total -= tamano
+
+    def invalidar(self, alcance, huella):
+        """Borra los reportes del alcance generados con datos distintos a huella."""
+        firma, objetivo = firma_datos(huella), _firma_alcance(alcance)
+        with self._lock:
+            for _, _, clave, meta in self._entradas():
+                if meta.get("alcance") == objetivo and meta.get("datos") != firma:
+                    self._borrar(clave)
+
+    def bytes_en_uso(self) -> int:
+        return sum(e[1] for e in self._entradas())
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def cache_artefactos() -> CacheArtefactos:
+    """Cache unica del proceso."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = CacheArtefactos()
+        return _CACHE
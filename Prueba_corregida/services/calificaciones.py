@@ -0,0 +1,78 @@
+# services/calificaciones.py
+"""
+Captura de calificaciones de un grupo completo: tabla editable con todos los
+inscritos, calculo vectorizado de la final y envio de solo las filas que
+cambiaron en upserts por lotes.
+"""
+import numpy as np
+import pandas as pd
+
+from config.constants import TAM_LOTE_CALIFICACIONES
+
+UNIDADES = ["u1", "u2", "u3"]
+COLS_CAPTURA = UNIDADES + ["asistencia"]
+
+
+def calcular_finales(df: pd.DataFrame) -> pd.Series:
+    """Promedio de las tres unidades a 2 decimales; vacio si falta alguna."""
+    return df[UNIDADES].apply(pd.to_numeric, errors="coerce").mean(axis=1, skipna=False).round(2)
+
+
+def tabla_captura(inscritos, calificaciones: pd.DataFrame) -> pd.DataFrame:
+    """
+    Una fila por alumno inscrito (indice estudiante_id) con lo ya registrado
+    en el grupo. calificaciones debe venir filtrado a materia, periodo y grupo.
+    """
+    base = pd.DataFrame(list(inscritos or []), columns=["id", "nombre"]) \
+        .rename(columns={"id": "estudiante_id"})
+    base["estudiante_id"] = base["estudiante_id"].astype("int64")
+    if calificaciones is not None and not calificaciones.empty and "estudiante_id" in calificaciones.columns:
+        previas = calificaciones.reindex(columns=["estudiante_id"] + COLS_CAPTURA) \
+            .drop_duplicates("estudiante_id", keep="last")
+        previas = previas.assign(estudiante_id=previas["estudiante_id"].astype("int64"))
+        base = base.merge(previas, on="estudiante_id", how="left")
+    else:
+        base = base.reindex(columns=["estudiante_id", "nombre"] + COLS_CAPTURA)
+    base[COLS_CAPTURA] = base[COLS_CAPTURA].apply(pd.to_numeric, errors="coerce").astype(float)
+    base["calificacion_final"] = calcular_finales(base)
+    return base.set_index("estudiante_id")
+
+
+def cambios_captura(original: pd.DataFrame, editada: pd.DataFrame, materia_id: int, periodo: str, grupo: str):
+    """
+    Payload del upsert con las filas editadas que cambiaron y estan completas.
+    Devuelve (filas, incompletas): las incompletas cambiaron pero les falta
+    alguna unidad o la asistencia y no se envian.
+    """
+    a = original[COLS_CAPTURA].astype(float)
+    b = editada.reindex(index=a.index, columns=COLS_CAPTURA).apply(pd.to_numeric, errors="coerce").astype(float)
+    igual = (a == b) | (a.isna() & b.isna())
+    cambiada = ~igual.all(axis=1)
+    completa = b.notna().all(axis=1)
+    incompletas = int((cambiada & ~completa).sum())
+
+    b = b[cambiada & completa]
+    if b.empty:
+        return [], incompletas
+    b = b.assign(calificacion_final=calcular_finales(b))
+    filas = pd.DataFrame({
+        "estudiante_id": b.index.astype("int64"),
+        "materia_id": int(materia_id),
+        "periodo": str(periodo),
+        "grupo": str(grupo),
+    })
+    for c in COLS_CAPTURA + ["calificacion_final"]:
+        filas[c] = b[c].to_numpy(dtype=np.float64)
+    return [{k: (v.item() if hasattr(v, "item") else v) for k, v in r.items()}
+            for r in filas.to_dict("records")], incompletas
+
+
+def guardar_calificaciones(db, filas: list, tam: int = TAM_LOTE_CALIFICACIONES):
+    """Upsert en lotes de tam filas. Devuelve cuantas se guardaron o None si un lote falla."""
+    guardadas = 0
+    for i in range(0, len(filas), tam):
+        res = db.upsert_calificaciones_lote(filas[i:i + tam])
+        if res is None:
+            return None
+        guardadas += len(filas[i:i + tam])
+    return guardadas
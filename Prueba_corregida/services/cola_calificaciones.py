@@ -0,0 +1,222 @@
+# services/cola_calificaciones.py
+"""
+Escritura diferida de calificaciones. Guardar solo escribe en una cola SQLite
+local (modo WAL) y confirma de inmediato; un hilo la vacia hacia Supabase con
+upserts por lotes. Varias ediciones de la misma clave (estudiante, materia,
+periodo, grupo) se funden en una sola fila: se envia la ultima.
+"""
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from config.constants import (ESPERA_MAXIMA_REINTENTO, INTERVALO_COLA_CALIFICACIONES,
+                              RUTA_COLA_CALIFICACIONES, TAM_LOTE_CALIFICACIONES)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pendientes (
+    estudiante_id INTEGER NOT NULL,
+    materia_id    INTEGER NOT NULL,
+    periodo       TEXT    NOT NULL,
+    grupo         TEXT    NOT NULL,
+    payload       TEXT    NOT NULL,
+    version       INTEGER NOT NULL DEFAULT 1,
+    creado        REAL    NOT NULL,
+    intentos      INTEGER NOT NULL DEFAULT 0,
+    proximo       REAL    NOT NULL DEFAULT 0,
+    error         TEXT,
+    PRIMARY KEY (estudiante_id, materia_id, periodo, grupo)
+)
+"""
+
+
+def comprobar_ruta_persistente(ruta: str = RUTA_COLA_CALIFICACIONES):
+    """
+    Las calificaciones se confirman al docente en cuanto estan en la cola, asi
+    que la cola debe sobrevivir reinicios: falla al arrancar si esta en el
+    directorio temporal (tmpfs o limpiado al reiniciar) o no se puede escribir.
+    """
+    ruta = os.path.realpath(ruta)
+    temporal = os.path.realpath(tempfile.gettempdir())
+    if os.path.commonpath([ruta, temporal]) == temporal:
+        raise RuntimeError(
+            f"ESCRITURA_DIFERIDA_CALIFICACIONES requiere una cola persistente y {ruta} esta en el "
+            "directorio temporal; define DIR_DATOS_APP o RUTA_COLA_CALIFICACIONES")
+    directorio = os.path.dirname(ruta)
+    try:
+        os.makedirs(directorio, mode=0o700, exist_ok=True)
+    except OSError as e:
+        raise RuntimeError(f"No se puede crear el directorio de la cola de calificaciones {directorio}: {e}")
+    if not os.access(directorio, os.W_OK):
+        raise RuntimeError(f"No se puede escribir la cola de calificaciones en {directorio}")
+
+
+def espera_reintento(intentos: int, base: float = 1.0, tope: float = ESPERA_MAXIMA_REINTENTO) -> float:
+    """Backoff exponencial con jitter: ~1, 2, 4, ... segundos hasta el tope."""
+    return min(tope, base * 2 ** max(0, intentos - 1)) * random.uniform(0.8, 1.2)
+
+
+class ColaCalificaciones:
+    def __init__(self, ruta: str = RUTA_COLA_CALIFICACIONES, intervalo: float = INTERVALO_COLA_CALIFICACIONES,
+                 tam_lote: int = TAM_LOTE_CALIFICACIONES):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self.tam_lote = tam_lote
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        with self._conexion() as cx:
+            cx.execute("PRAGMA journal_mode=WAL")
+            cx.execute(_ESQUEMA)
+
+    def _conexion(self):
+        cx = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        cx.execute("PRAGMA synchronous=NORMAL")
+        return _Conexion(cx)
+
+    # ===== sesiones (UI)
+    def encolar(self, filas: list) -> int:
+        """
+        Guarda las filas en la cola y regresa en cuanto quedan en disco. Si la
+        clave ya estaba pendiente se reemplaza su payload (gana la ultima edicion)
+        y se reinicia su backoff.
+        """
+        if not filas:
+            return 0
+        ahora = time.time()
+        with self._conexion() as cx:
+            cx.execute("BEGIN IMMEDIATE")
+            cx.executemany(
+                """INSERT INTO pendientes (estudiante_id, materia_id, periodo, grupo, payload, creado)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (estudiante_id, materia_id, periodo, grupo) DO UPDATE SET
+                       payload = excluded.payload, version = version + 1, intentos = 0, proximo = 0""",
+                [(int(f["estudiante_id"]), int(f["materia_id"]), str(f["periodo"]), str(f["grupo"]),
+                  json.dumps(f), ahora) for f in filas],
+            )
+            cx.execute("COMMIT")
+        self._despertar.set()
+        return len(filas)
+
+    def estado(self, materia_id: int = None, periodo: str = None, grupo: str = None) -> dict:
+        """Pendientes (de un grupo o de todos), cuantas fallaron y el ultimo error."""
+        donde, args = "", ()
+        if materia_id is not None:
+            donde, args = "WHERE materia_id = ? AND periodo = ? AND grupo = ?", (int(materia_id), str(periodo), str(grupo))
+        with self._conexion() as cx:
+            n, fallidas, mas_vieja = cx.execute(
+                f"SELECT COUNT(*), SUM(intentos > 0), MIN(creado) FROM pendientes {donde}", args).fetchone()
+            error = cx.execute(
+                f"SELECT error FROM pendientes {donde} {'AND' if donde else 'WHERE'} error IS NOT NULL "
+                "ORDER BY proximo DESC LIMIT 1", args).fetchone()
+        return {
+            "pendientes": int(n or 0),
+            "con_error": int(fallidas or 0),
+            "ultimo_error": error[0] if error else None,
+            "antiguedad": (time.time() - mas_vieja) if mas_vieja else 0.0,
+        }
+
+    def pendientes_de(self, materia_id: int, periodo: str, grupo: str) -> pd.DataFrame:
+        """Filas aun no enviadas de un grupo, para mostrarlas encima del snapshot."""
+        with self._conexion() as cx:
+            filas = cx.execute(
+                "SELECT payload FROM pendientes WHERE materia_id = ? AND periodo = ? AND grupo = ?",
+                (int(materia_id), str(periodo), str(grupo))).fetchall()
+        return pd.DataFrame([json.loads(p) for (p,) in filas])
+
+    # ===== vaciado
+    def vaciar(self, db, ahora: float = None) -> int:
+        """
+        Envia un lote de lo que ya toca reintentar. Solo borra las filas cuya
+        version no cambio mientras se enviaban; una edicion que llego en medio
+        se queda para el siguiente lote. Devuelve cuantas se confirmaron.
+        """
+        ahora = time.time() if ahora is None else ahora
+        with self._conexion() as cx:
+            lote = cx.execute(
+                "SELECT estudiante_id, materia_id, periodo, grupo, payload, version, intentos FROM pendientes "
+                "WHERE proximo <= ? ORDER BY creado LIMIT ?", (ahora, self.tam_lote)).fetchall()
+        if not lote:
+            return 0
+
+        try:
+            # desde el hilo st.error no llega a nadie: el motivo real se guarda en la cola
+            res = db.upsert_calificaciones_lote([json.loads(r[4]) for r in lote], lanzar=True)
+            error = None if res is not None else "El servidor rechazo el lote"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+        with self._conexion() as cx:
+            cx.execute("BEGIN IMMEDIATE")
+            if error is None:
+                cx.executemany(
+                    "DELETE FROM pendientes WHERE estudiante_id = ? AND materia_id = ? AND periodo = ? "
+                    "AND grupo = ? AND version = ?", [r[:4] + (r[5],) for r in lote])
+            else:
+                cx.executemany(
+                    "UPDATE pendientes SET intentos = ?, proximo = ?, error = ? WHERE estudiante_id = ? "
+                    "AND materia_id = ? AND periodo = ? AND grupo = ? AND version = ?",
+                    [(r[6] + 1, ahora + espera_reintento(r[6] + 1), error) + r[:4] + (r[5],) for r in lote])
+            cx.execute("COMMIT")
+        return len(lote) if error is None else 0
+
+    def _bucle(self, db):
+        while not self._detener.is_set():
+            self._despertar.clear()
+            try:
+                enviadas = self.vaciar(db)
+            except Exception:
+                enviadas = 0
+            if enviadas:
+                continue  # puede haber mas lotes listos
+            self._despertar.wait(self.intervalo)
+
+    def iniciar(self, db):
+        """Arranca el hilo que vacia la cola (una vez por proceso)."""
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle, args=(db,), name="cola-calificaciones", daemon=True)
+            self._hilo.start()
+
+    def detener(self, espera: float = 5.0):
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join(espera)
+
+
+class _Conexion:
+    """Conexion corta: se abre por operacion y se cierra al salir del with."""
+
+    def __init__(self, cx):
+        self.cx = cx
+
+    def __enter__(self):
+        return self.cx
+
+    def __exit__(self, tipo, *_):
+        if tipo is not None and self.cx.in_transaction:
+            self.cx.execute("ROLLBACK")
+        self.cx.close()
+
+
+_COLA = None
+_COLA_LOCK = threading.Lock()
+
+
+def cola_calificaciones() -> ColaCalificaciones:
+    """Cola unica del proceso."""
+    global _COLA
+    with _COLA_LOCK:
+        if _COLA is None:
+            _COLA = ColaCalificaciones()
+        return _COLA
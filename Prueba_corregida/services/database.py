@@ -1,6 +1,16 @@
 import os
 import streamlit as st
 import pandas as pd
+from services.rosters import cache_rosters
+
+_COLS_ESTUDIANTES = ("id, matricula, nombre, nombres, apellido_paterno, apellido_materno, carrera_id, "
+                     "ingreso_semestre, horas_estudio, desercion")
+_COLS_CALIFICACIONES = ("id, estudiante_id, materia_id, periodo, grupo, "
+                        "calificacion_final, asistencia, u1, u2, u3, reprobado")
+_COLS_FACTORES = "id, categoria, nombre, inscripcion_id, gravedad"
+_COLS_MATERIAS = "id, nombre, semestre, carrera_id, docente, docente_user_id"
+_COLS_GRUPOS = "id, materia_id, periodo, grupo"
+_COLS_INSCRIPCIONES = "id, estudiante_id, materia_id, periodo, grupo"
 
 def _crear_supabase_client():
     url = st.secrets.get("SUPABASE_URL") or os.environ.get("SUPABASE_URL")
@@ -27,16 +37,14 @@ class DatabaseService:
             st.cache_data.clear()
         except Exception:
             pass
+        cache_rosters().limpiar()
         return True
 
     # ===== CARGAS para AnalyticsService.cargar_datos
     def cargar_estudiantes(self) -> pd.DataFrame:
         try:
             # dentro de DatabaseService.cargar_estudiantes()
-            res = self.supabase.table("estudiantes").select(
-                "id, matricula, nombre, nombres, apellido_paterno, apellido_materno, carrera_id, "
-                "ingreso_semestre, horas_estudio, desercion"
-            ).order("id").execute()
+            res = self.supabase.table("estudiantes").select(_COLS_ESTUDIANTES).order("id").execute()
             return self._to_df(res.data)
         except Exception as e:
             st.error(f"Error cargando estudiantes: {e}")
@@ -44,10 +52,7 @@ class DatabaseService:
 
     def cargar_calificaciones(self) -> pd.DataFrame:
         try:
-            res = self.supabase.table("registro_calificaciones").select(
-                "id, estudiante_id, materia_id, periodo, grupo, "
-                "calificacion_final, asistencia, u1, u2, u3, reprobado"
-            ).order("id").execute()
+            res = self.supabase.table("registro_calificaciones").select(_COLS_CALIFICACIONES).order("id").execute()
             return self._to_df(res.data)
         except Exception as e:
             st.error(f"Error cargando calificaciones: {e}")
@@ -55,9 +60,7 @@ class DatabaseService:
 
     def cargar_factores(self) -> pd.DataFrame:
         try:
-            res = self.supabase.table("factores").select(
-                "id, categoria, nombre, inscripcion_id, gravedad"
-            ).order("id").execute()
+            res = self.supabase.table("factores").select(_COLS_FACTORES).order("id").execute()
             return self._to_df(res.data)
         except Exception as e:
             st.error(f"Error cargando factores: {e}")
@@ -65,9 +68,7 @@ class DatabaseService:
 
     def cargar_materias(self) -> pd.DataFrame:
         try:
-            q = self.supabase.table("materias").select(
-                "id, nombre, semestre, carrera_id, docente, docente_user_id"
-            )
+            q = self.supabase.table("materias").select(_COLS_MATERIAS)
             # RBAC docente
             try:
                 from services.rbac import es_docente, usuario_id
@@ -83,14 +84,81 @@ class DatabaseService:
 
     def cargar_grupos(self) -> pd.DataFrame:
         try:
-            res = self.supabase.table("grupos").select(
-                "id, materia_id, periodo, grupo"
-            ).order("periodo", desc=True).execute()
+            res = self.supabase.table("grupos").select(_COLS_GRUPOS).order("periodo", desc=True).execute()
             return self._to_df(res.data)
         except Exception as e:
             st.error(f"Error cargando grupos: {e}")
             return pd.DataFrame()
 
+    # ===== CARGAS acotadas a un docente
+    def _select_in(self, tabla: str, columnas: str, campo: str, valores, orden: str = "id", desc: bool = False,
+                   enteros: bool = True, extra: dict = None) -> pd.DataFrame:
+        """
+        select columnas from tabla where campo in valores.
+        Parte la lista en lotes de TAM_LOTE_IN para no exceder el largo de la URL.
+        extra agrega filtros in_() fijos a cada lote: {campo: valores}.
+        """
+        from config.constants import TAM_LOTE_IN
+        conv = int if enteros else (lambda v: str(v).strip())
+        ids = sorted({conv(v) for v in valores if pd.notna(v)})
+        if not ids:
+            return pd.DataFrame()
+        filas = []
+        for i in range(0, len(ids), TAM_LOTE_IN):
+            q = self.supabase.table(tabla).select(columnas).in_(campo, ids[i:i + TAM_LOTE_IN])
+            for c, vals in (extra or {}).items():
+                q = q.in_(c, list(vals))
+            res = q.order(orden, desc=desc).execute()
+            filas.extend(res.data or [])
+        df = self._to_df(filas)
+        if not df.empty and orden in df.columns:
+            df = df.sort_values(orden, ascending=not desc, kind="stable", ignore_index=True)
+        return df
+
+    def obtener_materias_docente(self, docente_id: int):
+        try:
+            res = (self.supabase.table("materias")
+                   .select(_COLS_MATERIAS)
+                   .eq("docente_user_id", int(docente_id))
+                   .order("nombre")
+                   .execute())
+            return res.data or []
+        except Exception as e:
+            st.error(f"Error cargando materias del docente: {e}")
+            return []
+
+    def cargar_datos_docente(self, docente_id: int) -> dict:
+        """
+        Misma forma que AnalyticsService._cargar_datos_actualizados pero solo con
+        lo que ve un docente: sus materias y, via in_(), las calificaciones, grupos,
+        inscripciones, estudiantes y factores ligados a ellas.
+        """
+        materias = self._to_df(self.obtener_materias_docente(docente_id))
+        ids_mat = materias["id"].tolist() if not materias.empty else []
+        try:
+            calificaciones = self._select_in("registro_calificaciones", _COLS_CALIFICACIONES, "materia_id", ids_mat)
+            grupos = self._select_in("grupos", _COLS_GRUPOS, "materia_id", ids_mat, orden="periodo", desc=True)
+            inscripciones = self._select_in("inscripciones", _COLS_INSCRIPCIONES, "materia_id", ids_mat)
+
+            ids_est = set()
+            for df in (calificaciones, inscripciones):
+                if not df.empty:
+                    ids_est.update(df["estudiante_id"].dropna().tolist())
+            estudiantes = self._select_in("estudiantes", _COLS_ESTUDIANTES, "id", ids_est)
+
+            ids_insc = inscripciones["id"].tolist() if not inscripciones.empty else []
+            factores = self._select_in("factores", _COLS_FACTORES, "inscripcion_id", ids_insc)
+        except Exception as e:
+            st.error(f"Error cargando datos del docente: {e}")
+            calificaciones = grupos = estudiantes = factores = pd.DataFrame()
+        return {
+            "estudiantes": estudiantes,
+            "calificaciones": calificaciones,
+            "factores": factores,
+            "materias": materias,
+            "grupos": grupos
+        }
+
     # ===== OPERACIONES usadas en UI
     def insertar_estudiante(self, data: dict):
         try:
@@ -105,6 +173,98 @@ class DatabaseService:
             st.error(f"Error insertando estudiante: {e}")
             return None
         
+    # ===== Escritura en lote (importacion)
+    def insertar_estudiantes_lote(self, filas: list, lanzar: bool = False):
+        """Upsert por matricula de varios alumnos en una sola peticion. None si falla (o lanza, como upsert_calificaciones_lote)."""
+        if not filas:
+            return []
+        try:
+            res = self.supabase.table("estudiantes") \
+                .upsert(filas, on_conflict="matricula", returning="representation") \
+                .execute()
+            return res.data or []
+        except Exception as e:
+            if lanzar:
+                raise
+            st.error(f"Error insertando estudiantes: {e}")
+            return None
+
+    def upsert_calificaciones_lote(self, filas: list, lanzar: bool = False):
+        """
+        Upsert por clave compuesta de varias calificaciones. None si falla; con
+        lanzar=True el error se propaga (hilos en segundo plano, donde st.error
+        no llega a la pagina).
+        """
+        if not filas:
+            return []
+        try:
+            res = self.supabase.table("registro_calificaciones") \
+                .upsert(filas, on_conflict="estudiante_id,materia_id,periodo,grupo", returning="representation") \
+                .execute()
+            return res.data or []
+        except Exception as e:
+            if lanzar:
+                raise
+            st.error(f"Error guardando calificaciones: {e}")
+            return None
+
+    # ===== Existencia en el servidor (simulacion de importacion)
+    def obtener_estudiantes_por_matricula(self, matriculas, lanzar: bool = False) -> pd.DataFrame:
+        try:
+            return self._select_in("estudiantes", _COLS_ESTUDIANTES, "matricula", matriculas, enteros=False)
+        except Exception as e:
+            if lanzar:
+                raise
+            st.error(f"Error consultando estudiantes: {e}")
+            return pd.DataFrame()
+
+    def obtener_calificaciones_de(self, estudiante_ids, materia_ids, lanzar: bool = False) -> pd.DataFrame:
+        """Calificaciones de esos alumnos en esas materias; el resto de la clave se filtra en pandas."""
+        try:
+            materias = sorted({int(m) for m in materia_ids if pd.notna(m)})
+            return self._select_in("registro_calificaciones", _COLS_CALIFICACIONES, "estudiante_id",
+                                   estudiante_ids, extra={"materia_id": materias})
+        except Exception as e:
+            if lanzar:
+                raise
+            st.error(f"Error consultando calificaciones: {e}")
+            return pd.DataFrame()
+
+    def obtener_factores_de(self, inscripcion_ids, lanzar: bool = False) -> pd.DataFrame:
+        """Factores registrados para esas inscripciones (consultas in_() por lotes)."""
+        try:
+            return self._select_in("factores", _COLS_FACTORES, "inscripcion_id", inscripcion_ids)
+        except Exception as e:
+            if lanzar:
+                raise
+            st.error(f"Error consultando factores: {e}")
+            return pd.DataFrame()
+
+    def insertar_factores_lote(self, filas: list, lanzar: bool = False):
+        if not filas:
+            return []
+        try:
+            res = self.supabase.table("factores").insert(filas).execute()
+            return res.data or []
+        except Exception as e:
+            if lanzar:
+                raise
+            st.error(f"Error insertando factores: {e}")
+            return None
+
+    def actualizar_factores_lote(self, filas: list, lanzar: bool = False):
+        """Upsert por id de factores ya registrados. None si falla."""
+        if not filas:
+            return []
+        try:
+            res = self.supabase.table("factores").upsert(filas, on_conflict="id").execute()
+            return res.data or []
+        except Exception as e:
+            if lanzar:
+                raise
+            st.error(f"Error actualizando factores: {e}")
+            return None
+
     def insertar_materia(self, data: dict):
         try:
             res = self.supabase.table("materias").insert(data).execute()
@@ -329,16 +489,75 @@ class DatabaseService:
             "periodo": str(periodo),
             "grupo": str(grupo)
         }
-        return self.supabase.table("inscripciones").insert(payload).execute()
+        try:
+            return self.supabase.table("inscripciones").insert(payload).execute()
+        finally:
+            cache_rosters().invalidar(materia_id, periodo, grupo)
 
     def desinscribir_estudiante(self, estudiante_id: int, materia_id: int, periodo: str, grupo: str):
-        return self.supabase.table("inscripciones") \
-            .delete() \
-            .eq("estudiante_id", int(estudiante_id)) \
+        try:
+            return self.supabase.table("inscripciones") \
+                .delete() \
+                .eq("estudiante_id", int(estudiante_id)) \
+                .eq("materia_id", int(materia_id)) \
+                .eq("periodo", str(periodo)) \
+                .eq("grupo", str(grupo)) \
+                .execute()
+        finally:
+            cache_rosters().invalidar(materia_id, periodo, grupo)
+
+    # ===== Inscripciones en lote
+    def _ids_inscritos(self, materia_id: int, periodo: str, grupo: str) -> set:
+        res = self.supabase.table("inscripciones") \
+            .select("estudiante_id") \
             .eq("materia_id", int(materia_id)) \
             .eq("periodo", str(periodo)) \
             .eq("grupo", str(grupo)) \
             .execute()
+        return {int(r["estudiante_id"]) for r in (res.data or []) if r.get("estudiante_id") is not None}
+
+    def aplicar_inscripciones(self, materia_id: int, periodo: str, grupo: str, agregar=(), quitar=(), objetivo=None):
+        """
+        Inscribe y desinscribe varios alumnos de un grupo de una vez. Con objetivo
+        (la lista completa deseada) se calcula que agregar y que quitar.
+        Se compara contra lo ya inscrito, asi que repetir la llamada no duplica:
+        inserts por lotes y un delete in_() por cada TAM_LOTE_IN ids.
+        Devuelve {"inscritos": [...], "desinscritos": [...]} o None si falla.
+        """
+        from config.constants import TAM_LOTE_IN, TAM_LOTE_INSCRIPCIONES
+        try:
+            actuales = self._ids_inscritos(materia_id, periodo, grupo)
+            if objetivo is not None:
+                objetivo = {int(i) for i in objetivo}
+                agregar, quitar = objetivo - actuales, actuales - objetivo
+            nuevos = sorted({int(i) for i in agregar} - actuales)
+            fuera = sorted({int(i) for i in quitar} & actuales)
+
+            clave = {"materia_id": int(materia_id), "periodo": str(periodo), "grupo": str(grupo)}
+            for i in range(0, len(nuevos), TAM_LOTE_INSCRIPCIONES):
+                filas = [{"estudiante_id": e, **clave} for e in nuevos[i:i + TAM_LOTE_INSCRIPCIONES]]
+                self.supabase.table("inscripciones").insert(filas).execute()
+            for i in range(0, len(fuera), TAM_LOTE_IN):
+                self.supabase.table("inscripciones") \
+                    .delete() \
+                    .eq("materia_id", clave["materia_id"]) \
+                    .eq("periodo", clave["periodo"]) \
+                    .eq("grupo", clave["grupo"]) \
+                    .in_("estudiante_id", fuera[i:i + TAM_LOTE_IN]) \
+                    .execute()
+            return {"inscritos": nuevos, "desinscritos": fuera}
+        except Exception as e:
+            st.error(f"Error actualizando inscripciones: {e}")
+            return None
+        finally:
+            # aun si fallo a medias, lo guardado del grupo ya no es confiable
+            cache_rosters().invalidar(materia_id, periodo, grupo)
+
+    def inscribir_estudiantes(self, estudiante_ids, materia_id: int, periodo: str, grupo: str):
+        return self.aplicar_inscripciones(materia_id, periodo, grupo, agregar=estudiante_ids)
+
+    def desinscribir_estudiantes(self, estudiante_ids, materia_id: int, periodo: str, grupo: str):
+        return self.aplicar_inscripciones(materia_id, periodo, grupo, quitar=estudiante_ids)
 
     def alumnos_inscritos_para_calificacion(self, materia_id: int, periodo: str, grupo: str):
         filas = self.listar_inscritos(materia_id, periodo, grupo)
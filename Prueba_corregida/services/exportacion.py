@@ -0,0 +1,308 @@
+# services/exportacion.py
+"""
+Escritura de reportes a archivo (CSV, Excel, Parquet, Feather y Arrow). Los datos se serializan por
+bloques a un archivo temporal que vive en memoria mientras es chico y pasa a
+disco al crecer; nunca se arma el reporte completo como un str o bytes aparte.
+"""
+import gzip
+import io
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from config.constants import FILAS_POR_GRUPO_COLUMNAR, MAX_MEMORIA_EXPORTACION, TAM_BLOQUE_EXPORTACION
+
+MIME_CSV = "text/csv"
+MIME_GZIP = "application/gzip"
+MIME_ZIP = "application/zip"
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# formato columnar -> (extension, mime)
+FORMATOS_COLUMNARES = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "feather": (".feather", "application/vnd.apache.arrow.file"),
+    "arrow": (".arrows", "application/vnd.apache.arrow.stream"),
+}
+
+XLSX_MAX_FILAS = 1_048_575      # sin contar el encabezado
+_ANCHO_MAX_COLUMNA = 60
+
+
+class LectorArchivo(io.RawIOBase):
+    """
+    Envuelve el SpooledTemporaryFile del reporte como io.RawIOBase, que es lo
+    que st.download_button acepta como archivo.
+    """
+
+    def __init__(self, archivo, tamano: int):
+        self._archivo = archivo
+        self.tamano = tamano
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        datos = self._archivo.read(len(b))
+        b[:len(datos)] = datos
+        return len(datos)
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        return self._archivo.seek(pos, whence)
+
+    def tell(self):
+        return self._archivo.tell()
+
+    def close(self):
+        if not self.closed:
+            self._archivo.close()
+        super().close()
+
+
+def archivo_temporal():
+    return tempfile.SpooledTemporaryFile(max_size=MAX_MEMORIA_EXPORTACION, mode="w+b")
+
+
+def _terminar(archivo) -> LectorArchivo:
+    tamano = archivo.tell()
+    archivo.seek(0)
+    return LectorArchivo(archivo, tamano)
+
+
+def escribir_csv(df: pd.DataFrame, destino, tam: int = TAM_BLOQUE_EXPORTACION):
+    """Escribe df como CSV UTF-8 en el flujo binario destino, tam filas a la vez."""
+    texto = io.TextIOWrapper(destino, encoding="utf-8", newline="", write_through=True)
+    try:
+        if df.empty:
+            df.to_csv(texto, index=False)
+        for i in range(0, len(df), tam):
+            df.iloc[i:i + tam].to_csv(texto, index=False, header=(i == 0))
+        texto.flush()
+    finally:
+        texto.detach()
+
+
+def exportar_csv(secciones: dict, comprimir: bool = False, tam: int = TAM_BLOQUE_EXPORTACION) -> dict:
+    """
+    secciones: {nombre: DataFrame}. Una sola seccion se escribe como .csv (o
+    .csv.gz); varias, como un .zip con un CSV por seccion.
+    Devuelve {"archivo": LectorArchivo, "extension", "mime"}.
+    """
+    secciones = {n: df for n, df in secciones.items() if df is not None}
+    if not secciones:
+        return None
+    salida = archivo_temporal()
+
+    if len(secciones) == 1:
+        df = next(iter(secciones.values()))
+        if comprimir:
+            # mtime fijo: el mismo reporte produce el mismo archivo
+            with gzip.GzipFile(fileobj=salida, mode="wb", mtime=0) as gz:
+                escribir_csv(df, gz, tam)
+            return {"archivo": _terminar(salida), "extension": ".csv.gz", "mime": MIME_GZIP}
+        escribir_csv(df, salida, tam)
+        return {"archivo": _terminar(salida), "extension": ".csv", "mime": MIME_CSV}
+
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for nombre, df in secciones.items():
+            with zf.open(f"{nombre}.csv", "w", force_zip64=True) as miembro:
+                escribir_csv(df, miembro, tam)
+    return {"archivo": _terminar(salida), "extension": ".zip", "mime": MIME_ZIP}
+
+
+# ===== Excel (xlsxwriter en modo constant_memory)
+def _tipo_columna(serie: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(serie):
+        return "bool"
+    if pd.api.types.is_integer_dtype(serie):
+        return "entero"
+    if pd.api.types.is_float_dtype(serie):
+        return "decimal"
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return "fecha"
+    return "texto"
+
+
+def _ancho_columna(nombre, serie: pd.Series, tipo: str) -> int:
+    """Ancho aproximado en caracteres, calculado una vez por columna."""
+    ancho = len(str(nombre))
+    if serie.empty:
+        return ancho + 2
+    if tipo == "texto":
+        largo = serie.dropna().astype(str).str.len().max()
+    elif tipo == "fecha":
+        largo = 19
+    elif tipo == "bool":
+        largo = 5
+    else:
+        extremos = serie.dropna()
+        largo = max((len(f"{v:,.2f}") for v in (extremos.min(), extremos.max())), default=0) if len(extremos) else 0
+    return int(min(_ANCHO_MAX_COLUMNA, max(ancho, largo if pd.notna(largo) else 0) + 2))
+
+
+def _valores_bloque(serie: pd.Series, tipo: str) -> np.ndarray:
+    """Arreglo del bloque listo para escribir: None donde falta el dato."""
+    if tipo in ("entero", "decimal"):
+        valores = serie.to_numpy(dtype=np.float64, na_value=np.nan).astype(object)
+    elif tipo == "fecha":
+        s = serie.dt.tz_localize(None) if getattr(serie.dt, "tz", None) is not None else serie
+        valores = np.array(s.dt.to_pydatetime(), dtype=object)
+    elif tipo == "bool":
+        valores = serie.to_numpy(dtype=object)
+    else:
+        valores = serie.to_numpy(dtype=object, copy=True)
+        falta = serie.isna().to_numpy()
+        valores[~falta] = serie[~falta].astype(str).to_numpy()
+        return np.where(falta, None, valores)
+    falta = serie.isna().to_numpy()
+    if falta.any():
+        valores[falta] = None
+    return valores
+
+
+def _nombre_hoja(nombre: str, usados: set) -> str:
+    limpio = "".join("_" if c in '[]:*?/\\' else c for c in str(nombre))[:31] or "Hoja"
+    base, n = limpio, 2
+    while limpio.lower() in usados:
+        sufijo = f"_{n}"
+        limpio, n = base[:31 - len(sufijo)] + sufijo, n + 1
+    usados.add(limpio.lower())
+    return limpio
+
+
+def _escribir_hoja(libro, nombre: str, df: pd.DataFrame, usados: set, tam: int):
+    """Escribe df fila por fila en orden (lo que exige constant_memory); parte en varias hojas si no cabe."""
+    fmt_encabezado = libro.add_format({"bold": True, "bg_color": "#D9E1F2", "border": 1})
+    formatos = {
+        "entero": libro.add_format({"num_format": "0"}),
+        "decimal": libro.add_format({"num_format": "0.00"}),
+        "fecha": libro.add_format({"num_format": "yyyy-mm-dd hh:mm"}),
+        "bool": None,
+        "texto": None,
+    }
+    columnas = list(df.columns)
+    tipos = [_tipo_columna(df[c]) for c in columnas]
+    anchos = [_ancho_columna(c, df[c], t) for c, t in zip(columnas, tipos)]
+
+    def nueva_hoja():
+        hoja = libro.add_worksheet(_nombre_hoja(nombre, usados))
+        for j, (ancho, tipo) in enumerate(zip(anchos, tipos)):
+            hoja.set_column(j, j, ancho, formatos[tipo])
+        hoja.write_row(0, 0, [str(c) for c in columnas], fmt_encabezado)
+        hoja.freeze_panes(1, 0)
+        return hoja
+
+    def escritores(hoja):
+        # metodo tipado por columna: evita que xlsxwriter adivine el tipo celda por celda
+        metodo = {"entero": hoja.write_number, "decimal": hoja.write_number, "fecha": hoja.write_datetime,
+                  "bool": hoja.write_boolean, "texto": hoja.write_string}
+        return [(metodo[t], formatos[t]) for t in tipos]
+
+    hoja = nueva_hoja()
+    escribir_en = escritores(hoja)
+    fila = 1
+    for inicio in range(0, len(df), tam):
+        bloque = df.iloc[inicio:inicio + tam]
+        arreglos = [_valores_bloque(bloque[c], t) for c, t in zip(columnas, tipos)]
+        for valores in zip(*arreglos):
+            if fila > XLSX_MAX_FILAS:
+                hoja, fila = nueva_hoja(), 1
+                escribir_en = escritores(hoja)
+            for j, v in enumerate(valores):
+                if v is not None:
+                    escribir, fmt = escribir_en[j]
+                    escribir(fila, j, v, fmt)
+            fila += 1
+
+
+def exportar_excel(hojas: dict, tam: int = TAM_BLOQUE_EXPORTACION) -> dict:
+    """
+    hojas: {nombre de hoja: DataFrame}. Usa xlsxwriter con constant_memory: cada
+    fila se escribe a disco al pasar a la siguiente, asi la memoria no crece
+    con el numero de filas. Devuelve {"archivo", "extension", "mime"}.
+    """
+    import xlsxwriter
+
+    hojas = {n: df for n, df in hojas.items() if df is not None}
+    if not hojas:
+        return None
+    salida = archivo_temporal()
+    libro = xlsxwriter.Workbook(salida, {"constant_memory": True, "tmpdir": tempfile.gettempdir(),
+                                         "strings_to_numbers": False, "strings_to_formulas": False,
+                                         "strings_to_urls": False})
+    try:
+        usados = set()
+        for nombre, df in hojas.items():
+            _escribir_hoja(libro, nombre, df, usados, tam)
+    finally:
+        libro.close()
+    salida.seek(0, io.SEEK_END)
+    return {"archivo": _terminar(salida), "extension": ".xlsx", "mime": MIME_XLSX}
+
+
+# ===== Formatos columnares (pyarrow)
+def tabla_arrow(df: pd.DataFrame, columnas=None):
+    """
+    DataFrame -> pyarrow.Table con su esquema: categoricas como diccionario,
+    enteros con nulos como enteros y texto sin pasar por objetos de Python.
+    Las columnas numericas sin nulos se pasan sin copiar.
+    """
+    import pyarrow as pa
+    if columnas:
+        df = df[[c for c in columnas if c in df.columns]]
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _escribir_columnar(tabla, destino, formato: str, filas_por_grupo: int):
+    import pyarrow as pa
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(tabla, destino, row_group_size=filas_por_grupo, compression="zstd")
+    elif formato == "feather":
+        import pyarrow.feather as feather
+        feather.write_feather(tabla, destino, compression="zstd", chunksize=filas_por_grupo)
+    else:
+        with pa.ipc.new_stream(destino, tabla.schema) as escritor:
+            for lote in tabla.to_batches(max_chunksize=filas_por_grupo):
+                escritor.write_batch(lote)
+
+
+def exportar_columnar(secciones: dict, formato: str = "parquet", columnas=None,
+                      filas_por_grupo: int = FILAS_POR_GRUPO_COLUMNAR) -> dict:
+    """
+    Exporta a parquet, feather (Arrow IPC en archivo) o arrow (Arrow IPC en
+    flujo). columnas limita las columnas de cada seccion; una seccion sin
+    ninguna de ellas se omite. Varias secciones salen en un .zip.
+    Devuelve {"archivo", "extension", "mime"} o None si no queda nada.
+    """
+    extension, mime = FORMATOS_COLUMNARES[formato]
+    tablas = {}
+    for nombre, df in secciones.items():
+        if df is None:
+            continue
+        if columnas and not any(c in df.columns for c in columnas):
+            continue
+        tablas[nombre] = tabla_arrow(df, columnas)
+    if not tablas:
+        return None
+    filas_por_grupo = max(1, int(filas_por_grupo or FILAS_POR_GRUPO_COLUMNAR))
+
+    salida = archivo_temporal()
+    if len(tablas) == 1:
+        _escribir_columnar(next(iter(tablas.values())), salida, formato, filas_por_grupo)
+        return {"archivo": _terminar(salida), "extension": extension, "mime": mime}
+
+    # ya vienen comprimidos: el zip solo los agrupa
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_STORED) as zf:
+        for nombre, tabla in tablas.items():
+            with archivo_temporal() as parte:
+                _escribir_columnar(tabla, parte, formato, filas_por_grupo)
+                parte.seek(0)
+                with zf.open(f"{nombre}{extension}", "w", force_zip64=True) as miembro:
+                    shutil.copyfileobj(parte, miembro)
+    return {"archivo": _terminar(salida), "extension": ".zip", "mime": MIME_ZIP}
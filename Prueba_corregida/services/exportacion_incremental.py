@@ -0,0 +1,150 @@
+# services/exportacion_incremental.py
+"""
+Exportacion de solo cambios. Las tablas no tienen fecha de modificacion, asi
+que la marca de la ultima exportacion de cada usuario y reporte guarda la
+huella de cada fila por su clave (el id). La siguiente exportacion compara
+contra esa marca y emite solo las filas nuevas, modificadas o eliminadas, con
+la columna tipo_cambio.
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from config.constants import DIR_MARCAS_EXPORTACION
+
+COLUMNA_CAMBIO = "tipo_cambio"
+NUEVO, MODIFICADO, ELIMINADO = "nuevo", "modificado", "eliminado"
+# columna que identifica cada fila; el personalizado une calificaciones y alumnos
+CLAVES_SECCION = {"personalizado": "id_cal"}
+
+
+def clave_seccion(seccion: str) -> str:
+    return CLAVES_SECCION.get(seccion, "id")
+
+
+def huellas_filas(df: pd.DataFrame, clave: str) -> pd.Series:
+    """Hash de cada fila indexado por su clave; si la clave se repite gana la ultima."""
+    if clave not in df.columns:
+        raise ValueError(f"la tabla no tiene la columna clave '{clave}'")
+    try:
+        h = pd.util.hash_pandas_object(df, index=False)
+    except TypeError:
+        h = pd.util.hash_pandas_object(df.astype(str), index=False)
+    huellas = pd.Series(h.to_numpy(), index=pd.Index(df[clave].to_numpy(), name=clave))
+    return huellas[~huellas.index.duplicated(keep="last")]
+
+
+def _cambio_primero(df):
+    return df[[COLUMNA_CAMBIO, *(c for c in df.columns if c != COLUMNA_CAMBIO)]]
+
+
+def cambios_tabla(df: pd.DataFrame, clave: str, previas: pd.Series = None):
+    """
+    (filas con tipo_cambio, huellas actuales). Sin marca previa todas las
+    filas son nuevas. Las eliminadas solo traen la clave.
+    """
+    actuales = huellas_filas(df, clave)
+    df = df[~df[clave].duplicated(keep="last").to_numpy()]
+    if previas is None:
+        return _cambio_primero(df.assign(**{COLUMNA_CAMBIO: NUEVO})), actuales
+
+    posiciones = previas.index.get_indexer(actuales.index)
+    existia = posiciones >= 0
+    cambio = existia & (previas.to_numpy()[posiciones] != actuales.to_numpy())
+    marcadas = ~existia | cambio
+    filas = df[marcadas].assign(**{COLUMNA_CAMBIO: np.where(existia[marcadas], MODIFICADO, NUEVO)})
+
+    eliminadas = previas.index[~previas.index.isin(actuales.index)]
+    if len(eliminadas):
+        tipos = {c: "boolean" if pd.api.types.is_bool_dtype(df[c].dtype) else "Int64"
+                 for c in df.columns if c != clave and (pd.api.types.is_integer_dtype(df[c].dtype)
+                                                        or pd.api.types.is_bool_dtype(df[c].dtype))}
+        filas = pd.concat([filas, pd.DataFrame({clave: eliminadas, COLUMNA_CAMBIO: ELIMINADO})],
+                          ignore_index=True)
+        # los huecos de las eliminadas no deben volver flotantes u object a las enteras y booleanas
+        filas = filas.astype(tipos)
+    return _cambio_primero(filas), actuales
+
+
+def cambios_desde(datos: dict, marca: dict = None, firma: str = None):
+    """
+    Aplica cambios_tabla a cada seccion del reporte. Devuelve (datos con solo
+    cambios, huellas para la nueva marca, {"nuevo": n, "modificado": n,
+    "eliminado": n}). Si la marca se tomo con los mismos datos no hay cambios.
+    """
+    previas = (marca or {}).get("huellas", {})
+    mismos_datos = marca is not None and firma is not None and marca.get("datos") == firma
+    resultado, huellas = {}, {}
+    conteo = {NUEVO: 0, MODIFICADO: 0, ELIMINADO: 0}
+    for seccion, df in datos.items():
+        if df is None:
+            continue
+        if mismos_datos and seccion in previas:
+            resultado[seccion] = _cambio_primero(df.iloc[:0].assign(**{COLUMNA_CAMBIO: pd.Series(dtype=object)}))
+            huellas[seccion] = previas[seccion]
+            continue
+        filas, huellas[seccion] = cambios_tabla(df, clave_seccion(seccion),
+                                                previas.get(seccion) if marca is not None else None)
+        resultado[seccion] = filas
+        for tipo, n in filas[COLUMNA_CAMBIO].value_counts().items():
+            conteo[tipo] += int(n)
+    return resultado, huellas, conteo
+
+
+class MarcasExportacion:
+    """Marca de la ultima exportacion por usuario, tipo de reporte y filtros, en disco."""
+
+    def __init__(self, directorio: str = DIR_MARCAS_EXPORTACION):
+        self.directorio = directorio
+        os.makedirs(directorio, mode=0o700, exist_ok=True)
+
+    @staticmethod
+    def clave(usuario, tipo_reporte: str, filtros: dict = None) -> str:
+        texto = json.dumps([usuario, tipo_reporte, filtros or {}], sort_keys=True, default=str)
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:16]
+
+    def _rutas(self, clave):
+        base = os.path.join(self.directorio, clave)
+        return base + ".json", base + ".huellas.npz"
+
+    def leer(self, clave: str):
+        """{"huellas": {seccion: Series}, "datos": firma, "fecha": epoch} o None."""
+        ruta, ruta_huellas = self._rutas(clave)
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                meta = json.load(f)
+            # arreglos planos: nunca se deserializan objetos de Python
+            with np.load(ruta_huellas, allow_pickle=False) as arreglos:
+                meta["huellas"] = {s: pd.Series(arreglos[f"{s}__huellas"], index=arreglos[f"{s}__claves"])
+                                   for s in meta["filas"]}
+        except (OSError, ValueError, KeyError):
+            return None
+        return meta
+
+    def guardar(self, clave: str, huellas: dict, firma: str = None):
+        ruta, ruta_huellas = self._rutas(clave)
+        arreglos = {}
+        for s, h in huellas.items():
+            claves = h.index.to_numpy()
+            if not np.issubdtype(claves.dtype, np.number):
+                claves = claves.astype(str)
+            arreglos[f"{s}__claves"] = claves
+            arreglos[f"{s}__huellas"] = h.to_numpy(dtype=np.uint64)
+        # primero las huellas y al final el json: una marca a medias no se lee
+        np.savez(f"{ruta_huellas}.tmp.npz", **arreglos)
+        os.replace(f"{ruta_huellas}.tmp.npz", ruta_huellas)
+        with open(f"{ruta}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"datos": firma, "fecha": time.time(),
+                       "filas": {s: int(len(h)) for s, h in huellas.items()}}, f)
+        os.replace(f"{ruta}.tmp", ruta)
+
+    def borrar(self, clave: str):
+        for ruta in self._rutas(clave):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
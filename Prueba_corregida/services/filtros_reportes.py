@@ -0,0 +1,164 @@
+# services/filtros_reportes.py
+"""
+Filtros de los reportes de exportacion compilados a mascaras booleanas. Cada
+filtro (rango de calificaciones, desercion, categorias de factores) se evalua
+una vez por tabla y por contenido del snapshot sobre los arreglos de la columna; la
+mascara queda en cache y un reporte combina las que le tocan con &. Solo al
+final se toman las filas seleccionadas, en una sola copia.
+
+La union de calificaciones con alumnos del reporte personalizado tambien se
+hace una vez por snapshot y se comparte entre pedidos.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from config.constants import MAX_MASCARAS_FILTROS
+from services.artefactos import firma_datos
+
+
+def _rango(df, valor):
+    calificacion = pd.to_numeric(df["calificacion_final"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    return (calificacion >= valor[0]) & (calificacion <= valor[1])
+
+
+def _desercion(df, valor):
+    if valor not in ("En riesgo", "No en riesgo"):
+        return None
+    return (df["desercion"] == (valor == "En riesgo")).fillna(False).to_numpy(dtype=bool)
+
+
+def _categoria(df, valor):
+    return df["categoria"].isin(list(valor)).to_numpy(dtype=bool)
+
+
+# filtro -> funcion(df, valor) que da la mascara (o None si el valor no filtra nada)
+FILTROS = {
+    "rango_calificaciones": _rango,
+    "filtro_desercion": _desercion,
+    "filtro_categoria": _categoria,
+}
+
+# filtros que aplican a cada tabla de los reportes
+FILTROS_TABLA = {
+    "estudiantes": ("filtro_desercion",),
+    "calificaciones": ("rango_calificaciones",),
+    "factores": ("filtro_categoria",),
+    "personalizado": ("rango_calificaciones", "filtro_desercion"),
+}
+
+
+def _unir_personalizado(tablas):
+    return tablas["calificaciones"].merge(
+        tablas["estudiantes"],
+        left_on='estudiante_id',
+        right_on='id',
+        suffixes=('_cal', '_est'),
+        how='left'
+    )
+
+
+# tablas que no estan en el snapshot y se derivan de el
+DERIVADAS = {"personalizado": _unir_personalizado}
+
+
+def _valor_normalizado(nombre, valor):
+    """Valor del filtro como texto estable; el orden de las categorias no cambia la mascara."""
+    if nombre == "filtro_categoria":
+        valor = sorted(map(str, valor))
+    elif isinstance(valor, tuple):
+        valor = list(valor)
+    return json.dumps(valor, default=str)
+
+
+class MotorFiltros:
+    """
+    Mascaras por (alcance, datos, tabla, filtro, valor) y tablas derivadas por
+    (alcance, datos, tabla), en LRU; datos es la firma de Snapshot.huella. No se
+    usa Snapshot.version: es un contador de cada AnalyticsService y la pagina de
+    exportacion crea uno nuevo en cada ejecucion, asi que se repetiria con otros datos.
+    """
+
+    def __init__(self, max_mascaras: int = MAX_MASCARAS_FILTROS, max_derivadas: int = 4):
+        self.max_mascaras = max_mascaras
+        self.max_derivadas = max_derivadas
+        self._lock = threading.Lock()
+        self._mascaras = OrderedDict()
+        self._derivadas = OrderedDict()
+
+    @staticmethod
+    def _recordar(cache, clave, valor, maximo):
+        cache[clave] = valor
+        cache.move_to_end(clave)
+        while len(cache) > maximo:
+            cache.popitem(last=False)
+
+    def tabla(self, snapshot, nombre) -> pd.DataFrame:
+        """Tabla del snapshot o derivada de el (la union se hace una vez por contenido)."""
+        if nombre not in DERIVADAS:
+            return snapshot[nombre]
+        clave = (snapshot.alcance, firma_datos(snapshot.huella), nombre)
+        with self._lock:
+            df = self._derivadas.get(clave)
+            if df is not None:
+                self._derivadas.move_to_end(clave)
+                return df
+        df = DERIVADAS[nombre](snapshot.tablas)
+        with self._lock:
+            self._recordar(self._derivadas, clave, df, self.max_derivadas)
+        return df
+
+    def mascara(self, snapshot, nombre, filtros: dict):
+        """Mascara de las filas de la tabla que pasan los filtros, o None si ninguno aplica."""
+        df = self.tabla(snapshot, nombre)
+        resultado = None
+        datos = firma_datos(snapshot.huella)
+        for filtro in FILTROS_TABLA.get(nombre, ()):
+            valor = (filtros or {}).get(filtro)
+            if not valor:
+                continue
+            clave = (snapshot.alcance, datos, nombre, filtro, _valor_normalizado(filtro, valor))
+            with self._lock:
+                mascara = self._mascaras.get(clave)
+                if mascara is not None:
+                    self._mascaras.move_to_end(clave)
+            if mascara is None:
+                mascara = np.zeros(0, dtype=bool) if df.empty else FILTROS[filtro](df, valor)
+                if mascara is None:
+                    continue
+                # se comparte entre pedidos: nadie debe poder escribirla
+                mascara.flags.writeable = False
+                with self._lock:
+                    self._recordar(self._mascaras, clave, mascara, self.max_mascaras)
+            resultado = mascara if resultado is None else resultado & mascara
+        return resultado
+
+    def seleccionar(self, snapshot, nombre, filtros: dict) -> pd.DataFrame:
+        """Filas de la tabla que pasan los filtros; es la unica copia que se hace."""
+        df = self.tabla(snapshot, nombre)
+        mascara = self.mascara(snapshot, nombre, filtros)
+        if mascara is None or mascara.all():
+            # sin filtro efectivo: vista de solo lectura efectiva, sin copiar filas
+            return df.copy(deep=False)
+        return df[mascara]
+
+    def limpiar(self):
+        with self._lock:
+            self._mascaras.clear()
+            self._derivadas.clear()
+
+
+_MOTOR = None
+_LOCK = threading.Lock()
+
+
+def motor_filtros() -> MotorFiltros:
+    """Motor unico del proceso: las mascaras se comparten entre sesiones con los mismos datos."""
+    global _MOTOR
+    with _LOCK:
+        if _MOTOR is None:
+            _MOTOR = MotorFiltros()
+        return _MOTOR
@@ -0,0 +1,292 @@
+# services/graficas.py
+"""
+Graficas compartidas por las paginas y los PDF. Cada grafica se define en dos
+pasos: agregar(tablas) resume el snapshot en unos cuantos numeros (un groupby,
+una vez por version de los datos) y dibujar(agregados) arma la figura con la
+API orientada a objetos de matplotlib y el canvas Agg, sin pyplot, asi que
+puede correr en cualquier hilo o proceso.
+
+Los PNG quedan en una cache del proceso con clave (grafica, agregados, dpi):
+si la pagina de estadisticas ya dibujo una grafica, el PDF la reutiliza y al
+reves. Las que faltan se dibujan a la vez en un pool de procesos.
+"""
+import hashlib
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from config.constants import CARRERAS, DPI_GRAFICAS, MAX_BYTES_CACHE_FIGURAS, MAX_PROCESOS_REPORTES
+
+CALIFICACION_APROBATORIA = 70
+
+
+# ===== Agregados (en el proceso principal, una vez por snapshot)
+def _con_carrera(tablas):
+    cal, est = tablas.get("calificaciones"), tablas.get("estudiantes")
+    if cal is None or cal.empty or est is None or est.empty or "carrera_id" not in est.columns:
+        return None
+    df = cal[["estudiante_id", "calificacion_final"] + (["reprobado"] if "reprobado" in cal.columns else [])]
+    return df.merge(est[["id", "carrera_id"]], left_on="estudiante_id", right_on="id", how="left")
+
+
+def _nombre_carrera(carrera_id):
+    try:
+        return CARRERAS.get(int(carrera_id), f"Carrera {carrera_id}")
+    except (TypeError, ValueError):
+        return f"Carrera {carrera_id}"
+
+
+def _agregar_distribucion(tablas):
+    cal = tablas.get("calificaciones")
+    if cal is None or cal.empty or "calificacion_final" not in cal.columns:
+        return None
+    valores = pd.to_numeric(cal["calificacion_final"], errors="coerce").dropna().to_numpy()
+    if not valores.size:
+        return None
+    conteos, bordes = np.histogram(valores, bins=15)
+    return {"conteos": conteos.tolist(), "bordes": bordes.round(6).tolist()}
+
+
+def _agregar_promedio_carrera(tablas):
+    df = _con_carrera(tablas)
+    if df is None:
+        return None
+    promedios = df.groupby("carrera_id")["calificacion_final"].mean().dropna().sort_values(ascending=False)
+    if promedios.empty:
+        return None
+    return {"carreras": [_nombre_carrera(c) for c in promedios.index], "valores": promedios.round(4).tolist()}
+
+
+def _agregar_reprobacion_carrera(tablas):
+    df = _con_carrera(tablas)
+    if df is None:
+        return None
+    if "reprobado" in df.columns:
+        reprobado = df["reprobado"].astype(float)
+    else:
+        reprobado = (df["calificacion_final"] < CALIFICACION_APROBATORIA).astype(float)
+    tasas = (reprobado.groupby(df["carrera_id"]).mean() * 100).dropna().sort_values()
+    if tasas.empty:
+        return None
+    return {"carreras": [_nombre_carrera(c) for c in tasas.index], "valores": tasas.round(4).tolist()}
+
+
+def _agregar_estudiantes_carrera(tablas):
+    est = tablas.get("estudiantes")
+    if est is None or est.empty or "carrera_id" not in est.columns:
+        return None
+    conteo = est["carrera_id"].value_counts()
+    return {"carreras": [_nombre_carrera(c) for c in conteo.index], "valores": conteo.astype(int).tolist()}
+
+
+# ===== Dibujo (en cualquier proceso: solo Figure y el canvas Agg)
+def _figura(ancho=8, alto=4):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(ancho, alto))
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def _dibujar_distribucion(a):
+    fig, ax = _figura()
+    bordes = np.asarray(a["bordes"])
+    ax.bar(bordes[:-1], a["conteos"], width=np.diff(bordes), align="edge",
+           color='skyblue', edgecolor='black', alpha=0.7)
+    ax.axvline(x=CALIFICACION_APROBATORIA, color='red', linestyle='--', linewidth=2,
+               label=f'Limite Aprobacion ({CALIFICACION_APROBATORIA})')
+    ax.set_xlabel('Calificacion Final')
+    ax.set_ylabel('Frecuencia')
+    ax.set_title('Distribucion de Calificaciones')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    return fig
+
+
+def _dibujar_promedio_carrera(a):
+    fig, ax = _figura()
+    bars = ax.barh(a["carreras"], a["valores"], color='mediumseagreen', edgecolor='black')
+    for bar, valor in zip(bars, a["valores"]):
+        ax.text(bar.get_width() + 1, bar.get_y() + bar.get_height() / 2,
+                f"{valor:.1f}", va='center', fontsize=8, color='black')
+    ax.set_xlabel('Promedio General de Calificacion')
+    ax.set_ylabel('Carreras')
+    ax.set_title('Promedio General por Carrera')
+    ax.set_xlim(0, 100)
+    return fig
+
+
+def _dibujar_barras_carrera(titulo, etiqueta, color, formato):
+    def dibujar(a):
+        fig, ax = _figura()
+        bars = ax.bar(a["carreras"], a["valores"], color=color, edgecolor="black")
+        ax.set_xlabel("Carreras")
+        ax.set_ylabel(etiqueta)
+        ax.set_title(titulo)
+        for bar, valor in zip(bars, a["valores"]):
+            ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height(), formato.format(valor),
+                    ha="center", va="bottom", fontsize=8)
+        ax.tick_params(axis="x", labelrotation=45)
+        for etiqueta_x in ax.get_xticklabels():
+            etiqueta_x.set_horizontalalignment("right")
+        return fig
+    return dibujar
+
+
+# nombre -> (titulo, agregar, dibujar)
+GRAFICAS = {
+    "distribucion": ("Distribucion de Calificaciones", _agregar_distribucion, _dibujar_distribucion),
+    "promedio_carrera": ("Promedio por Carrera", _agregar_promedio_carrera, _dibujar_promedio_carrera),
+    "reprobacion_carrera": ("Tasa de Reprobacion por Carrera", _agregar_reprobacion_carrera,
+                            _dibujar_barras_carrera("Tasa de Reprobación por Carrera", "Tasa de Reprobación (%)",
+                                                    "lightcoral", "{:.1f}%")),
+    "estudiantes_carrera": ("Estudiantes por Carrera", _agregar_estudiantes_carrera,
+                            _dibujar_barras_carrera("Distribución de Estudiantes por Carrera",
+                                                    "Número de Estudiantes", "skyblue", "{:d}")),
+}
+
+
+def dibujar_png(nombre: str, agregados: dict, dpi: int = DPI_GRAFICAS) -> bytes:
+    """PNG de la grafica; es lo que corre en los procesos del pool."""
+    fig = GRAFICAS[nombre][2](agregados)
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+    return buf.getvalue()
+
+
+# ===== Cache de figuras del proceso
+def _firma(*partes) -> str:
+    return hashlib.sha256(repr(partes).encode("utf-8")).hexdigest()[:24]
+
+
+class CacheFiguras:
+    """
+    LRU de PNG por (grafica, agregados, dpi), acotado en bytes, y de los
+    agregados de cada snapshot por (alcance, huella).
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES_CACHE_FIGURAS, max_snapshots: int = 32):
+        self.max_bytes = max_bytes
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._png = OrderedDict()
+        self._bytes = 0
+        self._agregados = OrderedDict()
+
+    def agregados(self, snapshot, nombre):
+        """Agregados de la grafica para el snapshot; se calculan una vez por version de los datos."""
+        clave = (snapshot.alcance, _firma(snapshot.huella))
+        with self._lock:
+            por_grafica = self._agregados.get(clave)
+            if por_grafica is not None:
+                self._agregados.move_to_end(clave)
+                if nombre in por_grafica:
+                    return por_grafica[nombre]
+        valor = GRAFICAS[nombre][1](snapshot.tablas)
+        with self._lock:
+            self._agregados.setdefault(clave, {})[nombre] = valor
+            while len(self._agregados) > self.max_snapshots:
+                self._agregados.popitem(last=False)
+        return valor
+
+    def obtener(self, clave):
+        with self._lock:
+            png = self._png.get(clave)
+            if png is not None:
+                self._png.move_to_end(clave)
+            return png
+
+    def guardar(self, clave, png: bytes):
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            previo = self._png.pop(clave, None)
+            if previo is not None:
+                self._bytes -= len(previo)
+            self._png[clave] = png
+            self._bytes += len(png)
+            while self._bytes > self.max_bytes:
+                _, viejo = self._png.popitem(last=False)
+                self._bytes -= len(viejo)
+
+    def bytes_en_uso(self) -> int:
+        with self._lock:
+            return self._bytes
+
+    def limpiar(self):
+        with self._lock:
+            self._png.clear()
+            self._agregados.clear()
+            self._bytes = 0
+
+
+_CACHE = None
+_POOL = None
+_LOCK = threading.Lock()
+
+
+def cache_figuras() -> CacheFiguras:
+    """Cache unica del proceso, compartida por paginas y reportes."""
+    global _CACHE
+    with _LOCK:
+        if _CACHE is None:
+            _CACHE = CacheFiguras()
+        return _CACHE
+
+
+def pool_graficas() -> ProcessPoolExecutor:
+    """Pool de procesos que dibuja; vive todo el proceso para no pagar el arranque en cada reporte."""
+    global _POOL
+    with _LOCK:
+        if _POOL is None:
+            # spawn: un fork del servidor de Streamlit copiaria sus hilos y locks
+            _POOL = ProcessPoolExecutor(MAX_PROCESOS_REPORTES, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+
+def _descartar_pool(pool):
+    """Si un proceso del pool murio, el siguiente pedido arranca uno nuevo."""
+    global _POOL
+    with _LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def png_graficas(snapshot, nombres, dpi: int = DPI_GRAFICAS, pool=None) -> dict:
+    """
+    {nombre: png} de las graficas pedidas (None si no hay datos para ella).
+    Las que no estan en cache se dibujan en paralelo en el pool; si el pool no
+    esta disponible se dibujan aqui mismo.
+    """
+    cache = cache_figuras()
+    resultado, faltan = {}, {}
+    for nombre in nombres:
+        agregados = cache.agregados(snapshot, nombre)
+        if agregados is None:
+            resultado[nombre] = None
+            continue
+        clave = (nombre, _firma(agregados), dpi)
+        resultado[nombre] = cache.obtener(clave)
+        if resultado[nombre] is None:
+            faltan[nombre] = (clave, agregados)
+
+    if faltan:
+        pool = pool or pool_graficas()
+        try:
+            futuros = {n: pool.submit(dibujar_png, n, a, dpi) for n, (_, a) in faltan.items()}
+            pngs = {n: f.result() for n, f in futuros.items()}
+        except (BrokenProcessPool, RuntimeError, OSError):
+            _descartar_pool(pool)
+            pngs = {n: dibujar_png(n, a, dpi) for n, (_, a) in faltan.items()}
+        for nombre, png in pngs.items():
+            cache.guardar(faltan[nombre][0], png)
+            resultado[nombre] = png
+    return {n: resultado[n] for n in nombres}
@@ -0,0 +1,786 @@
+# services/importacion.py
+"""
+Importacion de las hojas Estudiantes, Calificaciones y Factores: lectura por
+bloques, validacion y escritura en lote. Todo trabaja por columnas: ninguna
+funcion recorre filas con apply o iterrows.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from services.matriculas import asignador_matriculas, formatear
+from config.constants import (CATEGORIAS_FACTORES, DIR_TRABAJOS_IMPORTACION, MAX_ESCRITURAS_CONCURRENTES,
+                              MAX_FILAS_REPORTE, MAX_IMPORTACIONES_SIMULTANEAS, TAM_BLOQUE_IMPORTACION)
+
+COLS_EST = ["nombres", "apellido_paterno", "apellido_materno",
+            "carrera_id", "ingreso_semestre", "horas_estudio", "desercion"]
+COLS_CAL = ["estudiante_id", "materia_id", "periodo", "grupo",
+            "u1", "u2", "u3", "asistencia", "calificacion_final"]
+# estudiante_id puede faltar si viene la matricula
+COLS_CAL_MIN = ["materia_id", "periodo", "grupo", "u1", "u2", "u3", "asistencia", "calificacion_final"]
+COLS_FAC = ["categoria", "nombre", "inscripcion_id", "gravedad"]
+CLAVE_CAL = ["estudiante_id", "materia_id", "periodo", "grupo"]
+HOJAS = ("Estudiantes", "Calificaciones", "Factores")
+
+_VERDADEROS = {"1", "1.0", "si", "sí", "true", "t", "y", "yes"}
+
+
+# ===== Conversiones por columna
+def col_int(s: pd.Series, default=None) -> pd.Series:
+    """Version columnar de _to_int: lo que no es numero queda en default (o <NA>)."""
+    n = np.trunc(pd.to_numeric(s, errors="coerce"))
+    if default is not None:
+        n = n.fillna(default)
+    return n.astype("Int64")
+
+
+def col_float(s: pd.Series, default=None) -> pd.Series:
+    n = pd.to_numeric(s, errors="coerce").astype(float)
+    return n.fillna(default) if default is not None else n
+
+
+def col_bool(s: pd.Series) -> pd.Series:
+    """Si/no escrito a mano: True solo para 1/si/true/t/y/yes."""
+    if pd.api.types.is_bool_dtype(s):
+        return s.fillna(False).astype(bool)
+    txt = s.astype(object).where(s.notna(), "").astype(str).str.strip().str.lower()
+    return txt.isin(_VERDADEROS)
+
+
+def col_txt(s: pd.Series) -> pd.Series:
+    return s.fillna("").astype(str).str.strip()
+
+
+def col_norm(s: pd.Series) -> pd.Series:
+    """Version columnar de _norm_txt: sin acentos, espacios colapsados y minusculas."""
+    return (col_txt(s)
+            .str.normalize("NFKD")
+            .str.replace("[\u0300-\u036f]", "", regex=True)
+            .str.replace(r"\s+", " ", regex=True)
+            .str.lower())
+
+
+def claves_estudiante(df: pd.DataFrame) -> np.ndarray:
+    """
+    Hash de 64 bits de la clave natural del alumno (nombre completo normalizado,
+    carrera e ingreso) por fila. Sirve para detectar duplicados con isin.
+    """
+    if df is None or df.empty:
+        return np.empty(0, dtype=np.uint64)
+    vacia = pd.Series("", index=df.index)
+    claves = pd.DataFrame({
+        "nombres": col_norm(df.get("nombres", vacia)),
+        "apellido_paterno": col_norm(df.get("apellido_paterno", vacia)),
+        "apellido_materno": col_norm(df.get("apellido_materno", vacia)),
+        "carrera_id": col_int(df.get("carrera_id", vacia), 0).astype("int64"),
+        "ingreso_semestre": col_txt(df.get("ingreso_semestre", vacia)),
+    })
+    return pd.util.hash_pandas_object(claves, index=False).to_numpy()
+
+
+def _ensure_columns(df: pd.DataFrame, required: list) -> list:
+    if df is None or df.empty:
+        return required[:]
+    return [c for c in required if c not in df.columns]
+
+
+def _resultado(validos=None, errores=None, dup_xlsx=0, dup_bd=0, faltan=None):
+    return {
+        "validos": validos if validos is not None else pd.DataFrame(),
+        "errores": errores or [],
+        "dup_xlsx": int(dup_xlsx),
+        "dup_bd": int(dup_bd),
+        "faltan": faltan or [],
+    }
+
+
+def _hash_filas(df: pd.DataFrame, columnas) -> np.ndarray:
+    if df.empty:
+        return np.empty(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(df[list(columnas)], index=False).to_numpy()
+
+
+def _repetidas(claves: np.ndarray, vistas=None) -> np.ndarray:
+    """
+    Marca las claves repetidas dentro del bloque y, si se pasa vistas (set de
+    claves de bloques anteriores del mismo archivo), tambien las ya vistas.
+    Las claves que quedan se agregan a vistas.
+    """
+    repetida = pd.Series(claves).duplicated().to_numpy()
+    if vistas is not None:
+        if vistas:
+            repetida = repetida | np.fromiter((c in vistas for c in claves.tolist()), dtype=bool, count=len(claves))
+        vistas.update(claves[~repetida].tolist())
+    return repetida
+
+
+def _separar_invalidos(tmp, mask, motivo, errores):
+    if mask.any():
+        errores += tmp[mask].assign(_motivo=motivo).to_dict("records")
+        return tmp[~mask]
+    return tmp
+
+
+# ===== Validadores por hoja
+def validar_estudiantes(df: pd.DataFrame, claves_existentes=None, vistas=None) -> dict:
+    """
+    Normaliza la hoja Estudiantes y separa invalidos, duplicados dentro del
+    archivo y alumnos que ya existen (claves_existentes: salida de claves_estudiante).
+    vistas es el estado de duplicados entre bloques del mismo archivo.
+    """
+    if df is None or df.empty:
+        return _resultado()
+    faltan = _ensure_columns(df, COLS_EST)
+    if faltan:
+        return _resultado(faltan=faltan)
+
+    tmp = df.copy()
+    for c in ("nombres", "apellido_paterno", "apellido_materno"):
+        tmp[c] = col_txt(tmp[c])
+    tmp["carrera_id"] = col_int(tmp["carrera_id"])
+    tmp["ingreso_semestre"] = tmp["ingreso_semestre"].astype(str).str.strip()
+    tmp["horas_estudio"] = col_int(tmp["horas_estudio"], 0)
+    tmp["desercion"] = col_bool(tmp["desercion"])
+
+    errores = []
+    mask_invalid = (tmp["nombres"] == "") | (tmp["apellido_paterno"] == "") | tmp["carrera_id"].isna()
+    tmp = _separar_invalidos(tmp, mask_invalid.to_numpy(), "Campos obligatorios vacíos", errores)
+
+    claves = claves_estudiante(tmp)
+    repetida = _repetidas(claves, vistas)
+    dup_xlsx = int(repetida.sum())
+    tmp, claves = tmp[~repetida], claves[~repetida]
+
+    dup_bd = 0
+    if claves_existentes is not None and len(claves_existentes):
+        ya = np.isin(claves, claves_existentes)
+        dup_bd = int(ya.sum())
+        tmp = tmp[~ya]
+
+    return _resultado(tmp, errores, dup_xlsx, dup_bd)
+
+
+def validar_calificaciones(df: pd.DataFrame, ids_por_matricula=None, vistas=None) -> dict:
+    """
+    Normaliza la hoja Calificaciones. Si trae 'matricula', completa el
+    estudiante_id faltante con ids_por_matricula (matricula en mayusculas -> id).
+    """
+    if df is None or df.empty:
+        return _resultado()
+    faltan = _ensure_columns(df, COLS_CAL_MIN)
+    if faltan:
+        return _resultado(faltan=faltan)
+
+    tmp = df.copy()
+    tmp["materia_id"] = col_int(tmp["materia_id"])
+    tmp["periodo"] = col_txt(tmp["periodo"])
+    tmp["grupo"] = col_txt(tmp["grupo"]).str.upper()
+    for c in ("u1", "u2", "u3", "asistencia", "calificacion_final"):
+        tmp[c] = col_float(tmp[c], 0.0)
+
+    if "estudiante_id" not in tmp.columns:
+        tmp["estudiante_id"] = pd.Series(pd.NA, index=tmp.index, dtype="Int64")
+    else:
+        tmp["estudiante_id"] = col_int(tmp["estudiante_id"])
+
+    if "matricula" in tmp.columns and ids_por_matricula:
+        mask_na = tmp["estudiante_id"].isna() & tmp["matricula"].notna()
+        if mask_na.any():
+            resueltos = tmp.loc[mask_na, "matricula"].astype(str).str.strip().str.upper().map(ids_por_matricula)
+            tmp.loc[mask_na, "estudiante_id"] = col_int(resueltos)
+
+    errores = []
+    mask_invalid = (tmp["materia_id"].isna() | (tmp["periodo"] == "")
+                    | (tmp["grupo"] == "") | tmp["estudiante_id"].isna())
+    tmp = _separar_invalidos(tmp, mask_invalid.to_numpy(), "Faltan claves o no se resolvió el estudiante", errores)
+
+    repetida = _repetidas(_hash_filas(tmp, CLAVE_CAL), vistas)
+    return _resultado(tmp[~repetida], errores, repetida.sum())
+
+
+def validar_factores(df: pd.DataFrame, vistas=None) -> dict:
+    """Normaliza la hoja Factores: categoria del catalogo y gravedad 1..5."""
+    if df is None or df.empty:
+        return _resultado()
+    faltan = _ensure_columns(df, COLS_FAC)
+    if faltan:
+        return _resultado(faltan=faltan)
+
+    tmp = df.copy()
+    tmp["categoria"] = tmp["categoria"].astype(str).str.strip()
+    tmp["nombre"] = tmp["nombre"].astype(str).str.strip()
+    tmp["inscripcion_id"] = col_int(tmp["inscripcion_id"])
+    tmp["gravedad"] = col_int(tmp["gravedad"])
+
+    errores = []
+    g = tmp["gravedad"]
+    mask_invalid = (~tmp["categoria"].isin(CATEGORIAS_FACTORES) | g.isna() | (g < 1).fillna(False) | (g > 5).fillna(False))
+    tmp = _separar_invalidos(tmp, mask_invalid.to_numpy(dtype=bool), "Categoría inválida o gravedad fuera de 1..5", errores)
+
+    repetida = _repetidas(_hash_filas(tmp, ["categoria", "nombre", "inscripcion_id"]), vistas)
+    return _resultado(tmp[~repetida], errores, repetida.sum())
+
+
+# ===== Lectura por bloques
+def hoja_de_columnas(columnas):
+    """Hoja a la que corresponde una tabla segun sus encabezados, o None."""
+    cols = {str(c).strip() for c in columnas}
+    for hoja, requeridas in (("Calificaciones", COLS_CAL_MIN), ("Factores", COLS_FAC), ("Estudiantes", COLS_EST)):
+        if set(requeridas) <= cols:
+            return hoja
+    return None
+
+
+def leer_por_bloques(archivo, nombre: str = "", tam: int = TAM_BLOQUE_IMPORTACION):
+    """
+    Genera (hoja, DataFrame) de a lo sumo tam filas. Un .xlsx se abre una sola vez
+    en modo solo lectura y se recorre fila a fila, sin cargar la hoja completa.
+    Un CSV es una sola hoja: se toma del nombre del archivo o de sus encabezados.
+    """
+    nombre = (nombre or getattr(archivo, "name", "") or "").lower()
+    if hasattr(archivo, "seek"):
+        archivo.seek(0)
+    if nombre.endswith(".csv"):
+        yield from _bloques_csv(archivo, nombre, tam)
+    elif nombre.endswith(".xls"):
+        yield from _bloques_xls(archivo, tam)
+    else:
+        yield from _bloques_xlsx(archivo, tam)
+
+
+def _encabezados(fila):
+    return [str(c).strip() if c is not None else f"Unnamed: {i}" for i, c in enumerate(fila)]
+
+
+def _bloques_xlsx(archivo, tam):
+    from openpyxl import load_workbook
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        for hoja in HOJAS:
+            if hoja not in libro.sheetnames:
+                continue
+            filas = libro[hoja].iter_rows(values_only=True)
+            encabezado = next(filas, None)
+            if encabezado is None:
+                continue
+            columnas = _encabezados(encabezado)
+            buf = []
+            for fila in filas:
+                if all(v is None for v in fila):
+                    continue
+                buf.append(fila)
+                if len(buf) >= tam:
+                    yield hoja, pd.DataFrame.from_records(buf, columns=columnas)
+                    buf = []
+            if buf:
+                yield hoja, pd.DataFrame.from_records(buf, columns=columnas)
+    finally:
+        libro.close()
+
+
+def _bloques_xls(archivo, tam):
+    # el formato viejo no se puede recorrer en streaming; se lee una sola vez
+    libro = pd.read_excel(archivo, sheet_name=None)
+    for hoja in HOJAS:
+        df = libro.pop(hoja, None)
+        if df is None or df.empty:
+            continue
+        df = df.rename(columns=lambda c: str(c).strip())
+        for i in range(0, len(df), tam):
+            yield hoja, df.iloc[i:i + tam]
+
+
+def _bloques_csv(archivo, nombre, tam):
+    hoja = next((h for h in HOJAS if h.lower() in nombre), None)
+    for trozo in pd.read_csv(archivo, chunksize=tam, encoding="utf-8-sig"):
+        trozo = trozo.rename(columns=lambda c: str(c).strip())
+        if hoja is None:
+            hoja = hoja_de_columnas(trozo.columns)
+            if hoja is None:
+                raise ValueError("No se reconocen las columnas del CSV como Estudiantes, Calificaciones ni Factores")
+        yield hoja, trozo
+
+
+# ===== Validacion y escritura por bloques
+class ImportacionEnBloques:
+    """
+    Estado de una importacion que se procesa bloque a bloque: claves ya vistas en
+    bloques anteriores, totales del reporte y las primeras filas invalidas.
+    """
+
+    def __init__(self, claves_existentes=None, ids_por_matricula=None, asignador=None):
+        self.claves_existentes = claves_existentes
+        self.ids_por_matricula = ids_por_matricula or {}
+        self.asignador = asignador or asignador_matriculas()
+        self.ultima_reserva = None
+        self._vistas = {h: set() for h in HOJAS}
+        self.resumen = {h: {"leidas": 0, "validas": 0, "invalidas": 0, "dup_xlsx": 0, "dup_bd": 0,
+                            "insertar": 0, "actualizar": 0, "sin_cambios": 0,
+                            "faltan": [], "errores": []} for h in HOJAS}
+
+    @classmethod
+    def desde_analytics(cls, analytics):
+        """Estado inicial con los indices del snapshot vigente."""
+        return cls(analytics.claves_estudiantes(), analytics.ids_por_matricula())
+
+    def _resolver_matriculas(self, db, df: pd.DataFrame, lanzar: bool = False):
+        """Busca en el servidor las matriculas del bloque que el snapshot no conoce."""
+        if db is None or "matricula" not in df.columns:
+            return
+        m = df["matricula"].dropna().astype(str).str.strip().str.upper()
+        faltan = [x for x in m.unique().tolist() if x and x not in self.ids_por_matricula]
+        if not faltan:
+            return
+        ya = db.obtener_estudiantes_por_matricula(faltan, lanzar=lanzar)
+        if ya is not None and not ya.empty:
+            self.ids_por_matricula.update(zip(ya["matricula"].astype(str).str.strip().str.upper(), ya["id"]))
+
+    def validar(self, hoja: str, df: pd.DataFrame, db=None, lanzar: bool = False) -> dict:
+        """Valida un bloque; con db, las matriculas desconocidas se resuelven en el servidor."""
+        if hoja == "Calificaciones":
+            self._resolver_matriculas(db, df, lanzar)
+        if hoja == "Estudiantes":
+            r = validar_estudiantes(df, self.claves_existentes, self._vistas[hoja])
+        elif hoja == "Calificaciones":
+            r = validar_calificaciones(df, self.ids_por_matricula, self._vistas[hoja])
+        else:
+            r = validar_factores(df, self._vistas[hoja])
+
+        t = self.resumen[hoja]
+        t["leidas"] += len(df)
+        t["validas"] += len(r["validos"])
+        t["invalidas"] += len(r["errores"])
+        t["dup_xlsx"] += r["dup_xlsx"]
+        t["dup_bd"] += r["dup_bd"]
+        t["faltan"] = t["faltan"] or r["faltan"]
+        espacio = MAX_FILAS_REPORTE - len(t["errores"])
+        if espacio > 0:
+            t["errores"] += r["errores"][:espacio]
+        return r
+
+    def diferencias(self, db, hoja: str, filas: list, lanzar: bool = False) -> dict:
+        """diferencias() del bloque, sumadas al resumen de la hoja."""
+        d = diferencias(db, hoja, filas, lanzar)
+        t = self.resumen[hoja]
+        t["insertar"] += len(d["insertar"])
+        t["actualizar"] += len(d["actualizar"])
+        t["sin_cambios"] += d["sin_cambios"]
+        return d
+
+    def asignar_matriculas(self, df: pd.DataFrame, prefijo="A", inicio: int = None) -> pd.Series:
+        """
+        Completa las matriculas vacias con un bloque contiguo del asignador del
+        proceso. Con inicio se reutiliza un bloque ya reservado (al reanudar);
+        el bloque usado queda en ultima_reserva.
+        """
+        actual = col_txt(df["matricula"]) if "matricula" in df.columns else pd.Series("", index=df.index)
+        vacia = (actual == "").to_numpy()
+        self.asignador.observar_matriculas(actual[~vacia])
+        self.ultima_reserva = None
+        k = int(vacia.sum())
+        if not k:
+            return actual
+        if inicio is None:
+            inicio = self.asignador.reservar(k, prefijo)
+        else:
+            self.asignador.observar({prefijo: inicio + k - 1})
+        self.ultima_reserva = inicio
+        valores = actual.to_numpy(dtype=object, copy=True)
+        valores[vacia] = [formatear(prefijo, n) for n in range(inicio, inicio + k)]
+        return pd.Series(valores, index=df.index)
+
+
+def _registros(df: pd.DataFrame, columnas) -> list:
+    """Filas como dicts con tipos de Python (None en lugar de NaN/<NA>)."""
+    valores = [df[c].astype(object).where(df[c].notna(), None).tolist() for c in columnas]
+    return [dict(zip(columnas, fila)) for fila in zip(*valores)]
+
+
+def filas_para_guardar(hoja: str, validos: pd.DataFrame, estado: ImportacionEnBloques = None,
+                       inicio_matriculas: int = None) -> list:
+    """Payload de escritura en lote para las filas validas de un bloque."""
+    if estado is not None:
+        estado.ultima_reserva = None
+    if validos is None or validos.empty:
+        return []
+    if hoja == "Estudiantes":
+        df = validos.assign(
+            matricula=(estado or ImportacionEnBloques()).asignar_matriculas(validos, inicio=inicio_matriculas),
+            ingreso_semestre=validos["ingreso_semestre"].astype(str),
+        )
+        return _registros(df, ["matricula"] + COLS_EST)
+    if hoja == "Calificaciones":
+        return _registros(validos, COLS_CAL)
+    return _registros(validos, COLS_FAC)
+
+
+def guardar_bloque(db, hoja: str, filas: list, lanzar: bool = False):
+    """Escribe las filas con una sola peticion al backend. None si fallo (con lanzar, el error)."""
+    if hoja == "Estudiantes":
+        return db.insertar_estudiantes_lote(filas, lanzar=lanzar)
+    if hoja == "Calificaciones":
+        return db.upsert_calificaciones_lote(filas, lanzar=lanzar)
+    return db.insertar_factores_lote(filas, lanzar=lanzar)
+
+
+# ===== Simulacion contra el servidor
+_COMPARAR = {
+    "Estudiantes": (["matricula"], COLS_EST),
+    "Calificaciones": (CLAVE_CAL, ["u1", "u2", "u3", "asistencia", "calificacion_final"]),
+    "Factores": (["categoria", "nombre", "inscripcion_id"], ["gravedad"]),
+}
+
+
+def _en_servidor(db, hoja: str, nuevas: pd.DataFrame, lanzar: bool = False) -> pd.DataFrame:
+    if hoja == "Estudiantes":
+        return db.obtener_estudiantes_por_matricula(nuevas["matricula"], lanzar=lanzar)
+    if hoja == "Calificaciones":
+        return db.obtener_calificaciones_de(nuevas["estudiante_id"], nuevas["materia_id"], lanzar=lanzar)
+    return db.obtener_factores_de(nuevas["inscripcion_id"], lanzar=lanzar)
+
+
+def _normalizar_clave(df: pd.DataFrame, clave) -> pd.DataFrame:
+    df = df.copy()
+    for c in clave:
+        if c in ("estudiante_id", "materia_id", "inscripcion_id"):
+            df[c] = col_int(df[c])
+        else:
+            df[c] = col_txt(df[c])
+    return df
+
+
+def _iguales(a: pd.Series, b: pd.Series) -> np.ndarray:
+    """Igualdad por fila tolerante a tipos: 80 == 80.0, True == 1, NaN == None."""
+    an, bn = pd.to_numeric(a, errors="coerce"), pd.to_numeric(b, errors="coerce")
+    if (an.notna() == a.notna()).all() and (bn.notna() == b.notna()).all():
+        return np.isclose(an.astype(float), bn.astype(float), equal_nan=True)
+    return ((col_txt(a) == col_txt(b)) | (a.isna() & b.isna())).to_numpy()
+
+
+def diferencias(db, hoja: str, filas: list, lanzar: bool = False) -> dict:
+    """
+    Compara el payload de un bloque con lo que ya hay en el servidor (unas pocas
+    consultas in_() por lotes) y lo separa en filas a insertar, filas a
+    actualizar y cuantas no cambian; esas ultimas no hace falta enviarlas.
+    """
+    if not filas:
+        return {"insertar": [], "actualizar": [], "sin_cambios": 0}
+    clave, comparar = _COMPARAR[hoja]
+    nuevas = _normalizar_clave(pd.DataFrame(filas), clave)
+    actuales = _en_servidor(db, hoja, nuevas, lanzar)
+    if actuales is None or actuales.empty:
+        return {"insertar": list(filas), "actualizar": [], "sin_cambios": 0}
+
+    actuales = _normalizar_clave(actuales, clave).drop_duplicates(clave)
+    cols = [c for c in comparar if c in actuales.columns and c not in clave]
+    unido = nuevas.merge(actuales[clave + cols + ["id"]].rename(columns={c: f"{c}__bd" for c in cols + ["id"]}),
+                         on=clave, how="left")
+    existe = unido["id__bd"].notna().to_numpy()
+    igual = np.ones(len(unido), dtype=bool)
+    for c in cols:
+        igual &= _iguales(unido[c], unido[f"{c}__bd"])
+
+    insertar = [filas[i] for i in np.flatnonzero(~existe)]
+    actualizar = []
+    for i in np.flatnonzero(existe & ~igual):
+        fila = dict(filas[i])
+        if hoja == "Factores":
+            fila["id"] = int(unido["id__bd"].iat[i])
+        actualizar.append(fila)
+    return {"insertar": insertar, "actualizar": actualizar, "sin_cambios": int((existe & igual).sum())}
+
+
+def guardar_cambios(db, hoja: str, cambios: dict, lanzar: bool = False):
+    """Escribe insertar + actualizar de un bloque. None si alguna peticion fallo (con lanzar, el error)."""
+    if hoja == "Factores":
+        a = db.insertar_factores_lote(cambios["insertar"], lanzar=lanzar)
+        b = db.actualizar_factores_lote(cambios["actualizar"], lanzar=lanzar)
+        return None if a is None or b is None else a + b
+    # alumnos y calificaciones son upsert: insertar y actualizar van en la misma peticion
+    return guardar_bloque(db, hoja, cambios["insertar"] + cambios["actualizar"], lanzar)
+
+
+# ===== Trabajos reanudables
+def id_trabajo(contenido: bytes, usuario=None) -> str:
+    """Mismo archivo y mismo usuario dan el mismo id, aunque se recargue la pestaña."""
+    h = hashlib.sha256(contenido)
+    h.update(str(usuario or "").encode())
+    return h.hexdigest()[:16]
+
+
+class TrabajoImportacion:
+    """
+    Checkpoint en disco de una importacion: bloques confirmados, filas, tiempo y
+    guardadas por hoja. Junto a el se guardan los indices del snapshot con los
+    que arranco, para que una reanudacion valide exactamente igual.
+    """
+
+    def __init__(self, id_: str, nombre: str = "", directorio: str = None):
+        self.id = id_
+        self.nombre = nombre
+        self.directorio = directorio or DIR_TRABAJOS_IMPORTACION
+        # solo el usuario de la app: estos archivos deciden que se escribe al reanudar
+        os.makedirs(self.directorio, mode=0o700, exist_ok=True)
+
+    @property
+    def _ruta(self):
+        return os.path.join(self.directorio, f"{self.id}.json")
+
+    @property
+    def _ruta_entrada(self):
+        return os.path.join(self.directorio, f"{self.id}.entrada.npz")
+
+    def checkpoint(self):
+        try:
+            with open(self._ruta, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def guardar_checkpoint(self, cp: dict):
+        cp["actualizado"] = time.time()
+        tmp = f"{self._ruta}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cp, f)
+        os.replace(tmp, self._ruta)  # atomico: nunca queda un checkpoint a medias
+
+    def estado_inicial(self, analytics) -> ImportacionEnBloques:
+        """Indices congelados al arrancar; si el trabajo ya existia se reutilizan."""
+        if self.checkpoint() is not None and os.path.exists(self._ruta_entrada):
+            try:
+                # arreglos planos: nunca se deserializan objetos de Python
+                with np.load(self._ruta_entrada, allow_pickle=False) as e:
+                    ids = dict(zip(e["matriculas"].tolist(), e["ids"].tolist()))
+                    return ImportacionEnBloques(e["claves"], ids)
+            except (OSError, ValueError, KeyError):
+                pass
+        estado = ImportacionEnBloques.desde_analytics(analytics)
+        ids = estado.ids_por_matricula
+        tmp = f"{self._ruta_entrada}.tmp.npz"
+        np.savez(tmp,
+                 claves=np.asarray(estado.claves_existentes if estado.claves_existentes is not None else [],
+                                   dtype=np.uint64),
+                 matriculas=np.asarray(list(ids), dtype=str),
+                 ids=np.asarray(list(ids.values()), dtype=np.int64))
+        os.replace(tmp, self._ruta_entrada)
+        return estado
+
+    def borrar(self):
+        for ruta in (self._ruta, self._ruta_entrada):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+
+def _progreso(cp: dict, filas_sesion: int, segundos_sesion: float) -> dict:
+    vel = filas_sesion / segundos_sesion if segundos_sesion > 0 else 0.0
+    total = cp.get("total") or 0
+    eta = max(total - cp["filas"], 0) / vel if vel and total else None
+    return {"filas": cp["filas"], "total": total, "filas_s": vel, "eta": eta,
+            "guardadas": dict(cp["guardadas"]), "estado": cp["estado"]}
+
+
+def _escritura_inmediata(db, hoja, cambios) -> Future:
+    fut = Future()
+    try:
+        fut.set_result(guardar_cambios(db, hoja, cambios, lanzar=True))
+    except Exception as e:
+        fut.set_exception(e)
+    return fut
+
+
+def ejecutar_trabajo(db, trabajo: TrabajoImportacion, bloques, estado: ImportacionEnBloques,
+                     total: int = None, al_avanzar=None, escritor=None, max_en_vuelo: int = 1) -> dict:
+    """
+    Valida y escribe cada bloque en cuanto se lee y guarda checkpoint tras cada
+    escritura confirmada. Solo se envian filas nuevas o con cambios respecto al
+    servidor. Al reanudar, los bloques ya confirmados se vuelven a validar sin
+    tocar la red (reconstruye duplicados) y se saltan; los pendientes reusan
+    las matriculas que tenian reservadas y se comparan de nuevo con el
+    servidor, asi que reenviarlos no duplica.
+    Con escritor (un executor) hasta max_en_vuelo bloques se escriben a la vez
+    mientras se sigue leyendo; se confirman siempre en orden.
+    al_avanzar(progreso) recibe filas, total, filas_s y eta.
+    Corre fuera del hilo del script, donde st.error no llega a la pagina: las
+    peticiones fallidas lanzan y su texto queda en cp["error"] del trabajo
+    interrumpido.
+    """
+    cp = trabajo.checkpoint()
+    if cp is None:
+        cp = {"id": trabajo.id, "nombre": trabajo.nombre, "estado": "en_curso", "bloques": 0,
+              "filas": 0, "segundos": 0.0, "total": total, "guardadas": {h: 0 for h in HOJAS},
+              "sin_cambios": {h: 0 for h in HOJAS}}
+    if cp["estado"] == "terminado":
+        return cp
+    cp["estado"] = "en_curso"
+    cp["total"] = total or cp.get("total")
+    cp.pop("error", None)
+
+    hechos, previos = cp["bloques"], cp["segundos"]
+    reservas = cp.setdefault("reservas", {})
+    inicio, filas_sesion = time.monotonic(), 0
+    en_vuelo = deque()
+
+    def confirmar():
+        nonlocal filas_sesion
+        i, hoja, n_bloque, n_filas, fut = en_vuelo.popleft()
+        try:
+            if fut.result() is None:
+                return False
+        except Exception as e:
+            cp["error"] = str(e)
+            return False
+        cp["bloques"] = i + 1
+        reservas.pop(str(i), None)
+        cp["filas"] += n_bloque
+        cp["guardadas"][hoja] += n_filas
+        cp["segundos"] = previos + time.monotonic() - inicio
+        filas_sesion += n_bloque
+        trabajo.guardar_checkpoint(cp)
+        if al_avanzar:
+            al_avanzar(_progreso(cp, filas_sesion, time.monotonic() - inicio))
+        return True
+
+    ok = True
+    for i, (hoja, bloque) in enumerate(bloques):
+        if i < hechos:
+            # sin red: solo reconstruye los duplicados vistos
+            estado.validar(hoja, bloque)
+            continue
+        try:
+            r = estado.validar(hoja, bloque, db, lanzar=True)
+            filas = filas_para_guardar(hoja, r["validos"], estado, reservas.get(str(i)))
+            if estado.ultima_reserva is not None and str(i) not in reservas:
+                # se anota antes de escribir: si se corta, el reintento usa los mismos numeros
+                reservas[str(i)] = estado.ultima_reserva
+                trabajo.guardar_checkpoint(cp)
+            # lo que ya esta igual en el servidor no se envia (incluye lo que una
+            # interrupcion alcanzo a escribir)
+            cambios = estado.diferencias(db, hoja, filas, lanzar=True)
+        except Exception as e:
+            cp["error"] = str(e)
+            ok = False
+            break
+        sin_cambios = cp.setdefault("sin_cambios", {})
+        sin_cambios[hoja] = sin_cambios.get(hoja, 0) + cambios["sin_cambios"]
+        n_filas = len(cambios["insertar"]) + len(cambios["actualizar"])
+        if not n_filas:
+            fut = Future()
+            fut.set_result([])
+        elif escritor is None:
+            fut = _escritura_inmediata(db, hoja, cambios)
+        else:
+            fut = escritor.submit(guardar_cambios, db, hoja, cambios, True)
+        en_vuelo.append((i, hoja, len(bloque), n_filas, fut))
+        while en_vuelo and (len(en_vuelo) >= max_en_vuelo or en_vuelo[0][4].done()):
+            if not confirmar():
+                ok = False
+                break
+        if not ok:
+            break
+
+    while ok and en_vuelo:
+        ok = confirmar()
+    for *_, fut in en_vuelo:
+        fut.exception()  # no dejar escrituras sueltas al cortar
+
+    if not ok:
+        cp["estado"] = "interrumpido"
+        trabajo.guardar_checkpoint(cp)
+        return cp
+    cp["estado"] = "terminado"
+    # ya no hay nada que reanudar: el resultado se entrega y no quedan archivos
+    trabajo.borrar()
+    return cp
+
+
+# ===== Trabajador en segundo plano
+class TrabajadorImportaciones:
+    """
+    Pool del proceso que ejecuta importaciones fuera del hilo del script de
+    Streamlit. Limita cuantas importaciones corren a la vez y cuantas
+    escrituras en lote hay en vuelo en total; el progreso de cada trabajo
+    queda publicado por id para que la UI lo consulte.
+    """
+
+    def __init__(self, max_trabajos: int = MAX_IMPORTACIONES_SIMULTANEAS,
+                 max_escrituras: int = MAX_ESCRITURAS_CONCURRENTES):
+        self.max_escrituras = max_escrituras
+        self._trabajos = ThreadPoolExecutor(max_trabajos, thread_name_prefix="importacion")
+        self._escrituras = ThreadPoolExecutor(max_escrituras, thread_name_prefix="importacion-escritura")
+        self._lock = threading.Lock()
+        self._progreso = {}
+        self._futuros = {}
+
+    def _publicar(self, id_, **cambios):
+        with self._lock:
+            self._progreso[id_] = {**self._progreso.get(id_, {}), **cambios}
+
+    def enviar(self, db, trabajo: TrabajoImportacion, abrir_bloques, estado: ImportacionEnBloques,
+               total: int = None) -> Future:
+        """
+        Encola el trabajo y regresa de inmediato. abrir_bloques() debe devolver el
+        generador de bloques. Si ese id ya esta en cola o corriendo, no lo duplica.
+        """
+        with self._lock:
+            previo = self._futuros.get(trabajo.id)
+            if previo is not None and not previo.done():
+                return previo
+            self._progreso[trabajo.id] = {"estado": "en_cola", "filas": 0, "total": total or 0,
+                                          "filas_s": 0.0, "eta": None, "guardadas": {}}
+
+            def correr():
+                self._publicar(trabajo.id, estado="en_curso")
+                try:
+                    cp = ejecutar_trabajo(db, trabajo, abrir_bloques(), estado, total,
+                                          al_avanzar=lambda p: self._publicar(trabajo.id, **p),
+                                          escritor=self._escrituras, max_en_vuelo=self.max_escrituras)
+                    self._publicar(trabajo.id, estado=cp["estado"], filas=cp["filas"],
+                                   guardadas=cp["guardadas"], sin_cambios=cp.get("sin_cambios", {}),
+                                   segundos=cp["segundos"], error=cp.get("error"), eta=None)
+                    return cp
+                except Exception as e:
+                    self._publicar(trabajo.id, estado="error", error=str(e), eta=None)
+                    raise
+
+            fut = self._futuros[trabajo.id] = self._trabajos.submit(correr)
+            return fut
+
+    def progreso(self, id_):
+        """Ultimo progreso publicado del trabajo, o None si este proceso no lo conoce."""
+        with self._lock:
+            p = self._progreso.get(id_)
+            return dict(p) if p is not None else None
+
+    def activo(self, id_) -> bool:
+        with self._lock:
+            fut = self._futuros.get(id_)
+            return fut is not None and not fut.done()
+
+    def descartar(self, id_):
+        with self._lock:
+            if id_ in self._futuros and not self._futuros[id_].done():
+                return
+            self._progreso.pop(id_, None)
+            self._futuros.pop(id_, None)
+
+
+_TRABAJADOR = None
+_TRABAJADOR_LOCK = threading.Lock()
+
+
+def trabajador_importaciones() -> TrabajadorImportaciones:
+    """Trabajador unico del proceso; sobrevive a reruns y a st.cache_resource.clear()."""
+    global _TRABAJADOR
+    with _TRABAJADOR_LOCK:
+        if _TRABAJADOR is None:
+            _TRABAJADOR = TrabajadorImportaciones()
+        return _TRABAJADOR
@@ -0,0 +1,71 @@
+# services/matriculas.py
+"""
+Secuencia de matriculas (A001, A002, ...). En lugar de buscar el numero mas
+alto con una regex sobre todas las matriculas cada vez, se guarda el mayor
+sufijo numerico por prefijo y se reparte desde ahi.
+"""
+import threading
+
+import pandas as pd
+
+_PATRON = r"^(.*?)(\d+)$"
+
+
+def maximos_por_prefijo(matriculas) -> dict:
+    """Mayor sufijo numerico por prefijo: {"A": 120, "B": 7}. Vectorizado."""
+    s = pd.Series(matriculas, dtype=object).dropna().astype(str).str.strip()
+    partes = s.str.extract(_PATRON).dropna()
+    if partes.empty:
+        return {}
+    return partes.assign(n=partes[1].astype(int)).groupby(0)["n"].max().to_dict()
+
+
+def formatear(prefijo: str, n: int) -> str:
+    return f"{prefijo}{n:03d}"
+
+
+class AsignadorMatriculas:
+    """
+    Guarda el ultimo numero usado o entregado por prefijo. Todas las sesiones del
+    proceso comparten la instancia y reservan bajo el mismo lock, asi dos
+    formularios o dos importaciones simultaneas nunca reciben el mismo numero.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ultimo = {}
+
+    def observar(self, maximos: dict):
+        """Sube los contadores a lo visto en un snapshot o archivo; nunca los baja."""
+        with self._lock:
+            for prefijo, n in maximos.items():
+                if n > self._ultimo.get(prefijo, 0):
+                    self._ultimo[prefijo] = int(n)
+
+    def observar_matriculas(self, matriculas):
+        self.observar(maximos_por_prefijo(matriculas))
+
+    def sugerir(self, prefijo: str = "A") -> str:
+        """Siguiente matricula libre, sin reservarla (para mostrar en un formulario)."""
+        with self._lock:
+            return formatear(prefijo, self._ultimo.get(prefijo, 0) + 1)
+
+    def reservar(self, cantidad: int = 1, prefijo: str = "A") -> int:
+        """Reserva un bloque contiguo y devuelve su primer numero."""
+        with self._lock:
+            inicio = self._ultimo.get(prefijo, 0) + 1
+            self._ultimo[prefijo] = inicio + cantidad - 1
+            return inicio
+
+
+_ASIGNADOR = None
+_ASIGNADOR_LOCK = threading.Lock()
+
+
+def asignador_matriculas() -> AsignadorMatriculas:
+    """Asignador unico del proceso."""
+    global _ASIGNADOR
+    with _ASIGNADOR_LOCK:
+        if _ASIGNADOR is None:
+            _ASIGNADOR = AsignadorMatriculas()
+        return _ASIGNADOR
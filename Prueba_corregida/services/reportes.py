@@ -0,0 +1,118 @@
+# services/reportes.py
+"""
+Generacion de reportes fuera del hilo del script de Streamlit. Cada reporte es
+un trabajo con id: la pagina lo encola, consulta su avance y ofrece la
+descarga cuando termina, sin bloquear la sesion mientras tanto.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config.constants import MAX_REPORTES_SIMULTANEOS, TTL_REPORTES_TERMINADOS
+
+EN_CURSO = ("en_cola", "en_curso")
+
+
+class TrabajadorReportes:
+    """
+    Pool del proceso para reportes. generar(avance) hace el trabajo y devuelve
+    el dict {"archivo", "extension", "mime"}; avance(fraccion, texto) publica
+    el progreso. Los terminados se guardan hasta descartarlos o hasta que pasa
+    TTL_REPORTES_TERMINADOS.
+    """
+
+    def __init__(self, max_trabajos: int = MAX_REPORTES_SIMULTANEOS, ttl: float = TTL_REPORTES_TERMINADOS):
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_trabajos, thread_name_prefix="reporte")
+        self._lock = threading.Lock()
+        self._trabajos = {}
+        self._por_clave = {}
+
+    def _publicar(self, id_, **cambios):
+        with self._lock:
+            if id_ in self._trabajos:
+                self._trabajos[id_].update(cambios)
+
+    def _purgar(self, ahora):
+        """Quita los terminados viejos; se llama con el lock tomado."""
+        for id_, t in list(self._trabajos.items()):
+            if t["estado"] not in EN_CURSO and ahora - t["terminado"] > self.ttl:
+                self._quitar(id_)
+
+    def _quitar(self, id_):
+        t = self._trabajos.pop(id_)
+        if self._por_clave.get(t["clave"]) == id_:
+            del self._por_clave[t["clave"]]
+        archivo = (t.get("resultado") or {}).get("archivo")
+        if hasattr(archivo, "close"):
+            archivo.close()
+
+    def enviar(self, generar, descripcion: str = "", clave: str = None) -> str:
+        """
+        Encola el reporte y regresa su id de inmediato. Si ya hay uno con la
+        misma clave en curso, regresa ese id en lugar de generarlo dos veces.
+        """
+        ahora = time.time()
+        with self._lock:
+            self._purgar(ahora)
+            previo = self._por_clave.get(clave) if clave else None
+            if previo is not None and self._trabajos[previo]["estado"] in EN_CURSO:
+                return previo
+            id_ = uuid.uuid4().hex[:12]
+            self._trabajos[id_] = {"estado": "en_cola", "avance": 0.0, "texto": "En espera...",
+                                   "descripcion": descripcion, "clave": clave, "creado": ahora,
+                                   "terminado": None, "segundos": None, "error": None, "resultado": None}
+            if clave:
+                self._por_clave[clave] = id_
+
+        def correr():
+            inicio = time.time()
+            self._publicar(id_, estado="en_curso", texto="Generando...")
+            try:
+                resultado = generar(lambda fraccion, texto="": self._publicar(
+                    id_, avance=min(max(float(fraccion), 0.0), 1.0), texto=texto))
+                if not resultado:
+                    raise RuntimeError("el reporte no produjo ningun archivo")
+                self._publicar(id_, estado="terminado", avance=1.0, texto="Listo", resultado=resultado,
+                               terminado=time.time(), segundos=time.time() - inicio)
+            except Exception as e:
+                self._publicar(id_, estado="error", error=str(e), terminado=time.time(),
+                               segundos=time.time() - inicio)
+
+        self._pool.submit(correr)
+        return id_
+
+    def progreso(self, id_):
+        """Copia del estado del trabajo sin el archivo, o None si no existe."""
+        with self._lock:
+            t = self._trabajos.get(id_)
+            if t is None:
+                return None
+            return {k: v for k, v in t.items() if k != "resultado"}
+
+    def resultado(self, id_):
+        """{"archivo", "extension", "mime"} del trabajo terminado, o None."""
+        with self._lock:
+            t = self._trabajos.get(id_)
+            return t["resultado"] if t is not None and t["estado"] == "terminado" else None
+
+    def descartar(self, id_):
+        """Olvida un trabajo terminado y libera su archivo; los que siguen en curso no se tocan."""
+        with self._lock:
+            t = self._trabajos.get(id_)
+            if t is not None and t["estado"] not in EN_CURSO:
+                self._quitar(id_)
+
+
+_TRABAJADOR = None
+_TRABAJADOR_LOCK = threading.Lock()
+
+
+def trabajador_reportes() -> TrabajadorReportes:
+    """Trabajador unico del proceso; los trabajos sobreviven a los reruns."""
+    global _TRABAJADOR
+    with _TRABAJADOR_LOCK:
+        if _TRABAJADOR is None:
+            _TRABAJADOR = TrabajadorReportes()
+        return _TRABAJADOR
@@ -0,0 +1,234 @@
+# services/reportes_lote.py
+"""
+Reportes PDF por lote: uno por grupo (materia, periodo, grupo) o por docente,
+armados en un ProcessPoolExecutor y empaquetados en un solo zip. El snapshot
+se escribe una vez en Feather sin comprimir y cada proceso lo abre con
+memory_map: todos leen las mismas paginas del archivo, de solo lectura, y a
+cada tarea solo viaja la clave del documento.
+"""
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import pandas as pd
+
+from config.constants import MAX_PROCESOS_REPORTES
+from services.exportacion import _terminar, archivo_temporal
+from services.tablas_pdf import tablas_pdf
+
+CALIFICACION_APROBATORIA = 70
+# tablas y columnas del snapshot que necesitan los documentos
+_COLUMNAS = {
+    "calificaciones": ["estudiante_id", "materia_id", "periodo", "grupo", "u1", "u2", "u3",
+                       "calificacion_final", "asistencia"],
+    "estudiantes": ["id", "matricula", "nombres", "apellido_paterno", "apellido_materno"],
+    "materias": ["id", "nombre", "docente", "docente_user_id"],
+}
+_ENCABEZADOS = ["Matrícula", "Nombre", "U1", "U2", "U3", "Final", "Asistencia", "Estado"]
+
+
+# ===== Documentos del lote
+def documento_grupo(materia_id, periodo, grupo) -> tuple:
+    return ("grupo", int(materia_id), str(periodo), str(grupo))
+
+
+def documento_docente(docente_id, periodo=None) -> tuple:
+    return ("docente", int(docente_id), periodo)
+
+
+def docentes_de(materias: pd.DataFrame) -> dict:
+    """docente_user_id -> nombre a mostrar, de las materias con docente asignado."""
+    if materias is None or materias.empty or "docente_user_id" not in materias.columns:
+        return {}
+    df = materias[materias["docente_user_id"].notna()]
+    nombres = df["docente"].fillna("") if "docente" in df.columns else pd.Series("", index=df.index)
+    res = {}
+    for did, nombre in zip(df["docente_user_id"].astype(int), nombres.astype(str)):
+        if nombre.strip() or did not in res:
+            res[did] = nombre.strip() or f"Docente {did}"
+    return res
+
+
+def nombre_archivo(documento, tablas) -> str:
+    """Nombre del PDF dentro del zip, legible y unico por documento."""
+    materias = tablas.get("materias")
+    if documento[0] == "grupo":
+        _, materia_id, periodo, grupo = documento
+        nombre = _nombre_materia(materias, materia_id)
+        base = f"grupo_{periodo}_{nombre}_{grupo}_{materia_id}"
+    else:
+        _, docente_id, periodo = documento
+        base = f"docente_{docente_id}"
+        nombre = docentes_de(materias).get(docente_id)
+        if nombre and nombre != f"Docente {docente_id}":
+            base += f"_{nombre}"
+        if periodo:
+            base += f"_{periodo}"
+    return re.sub(r"[^\w.-]+", "_", base).strip("_") + ".pdf"
+
+
+def _nombre_materia(materias, materia_id):
+    if materias is not None and not materias.empty and "nombre" in materias.columns:
+        fila = materias.loc[materias["id"] == materia_id, "nombre"]
+        if len(fila):
+            return str(fila.iloc[0])
+    return f"Materia {materia_id}"
+
+
+# ===== Snapshot compartido con los procesos
+def _escribir_snapshot(tablas, directorio):
+    from pyarrow import feather
+    for nombre, columnas in _COLUMNAS.items():
+        df = tablas.get(nombre)
+        df = pd.DataFrame(columns=columnas) if df is None else df
+        df = df[[c for c in columnas if c in df.columns]].reset_index(drop=True)
+        # sin comprimir para que memory_map no tenga que copiar
+        feather.write_feather(df, os.path.join(directorio, f"{nombre}.feather"), compression="uncompressed")
+
+
+_TABLAS_PROCESO = None
+
+
+def _abrir_snapshot(directorio):
+    """Inicializador de cada proceso: abre el snapshot compartido una sola vez."""
+    global _TABLAS_PROCESO
+    from pyarrow import feather
+    tablas = {n: feather.read_table(os.path.join(directorio, f"{n}.feather"), memory_map=True).to_pandas()
+              for n in _COLUMNAS}
+    tablas["calificaciones"] = tablas["calificaciones"].merge(
+        tablas["estudiantes"], left_on="estudiante_id", right_on="id", how="left")
+    _TABLAS_PROCESO = tablas
+
+
+def _pdf_en_proceso(documento):
+    return pdf_documento(documento, _TABLAS_PROCESO)
+
+
+# ===== PDF de un documento
+def _fmt(v):
+    return "" if pd.isna(v) else f"{float(v):.1f}"
+
+
+def _tabla_grupo(df) -> pd.DataFrame:
+    """Calificaciones del grupo como texto, con los encabezados del PDF."""
+    nombre = (df["nombres"].fillna("") + " " + df["apellido_paterno"].fillna("") + " "
+              + df["apellido_materno"].fillna("")).str.strip()
+    estado = (df["calificacion_final"] >= CALIFICACION_APROBATORIA).map({True: "Aprobado", False: "Reprobado"})
+    columnas = [df["matricula"].fillna("").astype(str), nombre,
+                df["u1"].map(_fmt), df["u2"].map(_fmt), df["u3"].map(_fmt),
+                df["calificacion_final"].map(_fmt), df["asistencia"].map(_fmt),
+                estado.where(df["calificacion_final"].notna(), "")]
+    return pd.DataFrame(dict(zip(_ENCABEZADOS, (c.to_numpy() for c in columnas))))
+
+
+def _resumen(df):
+    finales = df["calificacion_final"].dropna()
+    aprobados = int((finales >= CALIFICACION_APROBATORIA).sum())
+    return [
+        ["Alumnos con calificación", str(len(df))],
+        ["Promedio final", _fmt(finales.mean()) if len(finales) else "-"],
+        ["Aprobados", f"{aprobados} ({aprobados / len(finales) * 100:.1f}%)" if len(finales) else "-"],
+        ["Reprobados", str(len(finales) - aprobados)],
+        ["Asistencia promedio", _fmt(df["asistencia"].mean()) if len(df) else "-"],
+    ]
+
+
+def pdf_documento(documento, tablas) -> bytes:
+    """
+    PDF de un grupo o de un docente. tablas["calificaciones"] ya viene unida con
+    los datos del alumno (lo hace _abrir_snapshot en cada proceso).
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.8 * inch)
+    estilo_resumen = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ECF0F1')),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ])
+    cal, materias = tablas["calificaciones"], tablas["materias"]
+
+    def seccion_grupo(df, titulo):
+        elementos = [Paragraph(titulo, styles['Heading2']),
+                     Table(_resumen(df), colWidths=[2.2 * inch, 1.8 * inch], style=estilo_resumen),
+                     Spacer(1, 10)]
+        if len(df):
+            df = df.sort_values(["apellido_paterno", "apellido_materno", "nombres"], kind="stable")
+            elementos += tablas_pdf(_tabla_grupo(df), doc.width, doc.height)
+        elementos.append(Spacer(1, 16))
+        return elementos
+
+    if documento[0] == "grupo":
+        _, materia_id, periodo, grupo = documento
+        df = cal[(cal["materia_id"] == materia_id) & (cal["periodo"] == periodo) & (cal["grupo"] == grupo)]
+        elementos = [Paragraph(f"{_nombre_materia(materias, materia_id)} · Grupo {grupo}", styles['Title']),
+                     Paragraph(f"Periodo {periodo}", styles['Normal']), Spacer(1, 12)]
+        elementos += seccion_grupo(df, "Calificaciones del grupo")
+    else:
+        _, docente_id, periodo = documento
+        ids = materias.loc[materias["docente_user_id"] == docente_id, "id"]
+        df = cal[cal["materia_id"].isin(ids)]
+        if periodo:
+            df = df[df["periodo"] == periodo]
+        nombre = docentes_de(materias).get(docente_id, f"Docente {docente_id}")
+        elementos = [Paragraph(f"Reporte del docente: {nombre}", styles['Title']),
+                     Paragraph(f"Periodo {periodo}" if periodo else "Todos los periodos", styles['Normal']),
+                     Spacer(1, 12)]
+        elementos += seccion_grupo(df, "Resumen de todos sus grupos")[:2]
+        for (m, p, g), sub in df.groupby(["materia_id", "periodo", "grupo"], sort=True):
+            elementos += seccion_grupo(sub, f"{_nombre_materia(materias, m)} · {p} · Grupo {g}")
+
+    doc.build(elementos)
+    return buffer.getvalue()
+
+
+# ===== Lote
+def generar_lote(tablas, documentos, max_procesos: int = MAX_PROCESOS_REPORTES, avance=None) -> dict:
+    """
+    Arma un PDF por documento en procesos aparte y los junta en un zip.
+    Devuelve el dict de services.exportacion mas "documentos", "segundos" y
+    "por_segundo" (reportes por segundo). avance(fraccion, texto) recibe el
+    progreso con el ritmo actual.
+    """
+    avance = avance or (lambda fraccion, texto="": None)
+    documentos = list(dict.fromkeys(documentos))
+    if not documentos:
+        raise ValueError("no hay grupos ni docentes en el lote")
+    inicio = time.time()
+    procesos = max(1, min(max_procesos, len(documentos)))
+    directorio = tempfile.mkdtemp(prefix="lote_pdf_")
+    archivo = archivo_temporal()
+    try:
+        _escribir_snapshot(tablas, directorio)
+        # spawn: un fork del servidor de Streamlit copiaria sus hilos y locks
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(procesos, mp_context=contexto, initializer=_abrir_snapshot,
+                                 initargs=(directorio,)) as pool, \
+                zipfile.ZipFile(archivo, "w", zipfile.ZIP_DEFLATED) as zf:
+            trozo = max(1, len(documentos) // (procesos * 4))
+            for hechos, (doc, pdf) in enumerate(zip(documentos, pool.map(_pdf_en_proceso, documentos,
+                                                                          chunksize=trozo)), 1):
+                zf.writestr(nombre_archivo(doc, tablas), pdf)
+                ritmo = hechos / max(time.time() - inicio, 1e-6)
+                avance(hechos / len(documentos), f"{hechos} de {len(documentos)} PDF · {ritmo:.1f} reportes/s")
+    except BaseException:
+        archivo.close()
+        raise
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+    segundos = time.time() - inicio
+    return {"archivo": _terminar(archivo), "extension": ".zip", "mime": "application/zip",
+            "documentos": len(documentos), "segundos": segundos,
+            "por_segundo": len(documentos) / max(segundos, 1e-6)}
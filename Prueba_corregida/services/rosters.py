@@ -0,0 +1,81 @@
+# services/rosters.py
+"""
+Lista de alumnos inscritos por grupo (materia, periodo, grupo), con el nombre
+ya armado y ordenada. Se guarda para todo el proceso y solo se descarta cuando
+se escribe una inscripcion de ese grupo (o al vencer el TTL, por si alguien
+edita la base por fuera de la app).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from config.constants import MAX_ROSTERS_EN_CACHE, TTL_CACHE_ROSTERS
+
+
+def clave_grupo(materia_id, periodo, grupo) -> tuple:
+    return (int(materia_id), str(periodo), str(grupo))
+
+
+class CacheRosters:
+    """
+    clave_grupo -> (generacion, cargado, alumnos). La generacion avanza con cada
+    invalidacion del grupo, asi una lectura que empezo antes de una escritura no
+    deja guardada la lista vieja.
+    """
+
+    def __init__(self, maximo: int = MAX_ROSTERS_EN_CACHE, ttl: float = TTL_CACHE_ROSTERS):
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self._generaciones = {}
+        self.maximo = maximo
+        self.ttl = ttl
+
+    def version(self, materia_id, periodo, grupo) -> int:
+        with self._lock:
+            return self._generaciones.get(clave_grupo(materia_id, periodo, grupo), 0)
+
+    def obtener(self, db, materia_id, periodo, grupo) -> list:
+        """Alumnos del grupo [{"id", "nombre"}] ordenados por nombre; una consulta solo si no esta en cache."""
+        clave = clave_grupo(materia_id, periodo, grupo)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            generacion = self._generaciones.get(clave, 0)
+            if entrada is not None and entrada[0] == generacion and time.monotonic() - entrada[1] < self.ttl:
+                self._entradas.move_to_end(clave)
+                return [dict(a) for a in entrada[2]]
+
+        inicio = time.monotonic()
+        alumnos = tuple(dict(a) for a in (db.alumnos_inscritos_para_calificacion(*clave) or []))
+        with self._lock:
+            # si hubo una escritura mientras se leia, no se guarda
+            if self._generaciones.get(clave, 0) == generacion:
+                self._entradas[clave] = (generacion, inicio, alumnos)
+                self._entradas.move_to_end(clave)
+                while len(self._entradas) > self.maximo:
+                    self._entradas.popitem(last=False)
+        return [dict(a) for a in alumnos]
+
+    def invalidar(self, materia_id, periodo, grupo):
+        clave = clave_grupo(materia_id, periodo, grupo)
+        with self._lock:
+            self._generaciones[clave] = self._generaciones.get(clave, 0) + 1
+            self._entradas.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            for clave in self._entradas:
+                self._generaciones[clave] = self._generaciones.get(clave, 0) + 1
+            self._entradas.clear()
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def cache_rosters() -> CacheRosters:
+    """Cache unica del proceso, compartida por todas las sesiones."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = CacheRosters()
+        return _CACHE
@@ -0,0 +1,98 @@
+# services/tablas_pdf.py
+"""
+Tablas completas para los PDF. Una sola Table de reportlab con miles de filas
+se mide celda por celda y se vuelve a partir en cada salto de pagina, asi que
+el tiempo crece mas rapido que las filas. Aqui los datos se cortan en trozos
+del alto de una pagina, cada trozo es un LongTable con anchos y alto de fila
+fijos (no hay que medir nada) y todos comparten el mismo TableStyle.
+"""
+from functools import lru_cache
+
+import pandas as pd
+
+# alto de fila = fuente + relleno arriba y abajo
+_RELLENO = 3
+_RELLENO_LATERAL = 12   # LEFTPADDING + RIGHTPADDING por defecto de reportlab
+# ancho medio de un caracter de Helvetica (y de Helvetica-Bold), en unidades de la fuente
+_ANCHO_CARACTER = 0.55
+_ANCHO_CARACTER_NEGRITA = 0.6
+
+
+@lru_cache(maxsize=None)
+def estilo_tabla(fondo_encabezado: str = "#3498DB", fuente_encabezado: int = 8, fuente: int = 7):
+    """TableStyle compartido por todos los trozos de todas las tablas con estos parametros."""
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(fondo_encabezado)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), fuente_encabezado),
+        ('FONTSIZE', (0, 1), (-1, -1), fuente),
+        ('LEADING', (0, 0), (-1, -1), max(fuente, fuente_encabezado) + 1),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), _RELLENO),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), _RELLENO),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F9FA')]),
+    ])
+
+
+def _texto(s: pd.Series) -> pd.Series:
+    """Columna como texto de una linea; los vacios quedan en blanco."""
+    if pd.api.types.is_float_dtype(s.dtype):
+        t = s.round(2).astype(str)
+    else:
+        t = s.astype(str).str.replace(r"\s+", " ", regex=True)
+    return t.where(s.notna(), "")
+
+
+def _anchos(columnas, textos, ancho_total, fuente_encabezado, fuente):
+    """Ancho de cada columna segun su texto mas largo, escalado para caber en ancho_total."""
+    natural = []
+    for c, t in zip(columnas, textos):
+        largo = max(int(t.str.len().max()) if len(t) else 0, 2)
+        natural.append(max(len(c) * _ANCHO_CARACTER_NEGRITA * fuente_encabezado,
+                           largo * _ANCHO_CARACTER * fuente) + _RELLENO_LATERAL)
+    escala = min(1.0, ancho_total / sum(natural))
+    return [w * escala for w in natural]
+
+
+def _recortar(t: pd.Series, ancho, fuente, por_caracter=_ANCHO_CARACTER):
+    """Corta el texto que no cabe en la columna; con alto de fila fijo no puede partirse en lineas."""
+    caben = max(int((ancho - _RELLENO_LATERAL) / (por_caracter * fuente) + 1e-6), 1)
+    largos = t.str.len() > caben
+    if not largos.any():
+        return t
+    return t.where(~largos, t.str.slice(0, max(caben - 1, 1)) + "…")
+
+
+def tablas_pdf(df: pd.DataFrame, ancho: float, alto: float, fondo_encabezado: str = "#3498DB",
+               fuente_encabezado: int = 8, fuente: int = 7) -> list:
+    """
+    Flowables para df completo: un LongTable por cada pagina de filas, con el
+    encabezado repetido. ancho y alto son los del marco de la pagina (doc.width,
+    doc.height). El costo es lineal en filas.
+    """
+    from reportlab.platypus import LongTable
+
+    if df is None or df.empty:
+        return []
+    columnas = [str(c) for c in df.columns]
+    textos = [_texto(df.iloc[:, i]) for i in range(df.shape[1])]
+    anchos = _anchos(columnas, textos, ancho, fuente_encabezado, fuente)
+    textos = [_recortar(t, w, fuente) for t, w in zip(textos, anchos)]
+    encabezado = [_recortar(pd.Series([c]), w, fuente_encabezado, _ANCHO_CARACTER_NEGRITA).iloc[0]
+                  for c, w in zip(columnas, anchos)]
+
+    alto_fila = max(fuente, fuente_encabezado) + 1 + 2 * _RELLENO
+    filas_por_pagina = max(int(alto // alto_fila) - 1, 1)
+    estilo = estilo_tabla(fondo_encabezado, fuente_encabezado, fuente)
+    filas = list(zip(*(t.tolist() for t in textos)))
+
+    trozos = []
+    for inicio in range(0, len(filas), filas_por_pagina):
+        datos = [encabezado] + [list(f) for f in filas[inicio:inicio + filas_por_pagina]]
+        trozos.append(LongTable(datos, colWidths=anchos, rowHeights=alto_fila, repeatRows=1, style=estilo))
+    return trozos
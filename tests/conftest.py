@@ -0,0 +1,152 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# La app se ejecuta desde Prueba_corregida (imports tipo "services.analytics")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "Prueba_corregida"))
+
+
+class _Respuesta:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Consulta:
+    """Subconjunto del query builder de supabase-py que usa DatabaseService."""
+
+    def __init__(self, backend, tabla):
+        self.backend = backend
+        self.tabla = tabla
+        self.filtros = []
+        self.operacion = "select"
+        self.payload = None
+        self.on_conflict = None
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def eq(self, columna, valor):
+        self.filtros.append(lambda r: r.get(columna) == valor)
+        return self
+
+    def in_(self, columna, valores):
+        valores = set(valores)
+        self.filtros.append(lambda r: r.get(columna) in valores)
+        return self
+
+    def match(self, criterios):
+        for columna, valor in criterios.items():
+            self.eq(columna, valor)
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.operacion, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict=None, **kwargs):
+        self.operacion, self.payload = "upsert", payload
+        self.on_conflict = on_conflict.split(",") if on_conflict else None
+        return self
+
+    def update(self, payload):
+        self.operacion, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.operacion = "delete"
+        return self
+
+    def execute(self):
+        with self.backend.lock:
+            self.backend.llamadas.append((self.tabla, self.operacion))
+            filas = self.backend.tablas.setdefault(self.tabla, [])
+            coincide = lambda r: all(f(r) for f in self.filtros)
+            if self.operacion == "select":
+                return _Respuesta([dict(r) for r in filas if coincide(r)])
+            if self.operacion == "delete":
+                borradas = [r for r in filas if coincide(r)]
+                self.backend.tablas[self.tabla] = [r for r in filas if not coincide(r)]
+                return _Respuesta(borradas)
+            if self.operacion == "update":
+                for r in filas:
+                    if coincide(r):
+                        r.update(self.payload)
+                return _Respuesta([dict(r) for r in filas if coincide(r)])
+            nuevas = []
+            for p in (self.payload if isinstance(self.payload, list) else [self.payload]):
+                if self.operacion == "upsert" and self.on_conflict:
+                    previa = next((r for r in filas if all(r.get(c) == p.get(c) for c in self.on_conflict)), None)
+                    if previa is not None:
+                        previa.update(p)
+                        nuevas.append(dict(previa))
+                        continue
+                fila = dict(p)
+                fila.setdefault("id", max([r.get("id", 0) for r in filas] + [0]) + 1)
+                filas.append(fila)
+                nuevas.append(dict(fila))
+            return _Respuesta(nuevas)
+
+
+class SupabaseLocal:
+    """Backend en memoria que sustituye al cliente de Supabase en las pruebas."""
+
+    def __init__(self, tablas=None):
+        import threading
+        self.tablas = tablas or {}
+        self.llamadas = []
+        self.lock = threading.Lock()
+
+    def table(self, nombre):
+        return _Consulta(self, nombre)
+
+
+def datos_de_ejemplo(n=20):
+    return {
+        "materias": [
+            {"id": 1, "nombre": "Calidad", "semestre": 5, "carrera_id": 1, "docente": "", "docente_user_id": 7},
+            {"id": 2, "nombre": "Redes", "semestre": 6, "carrera_id": 1, "docente": "", "docente_user_id": 8},
+        ],
+        "grupos": [
+            {"id": 1, "materia_id": 1, "periodo": "2025-1", "grupo": "A"},
+            {"id": 2, "materia_id": 2, "periodo": "2025-1", "grupo": "B"},
+        ],
+        "estudiantes": [
+            {"id": i, "matricula": f"A{i:03d}", "nombre": "", "nombres": f"Alumno{i}",
+             "apellido_paterno": "Perez", "apellido_materno": "Lopez", "carrera_id": 1,
+             "ingreso_semestre": "2024-1", "horas_estudio": 10, "desercion": i % 5 == 0}
+            for i in range(1, n + 1)
+        ],
+        "inscripciones": [
+            {"id": i, "estudiante_id": i, "materia_id": 1 + i % 2, "periodo": "2025-1", "grupo": "AB"[i % 2]}
+            for i in range(1, n + 1)
+        ],
+        "registro_calificaciones": [
+            {"id": i, "estudiante_id": i, "materia_id": 1 + i % 2, "periodo": "2025-1", "grupo": "AB"[i % 2],
+             "calificacion_final": 50.0 + i * 2, "asistencia": 80.0, "u1": 70.0, "u2": 75.0, "u3": 80.0,
+             "reprobado": 50.0 + i * 2 < 70}
+            for i in range(1, n + 1)
+        ],
+        "factores": [
+            {"id": 1, "categoria": "Academicos", "nombre": "Base", "inscripcion_id": 1, "gravedad": 3},
+        ],
+    }
+
+
+@pytest.fixture
+def backend():
+    return SupabaseLocal(datos_de_ejemplo())
+
+
+@pytest.fixture
+def analytics(backend):
+    from services.database import DatabaseService
+    from services.analytics import AnalyticsService
+    return AnalyticsService(DatabaseService(backend))
@@ -0,0 +1,125 @@
+# tests/test_analytics_concurrencia.py
+import threading
+import time
+
+from conftest import SupabaseLocal, datos_de_ejemplo
+
+
+class SupabaseLento(SupabaseLocal):
+    """Cada lectura tarda un poco, para que los hilos se encimen de verdad."""
+
+    def __init__(self, *args, retraso=0.02, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retraso = retraso
+
+    def table(self, nombre):
+        time.sleep(self.retraso)
+        return super().table(nombre)
+
+
+def _servicio(backend):
+    from services.database import DatabaseService
+    from services.analytics import AnalyticsService
+    return AnalyticsService(DatabaseService(backend))
+
+
+def _lecturas(backend, tabla="estudiantes"):
+    return sum(1 for t, op in backend.llamadas if t == tabla and op == "select")
+
+
+def _en_hilos(n, objetivo):
+    barrera = threading.Barrier(n)
+    errores = []
+
+    def correr(i):
+        try:
+            barrera.wait()
+            objetivo(i)
+        except Exception as e:  # pragma: no cover - se reporta abajo
+            errores.append(e)
+
+    hilos = [threading.Thread(target=correr, args=(i,)) for i in range(n)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join(timeout=30)
+    assert not errores, errores
+    assert not any(h.is_alive() for h in hilos)
+
+
+def test_carga_inicial_concurrente_lee_el_backend_una_vez():
+    backend = SupabaseLento(datos_de_ejemplo())
+    analytics = _servicio(backend)
+    vistos = []
+
+    _en_hilos(32, lambda i: vistos.append(analytics.snapshot()))
+
+    assert _lecturas(backend) == 1
+    assert len({id(s) for s in vistos}) == 1
+
+
+def test_lectores_y_recargas_concurrentes():
+    backend = SupabaseLento(datos_de_ejemplo(), retraso=0.005)
+    analytics = _servicio(backend)
+    analytics.snapshot()
+    n = 24
+
+    def trabajo(i):
+        previa = 0
+        for k in range(15):
+            if i % 6 == 0:
+                analytics.actualizar_datos()
+            elif i % 6 == 1:
+                analytics.refrescar_datos()
+            elif i % 6 == 2 and k % 5 == 0:
+                # un escritor cambia el backend mientras otros leen
+                with backend.lock:
+                    backend.tablas["estudiantes"][0]["horas_estudio"] += 1
+            snap = analytics.snapshot()
+            assert snap is not None
+            assert snap.version >= previa
+            previa = snap.version
+            tablas = {nombre: snap[nombre] for nombre in snap.tablas}
+            assert all(df is not None for df in tablas.values())
+            assert len(tablas["estudiantes"]) == 20
+            assert len(analytics.df_calificaciones) == 20
+
+    _en_hilos(n, trabajo)
+
+    # 4 hilos x 15 recargas forzadas + 4 x 15 refrescos: single-flight las junta
+    assert _lecturas(backend) < 120
+    analytics.actualizar_datos()
+    assert analytics.df_estudiantes["horas_estudio"].iloc[0] == backend.tablas["estudiantes"][0]["horas_estudio"]
+
+
+def test_snapshot_publicado_no_cambia_tras_recarga(analytics, backend):
+    antes = analytics.snapshot()
+    horas = antes["estudiantes"]["horas_estudio"].tolist()
+
+    backend.tablas["estudiantes"][0]["horas_estudio"] = 99
+    analytics.actualizar_datos()
+    despues = analytics.snapshot()
+
+    assert despues is not antes
+    assert despues.version == antes.version + 1
+    assert antes["estudiantes"]["horas_estudio"].tolist() == horas
+    assert despues["estudiantes"]["horas_estudio"].iloc[0] == 99
+
+
+def test_error_de_carga_llega_a_todos_los_que_esperan(analytics):
+    def falla(alcance):
+        time.sleep(0.02)
+        raise RuntimeError("sin conexion")
+
+    analytics._leer_backend = falla
+    errores = []
+
+    def leer(i):
+        try:
+            analytics.snapshot()
+        except RuntimeError as e:
+            errores.append(e)
+
+    _en_hilos(8, leer)
+    assert len(errores) == 8
+    assert analytics._en_vuelo == {}
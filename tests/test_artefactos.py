@@ -0,0 +1,80 @@
+# tests/test_artefactos.py
+import io
+
+import services.artefactos as art
+from services.artefactos import CacheArtefactos, firma_datos
+
+
+def _resultado(contenido=b"a,b\n1,2\n", extension=".csv", mime="text/csv"):
+    return {"archivo": io.BytesIO(contenido), "extension": extension, "mime": mime}
+
+
+def test_guarda_y_sirve_desde_disco(tmp_path):
+    cache = CacheArtefactos(str(tmp_path), max_bytes=1024)
+    clave = cache.clave(tipo="General", filtros={"rango": (0, 100)}, formato="CSV (.csv)")
+    assert cache.obtener(clave) is None
+
+    guardado = cache.guardar(clave, _resultado(), alcance=("global",), huella=1)
+    assert guardado["archivo"].read() == b"a,b\n1,2\n"
+
+    otra = cache.obtener(clave)
+    assert otra["cache"] and otra["extension"] == ".csv" and otra["mime"] == "text/csv"
+    assert otra["archivo"].tamano == 8 and otra["archivo"].read() == b"a,b\n1,2\n"
+    # el pdf llega como bytes
+    pdf = cache.guardar(cache.clave(formato="PDF"), {"archivo": b"%PDF", "extension": ".pdf", "mime": "application/pdf"})
+    assert pdf["archivo"].read() == b"%PDF"
+
+
+def test_clave_distingue_filtros_y_datos():
+    base = dict(tipo="General", filtros={"rango": (0, 100)}, alcance=("global",), datos=firma_datos(1))
+    assert CacheArtefactos.clave(**base) == CacheArtefactos.clave(**dict(reversed(list(base.items()))))
+    assert CacheArtefactos.clave(**base) != CacheArtefactos.clave(**{**base, "filtros": {"rango": (0, 90)}})
+    assert CacheArtefactos.clave(**base) != CacheArtefactos.clave(**{**base, "datos": firma_datos(2)})
+
+
+def test_recorta_los_menos_usados(tmp_path):
+    import os
+    cache = CacheArtefactos(str(tmp_path), max_bytes=250)
+    for i, nombre in enumerate(["a", "b", "c"]):
+        cache.guardar(nombre, _resultado(b"x" * 100))
+        os.utime(tmp_path / f"{nombre}.json", (1000 + i, 1000 + i))
+    # "c" no entraba: se fue "a", el de uso mas viejo
+    assert cache.obtener("a") is None
+    assert cache.obtener("b") is not None and cache.obtener("c") is not None
+    assert cache.bytes_en_uso() == 200
+
+    grande = _resultado(b"y" * 300)
+    devuelto = cache.guardar("d", grande)
+    assert devuelto is grande and devuelto["archivo"].read() == b"y" * 300
+    assert cache.obtener("d") is None and cache.bytes_en_uso() == 200
+
+
+def test_invalidar_solo_borra_datos_viejos_del_alcance(tmp_path):
+    cache = CacheArtefactos(str(tmp_path))
+    cache.guardar("viejo", _resultado(), alcance=("global",), huella=1)
+    cache.guardar("nuevo", _resultado(), alcance=("global",), huella=2)
+    cache.guardar("otro", _resultado(), alcance=("docente", 7), huella=1)
+
+    cache.invalidar(("global",), 2)
+    assert cache.obtener("viejo") is None
+    assert cache.obtener("nuevo") is not None and cache.obtener("otro") is not None
+
+
+def test_snapshot_nuevo_invalida_reportes(analytics, backend, tmp_path, monkeypatch):
+    cache = CacheArtefactos(str(tmp_path))
+    monkeypatch.setattr(art, "_CACHE", cache)
+    snap = analytics.snapshot()
+    cache.guardar("reporte", _resultado(), alcance=snap.alcance, huella=snap.huella)
+
+    analytics.actualizar_datos()  # mismos datos: el reporte sigue valiendo
+    assert cache.obtener("reporte") is not None
+
+    backend.tablas["estudiantes"][0]["horas_estudio"] = 99
+    analytics.actualizar_datos()
+    assert cache.obtener("reporte") is None
+
+
+def test_directorio_privado(tmp_path):
+    directorio = tmp_path / "reportes"
+    CacheArtefactos(str(directorio))
+    assert directorio.stat().st_mode & 0o077 == 0
@@ -0,0 +1,56 @@
+# tests/test_calificaciones_grupo.py
+import numpy as np
+import pandas as pd
+
+from services.calificaciones import calcular_finales, cambios_captura, guardar_calificaciones, tabla_captura
+from services.database import DatabaseService
+
+
+def _tabla(analytics):
+    dfc = analytics.df_calificaciones
+    dfc = dfc[(dfc["materia_id"] == 1) & (dfc["periodo"] == "2025-1") & (dfc["grupo"] == "A")]
+    inscritos = [{"id": i, "nombre": f"Alumno{i}"} for i in (2, 4, 6, 99)]
+    return tabla_captura(inscritos, dfc)
+
+
+def test_tabla_incluye_a_todos_los_inscritos(analytics):
+    tabla = _tabla(analytics)
+    assert list(tabla.index) == [2, 4, 6, 99]
+    assert tabla.loc[2, "u1"] == 70.0
+    assert tabla.loc[2, "calificacion_final"] == 75.0
+    assert np.isnan(tabla.loc[99, "u1"]) and np.isnan(tabla.loc[99, "calificacion_final"])
+
+
+def test_finales_vectorizadas():
+    df = pd.DataFrame({"u1": [90, 70, None], "u2": [80, 71, 80], "u3": [70, 71, 80]})
+    assert calcular_finales(df).tolist()[:2] == [80.0, 70.67]
+    assert np.isnan(calcular_finales(df).iloc[2])
+
+
+def test_solo_se_envian_filas_cambiadas_y_completas(analytics):
+    tabla = _tabla(analytics)
+    editada = tabla.copy()
+    editada.loc[4, "u3"] = 100.0
+    editada.loc[99, ["u1", "u2", "u3", "asistencia"]] = [60.0, 70.0, 80.0, 90.0]
+    editada.loc[6, "u1"] = np.nan
+
+    filas, incompletas = cambios_captura(tabla, editada, 1, "2025-1", "A")
+    assert incompletas == 1
+    assert sorted(f["estudiante_id"] for f in filas) == [4, 99]
+    nueva = next(f for f in filas if f["estudiante_id"] == 99)
+    assert nueva == {"estudiante_id": 99, "materia_id": 1, "periodo": "2025-1", "grupo": "A",
+                     "u1": 60.0, "u2": 70.0, "u3": 80.0, "asistencia": 90.0, "calificacion_final": 70.0}
+    assert cambios_captura(tabla, tabla.copy(), 1, "2025-1", "A") == ([], 0)
+
+
+def test_guardado_en_lotes(backend):
+    db = DatabaseService(backend)
+    filas = [{"estudiante_id": 100 + i, "materia_id": 1, "periodo": "2025-1", "grupo": "A",
+              "u1": 80.0, "u2": 80.0, "u3": 80.0, "asistencia": 90.0, "calificacion_final": 80.0}
+             for i in range(45)]
+    backend.llamadas.clear()
+    assert guardar_calificaciones(db, filas, tam=20) == 45
+    assert backend.llamadas == [("registro_calificaciones", "upsert")] * 3
+    # repetir el guardado actualiza, no duplica
+    guardar_calificaciones(db, filas, tam=20)
+    assert len(backend.tablas["registro_calificaciones"]) == 20 + 45
@@ -0,0 +1,103 @@
+# tests/test_cola_calificaciones.py
+import time
+
+import pytest
+
+import services.cola_calificaciones as cola_mod
+from services.cola_calificaciones import ColaCalificaciones, comprobar_ruta_persistente, espera_reintento
+from services.database import DatabaseService
+
+
+def _fila(est, u=80.0, grupo="A"):
+    return {"estudiante_id": est, "materia_id": 1, "periodo": "2025-1", "grupo": grupo,
+            "u1": u, "u2": u, "u3": u, "asistencia": 90.0, "calificacion_final": u}
+
+
+def _en_servidor(backend, est):
+    return [r for r in backend.tablas["registro_calificaciones"]
+            if (r["estudiante_id"], r["materia_id"], r["periodo"], r["grupo"]) == (est, 1, "2025-1", "A")]
+
+
+def test_ediciones_de_la_misma_clave_se_funden(tmp_path, backend):
+    cola = ColaCalificaciones(str(tmp_path / "cola.sqlite3"))
+    for u in (60.0, 70.0, 95.0):
+        cola.encolar([_fila(200, u)])
+    cola.encolar([_fila(201), _fila(202)])
+    assert cola.estado()["pendientes"] == 3
+    assert cola.estado(1, "2025-1", "A")["pendientes"] == 3
+    assert cola.pendientes_de(1, "2025-1", "A").set_index("estudiante_id").loc[200, "u1"] == 95.0
+
+    backend.llamadas.clear()
+    assert cola.vaciar(DatabaseService(backend)) == 3
+    assert backend.llamadas == [("registro_calificaciones", "upsert")]
+    assert _en_servidor(backend, 200)[0]["u1"] == 95.0
+    assert cola.estado()["pendientes"] == 0
+
+
+def test_falla_reintenta_con_backoff(tmp_path, backend):
+    cola = ColaCalificaciones(str(tmp_path / "cola.sqlite3"))
+    db = DatabaseService(backend)
+    original = db.upsert_calificaciones_lote
+
+    def caido(filas, lanzar=False):
+        raise ConnectionError("Supabase no responde (503)")
+
+    db.upsert_calificaciones_lote = caido
+    cola.encolar([_fila(300)])
+
+    ahora = time.time()
+    assert cola.vaciar(db, ahora) == 0
+    e = cola.estado()
+    # el panel de pendientes muestra el motivo real, no un mensaje generico
+    assert e["pendientes"] == 1 and e["con_error"] == 1 and e["ultimo_error"] == "Supabase no responde (503)"
+    # aun no toca el reintento
+    assert cola.vaciar(db, ahora + 0.1) == 0
+
+    db.upsert_calificaciones_lote = original
+    assert cola.vaciar(db, ahora + espera_reintento(5)) == 1
+    assert _en_servidor(backend, 300) and cola.estado()["pendientes"] == 0
+
+
+def test_edicion_durante_el_envio_no_se_pierde(tmp_path, backend):
+    cola = ColaCalificaciones(str(tmp_path / "cola.sqlite3"))
+    db = DatabaseService(backend)
+    original = db.upsert_calificaciones_lote
+
+    def upsert_y_editar(filas, **kwargs):
+        cola.encolar([_fila(400, 99.0)])  # llega otra edicion mientras se envia
+        return original(filas, **kwargs)
+
+    db.upsert_calificaciones_lote = upsert_y_editar
+    cola.encolar([_fila(400, 50.0)])
+    cola.vaciar(db)
+    assert _en_servidor(backend, 400)[0]["u1"] == 50.0
+    assert cola.estado()["pendientes"] == 1
+
+    db.upsert_calificaciones_lote = original
+    cola.vaciar(db)
+    assert _en_servidor(backend, 400)[0]["u1"] == 99.0
+    assert cola.estado()["pendientes"] == 0
+
+
+def test_hilo_vacia_la_cola_y_sobrevive_reinicios(tmp_path, backend):
+    ruta = str(tmp_path / "cola.sqlite3")
+    ColaCalificaciones(ruta).encolar([_fila(500 + i) for i in range(30)])
+
+    cola = ColaCalificaciones(ruta, intervalo=0.05, tam_lote=10)  # otro proceso, misma cola
+    cola.iniciar(DatabaseService(backend))
+    try:
+        limite = time.time() + 5
+        while cola.estado()["pendientes"] and time.time() < limite:
+            time.sleep(0.02)
+    finally:
+        cola.detener()
+    assert cola.estado()["pendientes"] == 0
+    assert all(_en_servidor(backend, 500 + i) for i in range(30))
+
+
+def test_cola_persistente_obligatoria(tmp_path, monkeypatch):
+    with pytest.raises(RuntimeError):
+        comprobar_ruta_persistente(str(tmp_path / "cola.sqlite3"))
+    monkeypatch.setattr(cola_mod.tempfile, "gettempdir", lambda: str(tmp_path / "tmp"))
+    comprobar_ruta_persistente(str(tmp_path / "datos" / "cola.sqlite3"))
+    assert (tmp_path / "datos").is_dir()
@@ -0,0 +1,57 @@
+# tests/test_exportacion_columnar.py
+import io
+import zipfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import pytest
+
+from services.exportacion import exportar_columnar
+
+
+def _df(n=250):
+    return pd.DataFrame({
+        "id": pd.array([i if i % 7 else None for i in range(n)], dtype="Int64"),
+        "carrera": pd.Categorical([["Sistemas", "TIC", "IA"][i % 3] for i in range(n)]),
+        "final": [50.0 + i % 50 for i in range(n)],
+        "nombre": [f"Alumno {i}" for i in range(n)],
+    })
+
+
+@pytest.mark.parametrize("formato, leer", [
+    ("parquet", lambda b: pq.read_table(io.BytesIO(b))),
+    ("feather", lambda b: feather.read_table(io.BytesIO(b))),
+    ("arrow", lambda b: pa.ipc.open_stream(b).read_all()),
+])
+def test_conserva_tipos(formato, leer):
+    df = _df()
+    res = exportar_columnar({"estudiantes": df}, formato)
+    vuelta = leer(res["archivo"].read()).to_pandas()
+    pd.testing.assert_frame_equal(vuelta, df)
+    assert str(vuelta["id"].dtype) == "Int64" and isinstance(vuelta["carrera"].dtype, pd.CategoricalDtype)
+
+
+def test_columnas_y_tamano_de_grupo():
+    res = exportar_columnar({"estudiantes": _df()}, "parquet", columnas=["final", "id", "no_existe"],
+                            filas_por_grupo=100)
+    archivo = pq.ParquetFile(io.BytesIO(res["archivo"].read()))
+    assert archivo.schema_arrow.names == ["final", "id"]
+    assert [archivo.metadata.row_group(i).num_rows for i in range(archivo.num_row_groups)] == [100, 100, 50]
+
+    res = exportar_columnar({"estudiantes": _df()}, "arrow", filas_por_grupo=100)
+    assert [len(b) for b in pa.ipc.open_stream(res["archivo"].read())] == [100, 100, 50]
+
+
+def test_varias_secciones_en_zip():
+    secciones = {"estudiantes": _df(10), "materias": pd.DataFrame({"id": [1, 2], "nombre": ["A", "B"]})}
+    res = exportar_columnar(secciones, "parquet", columnas=["carrera"])
+    # materias no tiene ninguna columna pedida: queda un solo archivo
+    assert res["extension"] == ".parquet"
+
+    res = exportar_columnar(secciones, "feather")
+    with zipfile.ZipFile(io.BytesIO(res["archivo"].read())) as zf:
+        assert zf.namelist() == ["estudiantes.feather", "materias.feather"]
+        vuelta = feather.read_table(io.BytesIO(zf.read("materias.feather"))).to_pandas()
+    pd.testing.assert_frame_equal(vuelta, secciones["materias"])
@@ -0,0 +1,51 @@
+# tests/test_exportacion_csv.py
+import gzip
+import io
+import zipfile
+
+import pandas as pd
+
+from services.exportacion import exportar_csv
+
+
+def _df(n=1000):
+    return pd.DataFrame({"id": range(n), "nombre": [f"Alumno ñ {i}" for i in range(n)],
+                         "final": [50 + (i % 50) for i in range(n)]})
+
+
+def test_csv_por_bloques_igual_al_de_pandas():
+    df = _df()
+    res = exportar_csv({"estudiantes": df}, tam=64)
+    assert res["extension"] == ".csv" and res["mime"] == "text/csv"
+    contenido = res["archivo"].read()
+    assert contenido == df.to_csv(index=False).encode("utf-8")
+    assert res["archivo"].tamano == len(contenido)
+
+
+def test_csv_comprimido():
+    df = _df()
+    res = exportar_csv({"estudiantes": df}, comprimir=True, tam=100)
+    assert res["extension"] == ".csv.gz"
+    assert gzip.decompress(res["archivo"].read()) == df.to_csv(index=False).encode("utf-8")
+
+
+def test_reporte_de_varias_tablas_sale_en_zip():
+    secciones = {"estudiantes": _df(10), "calificaciones": _df(30), "vacia": pd.DataFrame({"a": []})}
+    res = exportar_csv(secciones, tam=7)
+    assert res["extension"] == ".zip"
+    with zipfile.ZipFile(io.BytesIO(res["archivo"].read())) as zf:
+        assert zf.namelist() == ["estudiantes.csv", "calificaciones.csv", "vacia.csv"]
+        for nombre, df in secciones.items():
+            assert zf.read(f"{nombre}.csv") == df.to_csv(index=False).encode("utf-8")
+
+
+def test_archivo_grande_pasa_a_disco_y_lo_acepta_download_button(monkeypatch):
+    import services.exportacion as exp
+    from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+    monkeypatch.setattr(exp, "MAX_MEMORIA_EXPORTACION", 1024)
+
+    df = _df(5000)
+    res = exp.exportar_csv({"estudiantes": df})
+    assert res["archivo"]._archivo._rolled
+    datos, _ = convert_data_to_bytes_and_infer_mime(res["archivo"], unsupported_error=TypeError())
+    assert datos == df.to_csv(index=False).encode("utf-8")
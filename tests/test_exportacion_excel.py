@@ -0,0 +1,54 @@
+# tests/test_exportacion_excel.py
+import io
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+import services.exportacion as exp
+
+
+def _libro(res):
+    return load_workbook(io.BytesIO(res["archivo"].read()), read_only=True)
+
+
+def test_tipos_y_vacios_se_conservan():
+    df = pd.DataFrame({
+        "id": pd.array([1, 2, None], dtype="Int64"),
+        "final": [70.5, np.nan, 88.25],
+        "desercion": [True, False, True],
+        "nombre": ["Ana", None, "José"],
+        "fecha": pd.to_datetime(["2025-01-02 00:00", None, "2025-03-04 10:30"]),
+    })
+    res = exp.exportar_excel({"Personalizado": df}, tam=2)
+    assert res["extension"] == ".xlsx" and res["mime"] == exp.MIME_XLSX
+    filas = list(_libro(res)["Personalizado"].iter_rows(values_only=True))
+    assert filas[0] == ("id", "final", "desercion", "nombre", "fecha")
+    assert filas[1] == (1, 70.5, True, "Ana", datetime(2025, 1, 2))
+    assert filas[2] == (2, None, False, None, None)
+    assert filas[3] == (None, 88.25, True, "José", datetime(2025, 3, 4, 10, 30))
+
+
+def test_varias_hojas_y_hoja_que_no_cabe(monkeypatch):
+    monkeypatch.setattr(exp, "XLSX_MAX_FILAS", 40)
+    grande = pd.DataFrame({"n": range(100), "t": [f"x{i}" for i in range(100)]})
+    res = exp.exportar_excel({"Calificaciones": grande, "Materias": pd.DataFrame({"id": [1]})}, tam=16)
+    libro = _libro(res)
+    assert libro.sheetnames == ["Calificaciones", "Calificaciones_2", "Calificaciones_3", "Materias"]
+    numeros = [r[0] for h in libro.sheetnames[:3] for r in libro[h].iter_rows(min_row=2, values_only=True)]
+    assert numeros == list(range(100))
+
+
+def test_usa_constant_memory(monkeypatch):
+    import xlsxwriter
+    opciones = []
+    original = xlsxwriter.Workbook
+
+    def workbook(destino, ops):
+        opciones.append(ops)
+        return original(destino, ops)
+
+    monkeypatch.setattr(xlsxwriter, "Workbook", workbook)
+    exp.exportar_excel({"Estudiantes": pd.DataFrame({"a": [1, 2]})})
+    assert opciones[0]["constant_memory"] is True
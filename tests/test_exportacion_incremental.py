@@ -0,0 +1,69 @@
+# tests/test_exportacion_incremental.py
+import pandas as pd
+
+from services.exportacion_incremental import COLUMNA_CAMBIO, MarcasExportacion, cambios_desde, cambios_tabla
+
+
+def _calificaciones():
+    return pd.DataFrame({"id": [1, 2, 3], "estudiante_id": [10, 11, 12],
+                         "calificacion_final": [80.0, 65.0, 90.0], "unidad": [1, 1, 2]})
+
+
+def test_primera_exportacion_todo_es_nuevo():
+    filas, huellas = cambios_tabla(_calificaciones(), "id")
+    assert list(filas.columns)[0] == COLUMNA_CAMBIO
+    assert (filas[COLUMNA_CAMBIO] == "nuevo").all() and len(huellas) == 3
+
+
+def test_nuevas_modificadas_y_eliminadas():
+    _, previas = cambios_tabla(_calificaciones(), "id")
+    ahora = _calificaciones()
+    ahora.loc[ahora["id"] == 2, "calificacion_final"] = 72.0
+    ahora = pd.concat([ahora[ahora["id"] != 3],
+                       pd.DataFrame({"id": [4], "estudiante_id": [13], "calificacion_final": [55.0], "unidad": [2]})])
+
+    filas, _ = cambios_tabla(ahora, "id", previas)
+    por_id = dict(zip(filas["id"], filas[COLUMNA_CAMBIO]))
+    assert por_id == {2: "modificado", 4: "nuevo", 3: "eliminado"}
+    eliminada = filas[filas["id"] == 3].iloc[0]
+    assert pd.isna(eliminada["calificacion_final"])
+    # las columnas enteras siguen siendo enteras aunque la eliminada no tenga valores
+    assert pd.api.types.is_integer_dtype(filas["unidad"].dtype)
+
+
+def test_marca_por_usuario_y_reporte(tmp_path):
+    marcas = MarcasExportacion(str(tmp_path))
+    datos = {"calificaciones": _calificaciones()}
+    clave = marcas.clave(7, "Reporte de Calificaciones", {"rango_calificaciones": (0, 100)})
+    assert clave != marcas.clave(8, "Reporte de Calificaciones", {"rango_calificaciones": (0, 100)})
+    assert clave != marcas.clave(7, "Reporte General", {"rango_calificaciones": (0, 100)})
+    assert marcas.leer(clave) is None
+
+    _, huellas, conteo = cambios_desde(datos, None, "v1")
+    assert conteo == {"nuevo": 3, "modificado": 0, "eliminado": 0}
+    marcas.guardar(clave, huellas, "v1")
+
+    # mismos datos: no hay cambios; otros datos sin filas distintas tampoco
+    marca = marcas.leer(clave)
+    assert cambios_desde(datos, marca, "v1")[2] == {"nuevo": 0, "modificado": 0, "eliminado": 0}
+    resultado, _, conteo = cambios_desde(datos, marca, "v2")
+    assert not any(conteo.values()) and resultado["calificaciones"].empty
+
+    otra = _calificaciones()
+    otra.loc[0, "calificacion_final"] = 81.0
+    resultado, _, conteo = cambios_desde({"calificaciones": otra}, marca, "v3")
+    assert conteo["modificado"] == 1 and resultado["calificaciones"]["id"].tolist() == [1]
+
+
+def test_marca_en_arreglos_sin_pickle(tmp_path):
+    marcas = MarcasExportacion(str(tmp_path))
+    huellas = {"calificaciones": cambios_tabla(_calificaciones(), "id")[1],
+               "factores": cambios_tabla(pd.DataFrame({"id": ["a", "b"], "x": [1, 2]}), "id")[1]}
+    marcas.guardar("k", huellas, "v1")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["k.huellas.npz", "k.json"]
+    leida = marcas.leer("k")
+    for seccion, h in huellas.items():
+        assert leida["huellas"][seccion].index.tolist() == h.index.tolist()
+        assert (leida["huellas"][seccion].to_numpy() == h.to_numpy()).all()
+    # contra la marca leida de disco no hay cambios
+    assert not any(cambios_desde({"calificaciones": _calificaciones()}, leida, "v2")[2].values())
@@ -0,0 +1,32 @@
+# tests/test_exportacion_pdf.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import components.exportacion as ex
+import services.rbac as rbac
+
+
+@pytest.fixture
+def sesion_docente(monkeypatch):
+    # como en Streamlit: la sesion (y con ella el docente) solo la ve el hilo del script
+    principal = threading.main_thread()
+    monkeypatch.setattr(rbac, "es_docente", lambda: threading.current_thread() is principal)
+    monkeypatch.setattr(rbac, "usuario_id", lambda: 7 if threading.current_thread() is principal else None)
+
+
+def test_pdf_de_docente_fuera_del_hilo_usa_su_alcance(analytics, sesion_docente, monkeypatch):
+    graficadas = []
+    monkeypatch.setattr(ex, "png_graficas", lambda snap, nombres: graficadas.append(snap.alcance) or {})
+
+    snap, metricas = ex.entradas_pdf(analytics)
+    assert snap.alcance == ("docente", 7)
+    # el docente 7 solo tiene a los alumnos de su materia
+    assert metricas["total_estudiantes"] == len(snap["estudiantes"]) < len(analytics.db.cargar_estudiantes())
+
+    datos = ex.generar_reporte_calificaciones(analytics, {})
+    with ThreadPoolExecutor(1) as pool:
+        pdf = pool.submit(ex.construir_pdf, snap, datos, "Reporte de Calificaciones", True, metricas).result()
+    assert pdf.startswith(b"%PDF")
+    assert graficadas == [("docente", 7)]
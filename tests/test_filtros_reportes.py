@@ -0,0 +1,74 @@
+# tests/test_filtros_reportes.py
+import pytest
+
+from services.filtros_reportes import MotorFiltros
+
+FILTROS = {"rango_calificaciones": (60.0, 85.0), "filtro_desercion": "En riesgo", "filtro_categoria": ["Academicos"]}
+
+
+def test_mismas_filas_que_filtrar_con_pandas(analytics):
+    snap = analytics.snapshot()
+    motor = MotorFiltros()
+    cal, est = snap["calificaciones"], snap["estudiantes"]
+
+    esperado = cal[(cal["calificacion_final"] >= 60) & (cal["calificacion_final"] <= 85)]
+    assert motor.seleccionar(snap, "calificaciones", FILTROS)["id"].tolist() == esperado["id"].tolist()
+    assert motor.seleccionar(snap, "estudiantes", FILTROS)["id"].tolist() == est[est["desercion"] == True]["id"].tolist()
+    no = motor.seleccionar(snap, "estudiantes", {"filtro_desercion": "No en riesgo"})
+    assert len(no) == (est["desercion"] == False).sum()
+    assert len(motor.seleccionar(snap, "factores", {"filtro_categoria": ["Otra"]})) == 0
+
+    unido = cal.merge(est, left_on="estudiante_id", right_on="id", suffixes=("_cal", "_est"), how="left")
+    unido = unido[(unido["calificacion_final"] >= 60) & (unido["calificacion_final"] <= 85) & (unido["desercion"] == True)]
+    assert motor.seleccionar(snap, "personalizado", FILTROS)["id_cal"].tolist() == unido["id_cal"].tolist()
+
+
+def test_sin_filtro_efectivo_no_copia_filas(analytics):
+    snap = analytics.snapshot()
+    motor = MotorFiltros()
+    todos = motor.seleccionar(snap, "estudiantes", {"filtro_desercion": "Todos"})
+    assert len(todos) == len(snap["estudiantes"])
+    assert motor.mascara(snap, "materias", FILTROS) is None
+
+
+def test_mascaras_y_union_en_cache_por_version(analytics, backend):
+    snap = analytics.snapshot()
+    motor = MotorFiltros()
+    mascara = motor.mascara(snap, "calificaciones", FILTROS)
+    assert motor.mascara(snap, "calificaciones", dict(FILTROS)) is mascara
+    with pytest.raises(ValueError):
+        mascara[0] = True
+    # el orden de las categorias no cambia la mascara
+    cat = motor.mascara(snap, "factores", {"filtro_categoria": ["Academicos", "Otra"]})
+    assert motor.mascara(snap, "factores", {"filtro_categoria": ["Otra", "Academicos"]}) is cat
+    assert motor.tabla(snap, "personalizado") is motor.tabla(snap, "personalizado")
+
+    backend.tablas["registro_calificaciones"][0]["calificacion_final"] = 99.0
+    analytics.actualizar_datos()
+    nuevo = analytics.snapshot()
+    assert nuevo.version != snap.version
+    assert motor.mascara(nuevo, "calificaciones", FILTROS) is not mascara
+    assert motor.tabla(nuevo, "personalizado") is not motor.tabla(snap, "personalizado")
+
+
+def test_cada_servicio_nuevo_ve_sus_datos(backend):
+    # la pagina de exportacion crea un AnalyticsService por ejecucion: todos empiezan en la version 1
+    from services.analytics import AnalyticsService
+    from services.database import DatabaseService
+    motor = MotorFiltros()
+    antes = AnalyticsService(DatabaseService(backend)).snapshot()
+    motor.seleccionar(antes, "personalizado", FILTROS)
+    motor.seleccionar(antes, "calificaciones", FILTROS)
+
+    cal = backend.tablas["registro_calificaciones"]
+    cal[0]["calificacion_final"] = 99.0
+    cal.append(dict(cal[1], id=max(r["id"] for r in cal) + 1, calificacion_final=75.0))
+    despues = AnalyticsService(DatabaseService(backend)).snapshot()
+    assert despues.version == antes.version
+
+    unido = motor.seleccionar(despues, "personalizado", {})
+    assert len(unido) == len(cal) and unido.loc[unido["id_cal"] == cal[0]["id"], "calificacion_final"].item() == 99.0
+    filtradas = motor.seleccionar(despues, "calificaciones", FILTROS)
+    esperado = despues["calificaciones"]
+    esperado = esperado[(esperado["calificacion_final"] >= 60) & (esperado["calificacion_final"] <= 85)]
+    assert filtradas["id"].tolist() == esperado["id"].tolist()
@@ -0,0 +1,72 @@
+# tests/test_graficas.py
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import services.graficas as gr
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = gr.CacheFiguras()
+    monkeypatch.setattr(gr, "_CACHE", cache)
+    return cache
+
+
+class _PoolContado(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(4)
+        self.enviados = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.enviados.append(args[0])
+        return super().submit(fn, *args, **kwargs)
+
+
+def test_agregados_una_vez_por_snapshot(analytics, cache):
+    snap = analytics.snapshot()
+    promedio = cache.agregados(snap, "promedio_carrera")
+    assert cache.agregados(snap, "promedio_carrera") is promedio
+    cal = snap["calificaciones"]
+    assert promedio["carreras"] == ["Ingeniería en Sistemas Computacionales"]
+    assert promedio["valores"] == [pytest.approx(cal["calificacion_final"].mean())]
+    assert sum(cache.agregados(snap, "distribucion")["conteos"]) == len(cal)
+    assert cache.agregados(snap, "reprobacion_carrera")["valores"] == [pytest.approx(cal["reprobado"].mean() * 100)]
+
+
+def test_pngs_en_paralelo_y_desde_cache(analytics, cache):
+    snap = analytics.snapshot()
+    pool = _PoolContado()
+    nombres = list(gr.GRAFICAS)
+    pngs = gr.png_graficas(snap, nombres, dpi=40, pool=pool)
+    assert sorted(pool.enviados) == sorted(nombres)
+    assert all(p.startswith(b"\x89PNG") for p in pngs.values())
+
+    # la pagina de estadisticas pide dos de las mismas graficas: no se dibujan otra vez
+    otra = gr.png_graficas(snap, ["estudiantes_carrera", "reprobacion_carrera"], dpi=40, pool=pool)
+    assert len(pool.enviados) == len(nombres)
+    assert otra["reprobacion_carrera"] is pngs["reprobacion_carrera"]
+
+
+def test_pool_de_procesos(analytics, cache):
+    pngs = gr.png_graficas(analytics.snapshot(), ["distribucion", "promedio_carrera"], dpi=40)
+    assert all(p.startswith(b"\x89PNG") for p in pngs.values())
+
+
+def test_sin_pool_se_dibuja_aqui(analytics, cache):
+    pool = ThreadPoolExecutor(1)
+    pool.shutdown()
+    pngs = gr.png_graficas(analytics.snapshot(), ["distribucion"], dpi=40, pool=pool)
+    assert pngs["distribucion"].startswith(b"\x89PNG")
+
+
+def test_sin_datos_y_limite_de_bytes(cache):
+    vacio = type("S", (), {"alcance": ("global",), "huella": (), "tablas": {}})()
+    assert gr.png_graficas(vacio, ["distribucion"]) == {"distribucion": None}
+
+    chica = gr.CacheFiguras(max_bytes=10)
+    chica.guardar("a", b"x" * 6)
+    chica.guardar("b", b"y" * 6)
+    assert chica.obtener("a") is None and chica.obtener("b") == b"y" * 6
+    chica.guardar("c", b"z" * 11)
+    assert chica.obtener("c") is None and chica.bytes_en_uso() == 6
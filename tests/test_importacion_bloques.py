@@ -0,0 +1,61 @@
+# tests/test_importacion_bloques.py
+import io
+
+from openpyxl import Workbook
+
+from services.importacion import ImportacionEnBloques, TrabajoImportacion, ejecutar_trabajo, leer_por_bloques
+
+
+def _libro(n_est=25, n_cal=12):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Estudiantes"
+    ws.append(["nombres", "apellido_paterno", "apellido_materno", "carrera_id",
+               "ingreso_semestre", "horas_estudio", "desercion"])
+    for i in range(n_est):
+        # cada 10 filas se repite la primera: duplicado que cae en otro bloque
+        ws.append([f"Nuevo{i if i % 10 else 0}", "Soto", "Vega", 1, "2025-1", 5, "no"])
+    ws.append([None] * 7)
+    cal = wb.create_sheet("Calificaciones")
+    cal.append(["matricula", "materia_id", "periodo", "grupo", "u1", "u2", "u3", "asistencia", "calificacion_final"])
+    for i in range(1, n_cal + 1):
+        cal.append([f"A{i:03d}", 1, "2025-2", "A", 80, 80, 80, 90, 80])
+    wb.create_sheet("Otra").append(["ignorada"])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.name = "importacion.xlsx"
+    buf.seek(0)
+    return buf
+
+
+def test_lee_el_libro_por_bloques():
+    bloques = list(leer_por_bloques(_libro(), tam=10))
+    assert [(h, len(df)) for h, df in bloques] == [
+        ("Estudiantes", 10), ("Estudiantes", 10), ("Estudiantes", 5), ("Calificaciones", 10), ("Calificaciones", 2)]
+    assert list(bloques[0][1].columns)[:2] == ["nombres", "apellido_paterno"]
+
+
+def test_csv_hoja_por_nombre_o_encabezados():
+    csv = "categoria,nombre,inscripcion_id,gravedad\nAcademicos,a,1,3\nAcademicos,b,1,4\nAcademicos,c,2,1\n"
+    bloques = list(leer_por_bloques(io.StringIO(csv), nombre="datos.csv", tam=2))
+    assert [(h, len(df)) for h, df in bloques] == [("Factores", 2), ("Factores", 1)]
+
+
+def test_importa_por_bloques_con_escrituras_en_lote(analytics, backend, tmp_path):
+    backend.llamadas.clear()
+    estado = ImportacionEnBloques.desde_analytics(analytics)
+    avances = []
+    res = ejecutar_trabajo(analytics.db, TrabajoImportacion("t1", directorio=str(tmp_path)),
+                           leer_por_bloques(_libro(), tam=10), estado, al_avanzar=avances.append)
+
+    assert res["guardadas"] == {"Estudiantes": 23, "Calificaciones": 12, "Factores": 0}
+    assert estado.resumen["Estudiantes"]["dup_xlsx"] == 2
+    assert len(avances) == 5
+    # una peticion por bloque y tabla, no una por fila
+    assert backend.llamadas.count(("estudiantes", "upsert")) == 3
+    assert backend.llamadas.count(("registro_calificaciones", "upsert")) == 2
+
+    nuevos = [r for r in backend.tablas["estudiantes"] if r["nombres"].startswith("Nuevo")]
+    assert len({r["matricula"] for r in nuevos}) == 23
+    assert all(r["matricula"] > "A020" for r in nuevos)
+    assert sum(r["periodo"] == "2025-2" for r in backend.tablas["registro_calificaciones"]) == 12
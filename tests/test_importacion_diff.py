@@ -0,0 +1,86 @@
+# tests/test_importacion_diff.py
+import io
+
+import pandas as pd
+
+from services.importacion import (ImportacionEnBloques, TrabajoImportacion, diferencias, ejecutar_trabajo,
+                                  leer_por_bloques)
+
+
+def _cal(estudiante_id, materia_id, grupo, u1=70.0, final=None):
+    return {"estudiante_id": estudiante_id, "materia_id": materia_id, "periodo": "2025-1", "grupo": grupo,
+            "u1": u1, "u2": 75.0, "u3": 80.0, "asistencia": 80.0,
+            "calificacion_final": final if final is not None else 50.0 + estudiante_id * 2}
+
+
+def test_diff_calificaciones_con_consultas_por_lotes(analytics, backend):
+    filas = [_cal(i, 1 + i % 2, "AB"[i % 2]) for i in range(1, 21)]
+    filas[0] = _cal(1, 2, "B", u1=99.0)              # cambia una unidad
+    filas.append(_cal(1, 1, "A"))                      # clave nueva
+    backend.llamadas.clear()
+
+    d = diferencias(analytics.db, "Calificaciones", filas)
+
+    assert d["sin_cambios"] == 19
+    assert [f["u1"] for f in d["actualizar"]] == [99.0]
+    assert d["insertar"] == [_cal(1, 1, "A")]
+    assert backend.llamadas == [("registro_calificaciones", "select")]
+
+
+def test_diff_estudiantes_por_matricula(analytics):
+    base = {"nombres": "Alumno1", "apellido_paterno": "Perez", "apellido_materno": "Lopez", "carrera_id": 1,
+            "ingreso_semestre": "2024-1", "horas_estudio": 10, "desercion": False}
+    filas = [
+        {"matricula": "A001", **base},
+        {"matricula": "A002", **base, "nombres": "Alumno2", "horas_estudio": 12},
+        {"matricula": "Z100", **base, "nombres": "Nueva"},
+    ]
+    d = diferencias(analytics.db, "Estudiantes", filas)
+    assert d["sin_cambios"] == 1
+    assert [f["nombres"] for f in d["actualizar"]] == ["Alumno2"]
+    assert [f["matricula"] for f in d["insertar"]] == ["Z100"]
+
+
+def test_diff_factores_actualiza_por_id(analytics):
+    filas = [{"categoria": "Academicos", "nombre": "Base", "inscripcion_id": 1, "gravedad": 3},
+             {"categoria": "Academicos", "nombre": "Base", "inscripcion_id": 1, "gravedad": 5},
+             {"categoria": "Academicos", "nombre": "Otro", "inscripcion_id": None, "gravedad": 2}]
+    assert diferencias(analytics.db, "Factores", filas[:1])["sin_cambios"] == 1
+    d = diferencias(analytics.db, "Factores", filas[1:])
+    assert d["actualizar"] == [{**filas[1], "id": 1}]
+    assert d["insertar"] == [filas[2]]
+
+
+def _csv_calificaciones(filas):
+    buf = io.StringIO()
+    pd.DataFrame(filas).to_csv(buf, index=False)
+    buf.seek(0)
+    return buf
+
+
+def test_reimportar_lo_mismo_no_envia_nada(analytics, backend, tmp_path):
+    filas = [_cal(i, 1 + i % 2, "AB"[i % 2]) for i in range(1, 21)]
+    filas[3] = _cal(4, 1, "A", final=100.0)
+    backend.llamadas.clear()
+
+    cp = ejecutar_trabajo(analytics.db, TrabajoImportacion("r", directorio=str(tmp_path)),
+                          leer_por_bloques(_csv_calificaciones(filas), nombre="calificaciones.csv", tam=8),
+                          ImportacionEnBloques.desde_analytics(analytics))
+
+    assert cp["estado"] == "terminado"
+    assert cp["guardadas"]["Calificaciones"] == 1
+    assert cp["sin_cambios"]["Calificaciones"] == 19
+    upserts = [op for t, op in backend.llamadas if op != "select"]
+    assert upserts == ["upsert"]
+    assert next(r for r in backend.tablas["registro_calificaciones"] if r["estudiante_id"] == 4)["calificacion_final"] == 100.0
+
+
+def test_matricula_desconocida_se_resuelve_en_el_servidor(analytics, backend):
+    estado = ImportacionEnBloques.desde_analytics(analytics)
+    # alumno dado de alta despues de cargar el snapshot
+    backend.tablas["estudiantes"].append({"id": 99, "matricula": "B999", "nombres": "Tarde"})
+    df = pd.DataFrame([{"matricula": "b999", "materia_id": 1, "periodo": "2025-1", "grupo": "A",
+                        "u1": 1, "u2": 1, "u3": 1, "asistencia": 1, "calificacion_final": 1}])
+
+    assert estado.validar("Calificaciones", df)["validos"].empty
+    assert estado.validar("Calificaciones", df, analytics.db)["validos"]["estudiante_id"].tolist() == [99]
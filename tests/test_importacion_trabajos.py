@@ -0,0 +1,109 @@
+# tests/test_importacion_trabajos.py
+import io
+
+from openpyxl import Workbook
+
+from services.importacion import TrabajoImportacion, ejecutar_trabajo, id_trabajo, leer_por_bloques
+
+
+def _libro():
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Estudiantes"
+    ws.append(["nombres", "apellido_paterno", "apellido_materno", "carrera_id",
+               "ingreso_semestre", "horas_estudio", "desercion"])
+    for i in range(30):
+        ws.append([f"Nuevo{i}", "Soto", "Vega", 1, "2025-1", 5, "no"])
+    fac = wb.create_sheet("Factores")
+    fac.append(["categoria", "nombre", "inscripcion_id", "gravedad"])
+    for i in range(1, 16):
+        fac.append(["Academicos", f"f{i}", i, 3])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.name = "importacion.xlsx"
+    return buf
+
+
+class _FallaUnaVez:
+    """Envuelve DatabaseService y falla la n-esima escritura en lote tras escribirla."""
+
+    def __init__(self, db, n):
+        self.db, self.n, self.escrituras = db, n, 0
+
+    def __getattr__(self, nombre):
+        metodo = getattr(self.db, nombre)
+        if not nombre.endswith("_lote"):
+            return metodo
+
+        def envuelto(filas, lanzar=False):
+            res = metodo(filas, lanzar=lanzar)
+            self.escrituras += 1
+            # el servidor escribio pero la respuesta no llego: peor caso para reanudar
+            if self.escrituras == self.n:
+                raise ConnectionError("se perdio la respuesta")
+            return res
+        return envuelto
+
+
+def _correr(analytics, db, trabajo, archivo):
+    estado = trabajo.estado_inicial(analytics)
+    return ejecutar_trabajo(db, trabajo, leer_por_bloques(archivo, tam=10), estado, total=45)
+
+
+def test_reanuda_sin_duplicar(analytics, backend, tmp_path):
+    archivo = _libro()
+    trabajo = TrabajoImportacion(id_trabajo(archivo.getvalue(), 1), directorio=str(tmp_path))
+    est_antes = len(backend.tablas["estudiantes"])
+    fac_antes = len(backend.tablas["factores"])
+
+    cp = _correr(analytics, _FallaUnaVez(analytics.db, 2), trabajo, archivo)
+    assert cp["estado"] == "interrumpido" and cp["bloques"] == 1
+    assert cp["error"] == "se perdio la respuesta"
+
+    # otra sesion (pestaña recargada) con datos ya refrescados
+    analytics.actualizar_datos()
+    cp = _correr(analytics, _FallaUnaVez(analytics.db, 4), trabajo, archivo)
+    assert cp["estado"] == "interrumpido" and cp["bloques"] == 4
+
+    cp = _correr(analytics, analytics.db, trabajo, archivo)
+    assert cp["estado"] == "terminado" and cp["filas"] == 45 and "error" not in cp
+
+    nuevos = backend.tablas["estudiantes"][est_antes:]
+    assert len(nuevos) == 30
+    assert len({r["matricula"] for r in nuevos}) == 30
+    assert len(backend.tablas["factores"]) == fac_antes + 15
+
+
+def test_trabajo_terminado_no_deja_archivos_ni_reenvia(analytics, backend, tmp_path):
+    archivo = _libro()
+    trabajo = TrabajoImportacion("fijo", directorio=str(tmp_path))
+    assert _correr(analytics, analytics.db, trabajo, archivo)["estado"] == "terminado"
+    assert not list(tmp_path.iterdir())
+    backend.llamadas.clear()
+
+    # la pagina recarga los datos al terminar: importar otra vez no escribe nada
+    analytics.actualizar_datos()
+    cp = _correr(analytics, analytics.db, TrabajoImportacion("fijo", directorio=str(tmp_path)), archivo)
+    assert cp["estado"] == "terminado"
+    assert not [op for _, op in backend.llamadas if op != "select"]
+
+
+def test_entrada_sin_pickle(analytics, tmp_path):
+    trabajo = TrabajoImportacion("e", directorio=str(tmp_path))
+    trabajo.guardar_checkpoint({"estado": "interrumpido"})
+    estado = trabajo.estado_inicial(analytics)
+    assert trabajo._ruta_entrada.endswith(".npz")
+    reanudado = trabajo.estado_inicial(analytics)
+    assert list(reanudado.claves_existentes) == list(estado.claves_existentes)
+    assert reanudado.ids_por_matricula == estado.ids_por_matricula
+
+
+def test_progreso_reporta_velocidad_y_eta(analytics, tmp_path):
+    avances = []
+    trabajo = TrabajoImportacion("p", directorio=str(tmp_path))
+    ejecutar_trabajo(analytics.db, trabajo, leer_por_bloques(_libro(), tam=10),
+                     trabajo.estado_inicial(analytics), total=45, al_avanzar=avances.append)
+    assert [p["filas"] for p in avances] == [10, 20, 30, 40, 45]
+    assert all(p["filas_s"] > 0 for p in avances)
+    assert avances[-1]["eta"] == 0
+    assert id_trabajo(b"x", 1) == id_trabajo(b"x", 1) != id_trabajo(b"x", 2)
@@ -0,0 +1,89 @@
+# tests/test_importacion_validacion.py
+import time
+
+import numpy as np
+import pandas as pd
+
+from services.importacion import (claves_estudiante, col_bool, col_int, validar_calificaciones,
+                                  validar_estudiantes, validar_factores)
+
+
+def _hoja_estudiantes():
+    return pd.DataFrame({
+        "nombres": ["Ana", "ana ", "Luis", "", "Alumno1", "José"],
+        "apellido_paterno": ["Ruiz", "Ruiz", "Mora", "X", "Perez", "Díaz"],
+        "apellido_materno": ["", None, "Paz", "Y", "Lopez", "Gil"],
+        "carrera_id": [1, 1.0, "2", 1, 1, None],
+        "ingreso_semestre": ["2024-1", "2024-1", "2024-2", "2024-1", "2024-1", "2024-1"],
+        "horas_estudio": [5, "x", 7.9, 1, 10, 3],
+        "desercion": ["Sí", "no", 1, True, "", "yes"],
+    })
+
+
+def test_conversiones_por_columna():
+    assert col_int(pd.Series([1, "2", 3.9, "x", None]), 0).tolist() == [1, 2, 3, 0, 0]
+    assert col_int(pd.Series(["a", None])).isna().all()
+    assert col_bool(pd.Series(["Sí", " TRUE", "no", 1, 1.0, 0, None, "nan"])).tolist() == \
+        [True, True, False, True, True, False, False, False]
+
+
+def test_estudiantes_reporte(analytics):
+    r = validar_estudiantes(_hoja_estudiantes(), analytics.claves_estudiantes())
+
+    # fila vacia y carrera ausente -> invalidas; "ana " repite a "Ana"; Alumno1 Perez Lopez ya existe
+    assert [e["_motivo"] for e in r["errores"]] == ["Campos obligatorios vacíos"] * 2
+    assert r["dup_xlsx"] == 1
+    assert r["dup_bd"] == 1
+    assert r["validos"]["nombres"].tolist() == ["Ana", "Luis"]
+    assert r["validos"]["horas_estudio"].tolist() == [5, 7]
+    assert r["validos"]["desercion"].tolist() == [True, True]
+
+
+def test_claves_ignoran_acentos_y_espacios():
+    a = pd.DataFrame({"nombres": ["José  María"], "apellido_paterno": ["Núñez"], "apellido_materno": [None],
+                      "carrera_id": [1], "ingreso_semestre": ["2024-1"]})
+    b = pd.DataFrame({"nombres": ["jose maria"], "apellido_paterno": ["NUNEZ"], "apellido_materno": [""],
+                      "carrera_id": ["1"], "ingreso_semestre": [" 2024-1 "]})
+    assert claves_estudiante(a)[0] == claves_estudiante(b)[0]
+
+
+def test_calificaciones_resuelve_matricula_y_duplicados(analytics):
+    df = pd.DataFrame({
+        "matricula": ["a001", "A002", "Z999", "A001"],
+        "materia_id": [1, 2, 1, 1], "periodo": ["2025-1"] * 4, "grupo": ["a", "B", "A", "A"],
+        "u1": [80, "90", None, 70], "u2": [80] * 4, "u3": [80] * 4,
+        "asistencia": [90] * 4, "calificacion_final": [80] * 4,
+    })
+    r = validar_calificaciones(df, analytics.ids_por_matricula())
+    assert r["validos"]["estudiante_id"].tolist() == [1, 2]
+    assert r["validos"]["grupo"].tolist() == ["A", "B"]
+    assert r["validos"]["u1"].tolist() == [80.0, 90.0]
+    assert len(r["errores"]) == 1 and r["dup_xlsx"] == 1
+
+
+def test_factores_y_columnas_faltantes():
+    df = pd.DataFrame({"categoria": ["Academicos", "Inventada", "Academicos", "Academicos"],
+                       "nombre": ["a", "b", "a", "c"], "inscripcion_id": [1, 1, 1, 2],
+                       "gravedad": [3, 3, 3, 9]})
+    r = validar_factores(df)
+    assert len(r["validos"]) == 1 and len(r["errores"]) == 2 and r["dup_xlsx"] == 1
+    assert validar_factores(df.drop(columns="gravedad"))["faltan"] == ["gravedad"]
+
+
+def test_hoja_grande_valida_rapido(analytics):
+    n = 50_000
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "nombres": [f"Nombre{i % 40000}" for i in range(n)],
+        "apellido_paterno": ["García"] * n,
+        "apellido_materno": ["López"] * n,
+        "carrera_id": rng.integers(1, 5, n).astype(str),
+        "ingreso_semestre": ["2024-1"] * n,
+        "horas_estudio": rng.integers(0, 40, n),
+        "desercion": rng.choice(["si", "no"], n),
+    })
+    existentes = analytics.claves_estudiantes()
+    t = time.perf_counter()
+    r = validar_estudiantes(df, existentes)
+    assert time.perf_counter() - t < 1.0
+    assert len(r["validos"]) + r["dup_xlsx"] == n
@@ -0,0 +1,44 @@
+# tests/test_inscripciones_lote.py
+from services.database import DatabaseService
+
+
+def _grupo(backend, materia_id=1, periodo="2025-1", grupo="A"):
+    return sorted(r["estudiante_id"] for r in backend.tablas["inscripciones"]
+                  if (r["materia_id"], r["periodo"], r["grupo"]) == (materia_id, periodo, grupo))
+
+
+def test_inscripcion_masiva_sin_duplicar(backend):
+    db = DatabaseService(backend)
+    ya = _grupo(backend)
+    backend.llamadas.clear()
+
+    res = db.inscribir_estudiantes(range(1, 21), 1, "2025-1", "A")
+    assert res["inscritos"] == [i for i in range(1, 21) if i not in ya]
+    assert _grupo(backend) == list(range(1, 21))
+    # una lectura del grupo y un solo insert con todos
+    assert backend.llamadas == [("inscripciones", "select"), ("inscripciones", "insert")]
+
+    assert db.inscribir_estudiantes(range(1, 21), 1, "2025-1", "A")["inscritos"] == []
+
+
+def test_roster_objetivo_aplica_la_diferencia(backend):
+    db = DatabaseService(backend)
+    db.inscribir_estudiantes(range(1, 11), 1, "2025-1", "A")
+    antes = _grupo(backend)
+    otras = len([r for r in backend.tablas["inscripciones"] if r["materia_id"] != 1])
+    backend.llamadas.clear()
+
+    res = db.aplicar_inscripciones(1, "2025-1", "A", objetivo=[8, 9, 10, 11, 12])
+    assert res == {"inscritos": [11], "desinscritos": [i for i in antes if i not in (8, 9, 10, 12)]}
+    assert _grupo(backend) == [8, 9, 10, 11, 12]
+    assert [op for _, op in backend.llamadas] == ["select", "insert", "delete"]
+    # los demas grupos no se tocan
+    assert len([r for r in backend.tablas["inscripciones"] if r["materia_id"] != 1]) == otras
+
+
+def test_desinscripcion_masiva(backend):
+    db = DatabaseService(backend)
+    antes = _grupo(backend, 1, "2025-1", "A")
+    res = db.desinscribir_estudiantes(antes[:3] + [999], 1, "2025-1", "A")
+    assert res["desinscritos"] == antes[:3]
+    assert _grupo(backend, 1, "2025-1", "A") == antes[3:]
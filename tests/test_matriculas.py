@@ -0,0 +1,68 @@
+# tests/test_matriculas.py
+import threading
+
+import pandas as pd
+
+from services.importacion import ImportacionEnBloques, filas_para_guardar
+from services.matriculas import AsignadorMatriculas, asignador_matriculas, maximos_por_prefijo
+
+
+def test_maximos_por_prefijo():
+    assert maximos_por_prefijo(["A001", "A120", "B7", None, "sin numero", " A009 "]) == {"A": 120, "B": 7}
+    assert maximos_por_prefijo([]) == {}
+
+
+def test_reserva_bloques_contiguos_sin_bajar():
+    a = AsignadorMatriculas()
+    a.observar({"A": 20})
+    assert a.sugerir() == "A021"
+    assert a.reservar(5) == 21
+    assert a.reservar(1) == 26
+    a.observar({"A": 3})  # un snapshot viejo no baja el contador
+    assert a.sugerir() == "A027"
+
+
+def test_reservas_concurrentes_no_se_repiten():
+    a = AsignadorMatriculas()
+    barrera = threading.Barrier(16)
+    entregados, lock = [], threading.Lock()
+
+    def reservar():
+        barrera.wait()
+        for _ in range(50):
+            inicio = a.reservar(3)
+            with lock:
+                entregados.extend(range(inicio, inicio + 3))
+
+    hilos = [threading.Thread(target=reservar) for _ in range(16)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert sorted(entregados) == list(range(1, 16 * 50 * 3 + 1))
+
+
+def test_snapshot_actualiza_el_asignador(analytics):
+    analytics.cargar_datos()
+    assert asignador_matriculas().sugerir() >= "A021"
+
+
+def test_bloque_de_importacion_recibe_matriculas_contiguas():
+    a = AsignadorMatriculas()
+    a.observar({"A": 20})
+    estado = ImportacionEnBloques(asignador=a)
+    validos = pd.DataFrame({
+        "matricula": ["", "A050", None, ""],
+        "nombres": ["X", "Y", "Z", "W"], "apellido_paterno": ["P"] * 4, "apellido_materno": [""] * 4,
+        "carrera_id": [1] * 4, "ingreso_semestre": ["2024-1"] * 4, "horas_estudio": [5] * 4,
+        "desercion": [False] * 4,
+    })
+    filas = filas_para_guardar("Estudiantes", validos, estado)
+    # la explicita A050 se respeta y las vacias salen despues de ella
+    assert [f["matricula"] for f in filas] == ["A051", "A050", "A052", "A053"]
+    assert estado.ultima_reserva == 51
+
+    # al reanudar se reusa el bloque reservado
+    otra = filas_para_guardar("Estudiantes", validos, ImportacionEnBloques(asignador=a), inicio_matriculas=51)
+    assert [f["matricula"] for f in otra] == ["A051", "A050", "A052", "A053"]
+    assert a.sugerir() == "A054"
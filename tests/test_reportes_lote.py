@@ -0,0 +1,46 @@
+# tests/test_reportes_lote.py
+import zipfile
+
+import pytest
+
+import services.reportes_lote as lote
+
+
+def test_docentes_y_nombres_de_archivo(analytics):
+    tablas = analytics.snapshot().tablas
+    assert lote.docentes_de(tablas["materias"]) == {7: "Docente 7", 8: "Docente 8"}
+    assert lote.nombre_archivo(lote.documento_grupo(1, "2025-1", "A"), tablas) == "grupo_2025-1_Calidad_A_1.pdf"
+    assert lote.nombre_archivo(lote.documento_docente(8, "2025-1"), tablas) == "docente_8_2025-1.pdf"
+
+
+def test_pdf_desde_el_snapshot_compartido(analytics, tmp_path):
+    lote._escribir_snapshot(analytics.snapshot().tablas, str(tmp_path))
+    lote._abrir_snapshot(str(tmp_path))
+    tablas = lote._TABLAS_PROCESO
+    # cada proceso une una sola vez calificaciones con los datos del alumno
+    assert {"matricula", "nombres", "calificacion_final"} <= set(tablas["calificaciones"].columns)
+    grupo = tablas["calificaciones"].query("materia_id == 1")
+    tabla = lote._tabla_grupo(grupo)
+    assert list(tabla.columns) == lote._ENCABEZADOS and len(tabla) == 10
+    assert lote._resumen(grupo)[0] == ["Alumnos con calificación", "10"]
+    assert lote.pdf_documento(lote.documento_docente(7), tablas).startswith(b"%PDF")
+
+
+def test_lote_en_procesos_sale_en_un_zip(analytics):
+    tablas = analytics.snapshot().tablas
+    documentos = [lote.documento_grupo(1, "2025-1", "A"), lote.documento_grupo(2, "2025-1", "B"),
+                  lote.documento_docente(7, "2025-1"), lote.documento_grupo(1, "2025-1", "A")]
+    avances = []
+    res = lote.generar_lote(tablas, documentos, max_procesos=2, avance=lambda f, t="": avances.append(f))
+
+    assert res["extension"] == ".zip" and res["documentos"] == 3 and res["por_segundo"] > 0
+    assert avances[-1] == 1.0
+    with zipfile.ZipFile(res["archivo"]) as zf:
+        assert sorted(zf.namelist()) == ["docente_7_2025-1.pdf", "grupo_2025-1_Calidad_A_1.pdf",
+                                         "grupo_2025-1_Redes_B_2.pdf"]
+        assert all(zf.read(n).startswith(b"%PDF") for n in zf.namelist())
+
+
+def test_lote_vacio():
+    with pytest.raises(ValueError):
+        lote.generar_lote({}, [])
@@ -0,0 +1,96 @@
+# tests/test_reportes_trabajos.py
+import threading
+import time
+
+from services.reportes import TrabajadorReportes
+
+
+def _esperar(trabajador, id_, limite=5.0):
+    fin = time.time() + limite
+    while trabajador.progreso(id_)["estado"] in ("en_cola", "en_curso"):
+        assert time.time() < fin
+        time.sleep(0.01)
+    return trabajador.progreso(id_)
+
+
+def _reporte(contenido=b"%PDF", liberar=None, avances=None):
+    def generar(avance):
+        avance(0.5, "a la mitad")
+        if avances is not None:
+            avances.set()
+        if liberar is not None:
+            liberar.wait(5)
+        return {"archivo": contenido, "extension": ".pdf", "mime": "application/pdf"}
+    return generar
+
+
+def test_progreso_y_resultado():
+    trabajador = TrabajadorReportes(max_trabajos=1)
+    liberar, a_la_mitad = threading.Event(), threading.Event()
+    id_ = trabajador.enviar(_reporte(liberar=liberar, avances=a_la_mitad), "General · PDF")
+    assert a_la_mitad.wait(5)
+    p = trabajador.progreso(id_)
+    assert p["estado"] == "en_curso" and p["avance"] == 0.5 and p["texto"] == "a la mitad"
+    assert trabajador.resultado(id_) is None
+
+    liberar.set()
+    p = _esperar(trabajador, id_)
+    assert p["estado"] == "terminado" and p["avance"] == 1.0 and p["segundos"] >= 0
+    assert trabajador.resultado(id_)["archivo"] == b"%PDF"
+
+
+def test_varios_reportes_a_la_vez():
+    trabajador = TrabajadorReportes(max_trabajos=3)
+    liberar = threading.Event()
+    empezados = [threading.Event() for _ in range(3)]
+    ids = [trabajador.enviar(_reporte(bytes([i]), liberar, e)) for i, e in enumerate(empezados)]
+    # los tres corren a la vez: ninguno espera a que termine otro
+    assert all(e.wait(5) for e in empezados)
+    liberar.set()
+    assert [_esperar(trabajador, i)["estado"] for i in ids] == ["terminado"] * 3
+    assert [trabajador.resultado(i)["archivo"] for i in ids] == [b"\x00", b"\x01", b"\x02"]
+
+
+def test_misma_clave_en_curso_no_se_duplica():
+    trabajador = TrabajadorReportes(max_trabajos=2)
+    liberar = threading.Event()
+    llamadas = []
+
+    def generar(avance):
+        llamadas.append(1)
+        liberar.wait(5)
+        return {"archivo": b"x", "extension": ".csv", "mime": "text/csv"}
+
+    id_ = trabajador.enviar(generar, clave="k")
+    assert trabajador.enviar(generar, clave="k") == id_
+    liberar.set()
+    _esperar(trabajador, id_)
+    otro = trabajador.enviar(generar, clave="k")  # el anterior ya termino
+    _esperar(trabajador, otro)
+    assert otro != id_ and len(llamadas) == 2
+
+
+def test_error_y_descartar():
+    trabajador = TrabajadorReportes(max_trabajos=1)
+
+    def falla(avance):
+        raise ValueError("sin datos")
+
+    id_ = trabajador.enviar(falla)
+    p = _esperar(trabajador, id_)
+    assert p["estado"] == "error" and p["error"] == "sin datos"
+    assert trabajador.resultado(id_) is None
+    trabajador.descartar(id_)
+    assert trabajador.progreso(id_) is None
+
+    vacio = trabajador.enviar(lambda avance: None)
+    assert _esperar(trabajador, vacio)["estado"] == "error"
+
+
+def test_terminados_viejos_se_purgan():
+    trabajador = TrabajadorReportes(max_trabajos=1, ttl=0.05)
+    id_ = trabajador.enviar(_reporte())
+    _esperar(trabajador, id_)
+    time.sleep(0.1)
+    nuevo = trabajador.enviar(_reporte())
+    assert trabajador.progreso(id_) is None and trabajador.progreso(nuevo) is not None
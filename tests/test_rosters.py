@@ -0,0 +1,70 @@
+# tests/test_rosters.py
+import pytest
+
+from services.rosters import CacheRosters, cache_rosters
+
+
+@pytest.fixture
+def db(analytics, backend):
+    # la vista vw_inscripciones_detalle se arma desde inscripciones + estudiantes
+    def listar_inscritos(materia_id, periodo, grupo):
+        nombres = {e["id"]: e for e in backend.tablas["estudiantes"]}
+        return [{**nombres.get(r["estudiante_id"], {}), "estudiante_id": r["estudiante_id"]}
+                for r in backend.tablas["inscripciones"]
+                if (r["materia_id"], r["periodo"], r["grupo"]) == (materia_id, periodo, grupo)]
+    analytics.db.listar_inscritos = listar_inscritos
+    cache_rosters().limpiar()
+    return analytics.db
+
+
+def _lecturas(backend):
+    return len([l for l in backend.llamadas if l[1] == "select"])
+
+
+def test_roster_ordenado_y_en_cache(analytics, db, backend):
+    primero = analytics.inscritos_de(1, "2025-1", "A")
+    assert [a["nombre"] for a in primero] == sorted(a["nombre"] for a in primero)
+    assert {a["id"] for a in primero} == set(range(2, 21, 2))
+
+    db.listar_inscritos = None  # ya no debe consultarse
+    for _ in range(5):
+        assert analytics.inscritos_de(1, "2025-1", "A") == primero
+
+
+def test_escribir_inscripciones_invalida_solo_ese_grupo(analytics, db):
+    listar = db.listar_inscritos
+    consultas = []
+    db.listar_inscritos = lambda *a: consultas.append(a) or listar(*a)
+
+    analytics.inscritos_de(1, "2025-1", "A")
+    analytics.inscritos_de(2, "2025-1", "B")
+    db.inscribir_estudiantes([1, 3], 1, "2025-1", "A")
+    assert {a["id"] for a in analytics.inscritos_de(1, "2025-1", "A")} >= {1, 3}
+    analytics.inscritos_de(2, "2025-1", "B")
+    assert consultas == [(1, "2025-1", "A"), (2, "2025-1", "B"), (1, "2025-1", "A")]
+
+
+def test_lectura_que_cruza_una_escritura_no_se_guarda():
+    cache = CacheRosters()
+
+    class _Db:
+        llamadas = 0
+
+        def alumnos_inscritos_para_calificacion(self, *clave):
+            self.llamadas += 1
+            if self.llamadas == 1:
+                cache.invalidar(*clave)  # alguien inscribe mientras se lee
+            return [{"id": self.llamadas, "nombre": "X"}]
+
+    d = _Db()
+    assert cache.obtener(d, 1, "2025-1", "A") == [{"id": 1, "nombre": "X"}]
+    assert cache.obtener(d, 1, "2025-1", "A") == [{"id": 2, "nombre": "X"}]
+    assert cache.obtener(d, 1, "2025-1", "A") == [{"id": 2, "nombre": "X"}]
+
+
+def test_catalogos_desde_el_snapshot(analytics, backend):
+    analytics.cargar_datos()
+    antes = _lecturas(backend)
+    assert [m["id"] for m in analytics.materias_lista()] == [1, 2]
+    assert [g["grupo"] for g in analytics.grupos_de(1)] == ["A"]
+    assert _lecturas(backend) == antes
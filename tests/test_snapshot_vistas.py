@@ -0,0 +1,38 @@
+# tests/test_snapshot_vistas.py
+import pandas as pd
+
+
+def test_vista_no_modifica_datos_compartidos(analytics):
+    """Escribir en lo que entrega el servicio no debe alterar el snapshot compartido."""
+    original = analytics.df_calificaciones.copy()
+
+    vista = analytics.df_calificaciones
+    vista.loc[vista.index[0], "calificacion_final"] = -1
+    vista["nueva"] = 1
+    vista.drop(columns=["u1"], inplace=True)
+    vista.sort_values("estudiante_id", ascending=False, inplace=True)
+
+    pd.testing.assert_frame_equal(analytics.df_calificaciones, original)
+
+
+def test_vistas_comparten_memoria_con_snapshot(analytics):
+    """Leer no debe duplicar la tabla: dos vistas apuntan a los mismos datos."""
+    a = analytics.df_estudiantes
+    b = analytics.df_estudiantes
+    assert a is not b
+    assert (a["horas_estudio"].to_numpy().__array_interface__["data"][0]
+            == b["horas_estudio"].to_numpy().__array_interface__["data"][0])
+
+
+def test_cache_compartida_distingue_datos_entre_servicios(backend):
+    # las paginas crean un servicio por ejecucion: todos empiezan en la misma version
+    from services.analytics import AnalyticsService
+    from services.database import DatabaseService
+    antes = AnalyticsService(DatabaseService(backend))
+    total = antes.calcular_metricas_principales()["total_estudiantes"]
+
+    backend.tablas["estudiantes"].append(dict(backend.tablas["estudiantes"][0], id=999, matricula="X999"))
+    despues = AnalyticsService(DatabaseService(backend))
+    assert despues.clave_cache != antes.clave_cache
+    assert despues.version == antes.version
+    assert despues.calcular_metricas_principales()["total_estudiantes"] == total + 1
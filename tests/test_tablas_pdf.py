@@ -0,0 +1,45 @@
+# tests/test_tablas_pdf.py
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import LongTable, SimpleDocTemplate
+
+from services.tablas_pdf import estilo_tabla, tablas_pdf
+
+
+def _df(n):
+    return pd.DataFrame({"id": range(n), "nombre": [f"Alumno {i}" for i in range(n)],
+                         "final": np.where(np.arange(n) % 7 == 0, np.nan, 70.456)})
+
+
+def test_todas_las_filas_en_trozos_de_una_pagina():
+    doc = SimpleDocTemplate(BytesIO(), pagesize=A4)
+    trozos = tablas_pdf(_df(1000), doc.width, doc.height)
+    assert all(isinstance(t, LongTable) for t in trozos)
+    filas = [len(t._cellvalues) - 1 for t in trozos]
+    assert sum(filas) == 1000 and len(set(filas[:-1])) == 1
+    assert len(trozos) > 1 and trozos[0]._rowHeights[0] * (filas[0] + 1) <= doc.height
+    # cada trozo repite el encabezado y los anchos son los mismos en todos
+    assert all(list(t._cellvalues[0]) == ["id", "nombre", "final"] for t in trozos)
+    assert len({tuple(t._colWidths) for t in trozos}) == 1
+    assert list(trozos[0]._cellvalues[1]) == ["0", "Alumno 0", ""] and trozos[0]._cellvalues[2][2] == "70.46"
+
+
+def test_estilo_se_reutiliza_y_texto_largo_se_corta():
+    assert estilo_tabla() is estilo_tabla()
+    df = pd.DataFrame({"a": ["x" * 500, "corto\nen dos lineas"], "b": [1, 2]})
+    (tabla,) = tablas_pdf(df, ancho=200, alto=500)
+    assert sum(tabla._colWidths) <= 200.01
+    assert tabla._cellvalues[1][0].endswith("…") and len(tabla._cellvalues[1][0]) < 100
+    assert tabla._cellvalues[2][0] == "corto en dos lineas"
+
+
+def test_pdf_completo_con_muchas_filas():
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    doc.build(tablas_pdf(_df(3000), doc.width, doc.height))
+    assert buffer.getvalue().startswith(b"%PDF")
+    assert doc.page >= 3000 // 60
+    assert tablas_pdf(pd.DataFrame(), doc.width, doc.height) == []